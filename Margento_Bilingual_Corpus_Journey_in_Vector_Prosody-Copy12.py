@@ -29,186 +29,13 @@ import pybind11
 # In[5]:
 
 
-class FastVector:
-    """
-    Minimal wrapper for fastvector embeddings.
-    ```
-    Usage:
-        $ model = FastVector(vector_file='/path/to/wiki.en.vec')
-        $ 'apple' in model
-        > TRUE
-        $ model['apple'].shape
-        > (300,)
-    ```
-    """
-
-    def __init__(self, vector_file='', transform=None):
-        """Read in word vectors in fasttext format"""
-        self.word2id = {}
-
-        # Captures word order, for export() and translate methods
-        self.id2word = []
-
-        print('reading word vectors from %s' % vector_file)
-        with open(vector_file, 'r') as f:
-            (self.n_words, self.n_dim) =                 (int(x) for x in f.readline().rstrip('\n').split(' '))
-            self.embed = np.zeros((self.n_words, self.n_dim))
-            for i, line in enumerate(f):
-                elems = line.rstrip('\n').split(' ')
-                self.word2id[elems[0]] = i
-                self.embed[i] = elems[1:self.n_dim+1]
-                self.id2word.append(elems[0])
-        
-        # Used in translate_inverted_softmax()
-        self.softmax_denominators = None
-        
-        if transform is not None:
-            print('Applying transformation to embedding')
-            self.apply_transform(transform)
-
-    def apply_transform(self, transform):
-        """
-        Apply the given transformation to the vector space
-        Right-multiplies given transform with embeddings E:
-            E = E * transform
-        Transform can either be a string with a filename to a
-        text file containing a ndarray (compat. with np.loadtxt)
-        or a numpy ndarray.
-        """
-        transmat = np.loadtxt(transform) if isinstance(transform, str) else transform
-        self.embed = np.matmul(self.embed, transmat)
-
-    def export(self, outpath):
-        """
-        Transforming a large matrix of WordVectors is expensive. 
-        This method lets you write the transformed matrix back to a file for future use
-        :param The path to the output file to be written 
-        """
-        fout = open(outpath, "w")
-
-        # Header takes the guesswork out of loading by recording how many lines, vector dims
-        fout.write(str(self.n_words) + " " + str(self.n_dim) + "\n")
-        for token in self.id2word:
-            vector_components = ["%.6f" % number for number in self[token]]
-            vector_as_string = " ".join(vector_components)
-
-            out_line = token + " " + vector_as_string + "\n"
-            fout.write(out_line)
-
-        fout.close()
-
-    def translate_nearest_neighbour(self, source_vector):
-        """Obtain translation of source_vector using nearest neighbour retrieval"""
-        similarity_vector = np.matmul(FastVector.normalised(self.embed), source_vector)
-        target_id = np.argmax(similarity_vector)
-        return self.id2word[target_id]
-
-    def translate_inverted_softmax(self, source_vector, source_space, nsamples,
-                                   beta=10., batch_size=100, recalculate=True):
-        """
-        Obtain translation of source_vector using sampled inverted softmax retrieval
-        with inverse temperature beta.
-        nsamples vectors are drawn from source_space in batches of batch_size
-        to calculate the inverted softmax denominators.
-        Denominators from previous call are reused if recalculate=False. This saves
-        time if multiple words are translated from the same source language.
-        """
-        embed_normalised = FastVector.normalised(self.embed)
-        # calculate contributions to softmax denominators in batches
-        # to save memory
-        if self.softmax_denominators is None or recalculate is True:
-            self.softmax_denominators = np.zeros(self.embed.shape[0])
-            while nsamples > 0:
-                # get batch of randomly sampled vectors from source space
-                sample_vectors = source_space.get_samples(min(nsamples, batch_size))
-                # calculate cosine similarities between sampled vectors and
-                # all vectors in the target space
-                sample_similarities =                     np.matmul(embed_normalised,
-                              FastVector.normalised(sample_vectors).transpose())
-                # accumulate contribution to denominators
-                self.softmax_denominators                     += np.sum(np.exp(beta * sample_similarities), axis=1)
-                nsamples -= batch_size
-        # cosine similarities between source_vector and all target vectors
-        similarity_vector = np.matmul(embed_normalised,
-                                      source_vector/np.linalg.norm(source_vector))
-        # exponentiate and normalise with denominators to obtain inverted softmax
-        softmax_scores = np.exp(beta * similarity_vector) /                          self.softmax_denominators
-        # pick highest score as translation
-        target_id = np.argmax(softmax_scores)
-        return self.id2word[target_id]
-
-    def get_samples(self, nsamples):
-        """Return a matrix of nsamples randomly sampled vectors from embed"""
-        sample_ids = np.random.choice(self.embed.shape[0], nsamples, replace=False)
-        return self.embed[sample_ids]
-
-    @classmethod
-    def normalised(cls, mat, axis=-1, order=2):
-        """Utility function to normalise the rows of a numpy array."""
-        norm = np.linalg.norm(
-            mat, axis=axis, ord=order, keepdims=True)
-        norm[norm == 0] = 1
-        return mat / norm
-    
-    @classmethod
-    def cosine_similarity(cls, vec_a, vec_b):
-        """Compute cosine similarity between vec_a and vec_b"""
-        return np.dot(vec_a, vec_b) /             (np.linalg.norm(vec_a) * np.linalg.norm(vec_b))
-
-    def __contains__(self, key):
-        return key in self.word2id
-
-    def __getitem__(self, key):
-        return self.embed[self.word2id[key]]
-
-
-# In[6]:
-
-
-#import numpy as np
-#from fasttext import FastVector
-
-# from https://stackoverflow.com/questions/21030391/how-to-normalize-array-numpy
-def normalized(a, axis=-1, order=2):
-    """Utility function to normalize the rows of a numpy array."""
-    l2 = np.atleast_1d(np.linalg.norm(a, order, axis))
-    l2[l2==0] = 1
-    return a / np.expand_dims(l2, axis)
-
-def make_training_matrices(source_dictionary, target_dictionary, bilingual_dictionary):
-    """
-    Source and target dictionaries are the FastVector objects of
-    source/target languages. bilingual_dictionary is a list of 
-    translation pair tuples [(source_word, target_word), ...].
-    """
-    source_matrix = []
-    target_matrix = []
-
-    for (source, target) in bilingual_dictionary:
-        if source in source_dictionary and target in target_dictionary:
-            source_matrix.append(source_dictionary[source])
-            target_matrix.append(target_dictionary[target])
-
-    # return training matrices
-    return np.array(source_matrix), np.array(target_matrix)
+# FastVector and the alignment helpers (normalized, make_training_matrices, learn_transformation)
+# from fastText_multilingual live in fastvector.py, next to this notebook (one level up from fastText_multilingual-master)
 
-def learn_transformation(source_matrix, target_matrix, normalize_vectors=True):
-    """
-    Source and target matrices are numpy arrays, shape
-    (dictionary_length, embedding_dimension). These contain paired
-    word vectors from the bilingual dictionary.
-    """
-    # optionally normalize the training vectors
-    if normalize_vectors:
-        source_matrix = normalized(source_matrix)
-        target_matrix = normalized(target_matrix)
+import os, sys
+sys.path.insert(0, os.path.dirname(os.getcwd()))
 
-    # perform the SVD
-    product = np.matmul(source_matrix.transpose(), target_matrix)
-    U, s, V = np.linalg.svd(product)
-
-    # return orthogonal transformation which aligns source language to the target
-    return np.matmul(U, V)
+from fastvector import FastVector, normalized, make_training_matrices, learn_transformation
 
 
 # # We create dictionaries for both languages based off of the FastText Wiki vectors for each language: 
@@ -217,8 +44,13 @@ def learn_transformation(source_matrix, target_matrix, normalize_vectors=True):
 
 
 
-fr_dictionary = FastVector(vector_file='wiki.fr.vec')
-en_dictionary = FastVector(vector_file='wiki.en.vec')
+# both tables are parsed at the same time, and saved under tables/ so that
+# later runs memory-map them instead of parsing the .vec files again
+from table_loader import load_tables
+
+dictionaries = load_tables({'en': 'wiki.en.vec', 'fr': 'wiki.fr.vec'}, store_dir='tables')
+fr_dictionary = dictionaries['fr']
+en_dictionary = dictionaries['en']
 
 
 # # We create a bilingual dictionary based on overlappings between the two languages:
@@ -264,7 +96,7 @@ import re
 import numpy as np
 import pandas as pd
 from pprint import pprint
-from nltk.tokenize import sent_tokenize, word_tokenize
+from nltk.tokenize import word_tokenize
 import os
 #The OS module in Python provides a way of using operating system dependent functionality. 
 #The functions that the OS module provides allows you to interface with the underlying operating system 
@@ -273,23 +105,9 @@ import os
 from os import listdir
 from os.path import isfile, join
 
-# Gensim
-import gensim
-import gensim.corpora as corpora
-from gensim import models, corpora
-from gensim.utils import simple_preprocess
-from gensim.models import CoherenceModel
-
-# spacy for lemmatization
-import spacy
-
 # Plotting tools
 get_ipython().run_line_magic('matplotlib', 'inline')
 
-# Enable logging for gensim - optional
-import logging
-logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.ERROR)
-
 import warnings
 warnings.filterwarnings("ignore",category=DeprecationWarning)
 
@@ -297,14 +115,17 @@ warnings.filterwarnings("ignore",category=DeprecationWarning)
 # In[11]:
 
 
-import nltk as nltk 
-nltk.download('stopwords')
+# stopword lists and sentence models are read offline (nothing is downloaded),
+# see resources.py for where they are looked up and how to bundle them
+import resources
+
+sent_tokenize = resources.sentence_tokenizer()
 
 
 # In[ ]:
 
 
-#stopwords = nltk.corpus.stopwords.words("stopwords_Latin.txt")
+#stopwords = resources.stopwords("stopwords_Latin.txt")
 
 
 # In[12]:
@@ -350,7 +171,7 @@ def _pre_clean(list_of_text):
 
 
 
-stopwords = nltk.corpus.stopwords.words('stop_words_poetry.txt')
+stopwords = resources.stopwords('stop_words_poetry.txt')
 
 stopwords.append('...')
 stopwords.append("'d")
@@ -420,8 +241,6 @@ from string import punctuation
 
 remove_punct_map = dict.fromkeys(map(ord, string.punctuation))
 
-tokens_total = []
-
 count = -1
  
 os.chdir(TEXTS_DIR)
@@ -433,7 +252,7 @@ for f in files:
         count = count + 1
         filelabels_en[count] = os.path.basename(openf.name)
         for line in openf:
-            sent_text = nltk.sent_tokenize(line)
+            sent_text = sent_tokenize(line)
             for sentence in sent_text:
                 tokens1 = tokenize(sentence)
                 tokens1 = [item.translate(remove_punct_map)
@@ -443,10 +262,8 @@ for f in files:
                 tokens1 = [x.lower() for x in tokens1]
                 for token in tokens1:
                     tokens.append(token)
-                    tokens_total.append(token)
                 #if random.random() > .99:
                 #print(tokens)
-    #print(tokens_total)
     texts_data.append(tokens)
 
 print(filelabels_en)
@@ -581,7 +398,7 @@ TEXTS_DIR = HOME + "/cannes_fr/"
 
 
 
-stopwords = nltk.corpus.stopwords.words("french1.txt")
+stopwords = resources.stopwords("french1.txt")
 
 
 # In[27]:
@@ -604,8 +421,6 @@ from string import punctuation
 
 remove_punct_map = dict.fromkeys(map(ord, string.punctuation))
 
-tokens_total = []
-
 count = len(filelabels1) - 1
  
 os.chdir(TEXTS_DIR)
@@ -618,7 +433,7 @@ for f in files:
             count = count + 1
             filelabels_fr[count] = os.path.basename(openf.name)
             for line in openf:
-                sent_text = nltk.sent_tokenize(line)
+                sent_text = sent_tokenize(line)
                 for sentence in sent_text:
                     tokens1 = tokenize(sentence)
                     tokens1 = [item.translate(remove_punct_map)
@@ -627,10 +442,8 @@ for f in files:
                     tokens1 = [x for x in tokens1 if x!= ""]
                     for token in tokens1:
                         tokens.append(token)
-                        tokens_total.append(token)
                 #if random.random() > .99:
                 #print(tokens)
-    #print(tokens_total)
         texts_data.append(tokens)
 
 print(filelabels_fr)
@@ -766,7 +579,8 @@ G.remove_edges_from(e)
 
 def draw_graph(G):
     weights = [(G[tpl[0]][tpl[1]]['correlation']) for tpl in G.edges()]
-    normalized_weights = [400*weight/sum(weights) for weight in weights]
+    total_weight = sum(weights)
+    normalized_weights = [400*weight/total_weight for weight in weights]
     fig, ax = plt.subplots(figsize=(25, 16))
     pos=nx.spring_layout(G)
     labels1 = dict([x for x in enumerate(labels)])
@@ -800,6 +614,16 @@ import matplotlib.pyplot as plt
 draw_graph(G) # Here is our bilingual corpus
 
 
+# In[ ]:
+
+
+# Faster for large corpora: only the 5 strongest edges of every node are drawn, and the layout is cached in layouts/
+
+from graph_drawing import draw_corpus
+
+draw_corpus(np.asarray(similarity_matrix)['correlation'], labels, k = 5, cache_dir = 'layouts')
+
+
 # # This is our bilingual English and French corpus; the nodes are the poems represented as correlated vectors based off of the wiki multilingual word embeddings that we aligned in FastText. 
 
 # In[41]:
@@ -836,20 +660,21 @@ weights = [(tpl,(G[tpl[0]][tpl[1]]['correlation'])) for tpl in G.edges()]
 
 
 
-Sorted_weights = sorted(weights, key = lambda t: t[1], reverse = True)
+from ranking import Ranking
+Sorted_weights = Ranking.edges(G, 'correlation')
 
 
 # In[45]:
 
 
-print(Sorted_weights[0]) # the strongest correlation
+print(Sorted_weights.first()) # the strongest correlation
 
 
 # In[46]:
 
 
 
-print(Sorted_weights[(len(Sorted_weights)-1)]) # the weakest correlation
+print(Sorted_weights.last()) # the weakest correlation
 
 
 # In[ ]:
@@ -911,20 +736,20 @@ filelabels_total.update(filelabels_fr)
 
 
 Degrees = G.degree(weight = "correlation")
-Sorted_degrees = sorted(Degrees, key = lambda t: t[1], reverse = True)
+Sorted_degrees = Ranking.from_items(Degrees)
 
 
 # In[71]:
 
 
 
-Sorted_degrees[0] #node with the highest degree
+Sorted_degrees.first() #node with the highest degree
 
 
 # In[72]:
 
 
-Sorted_degrees[len(Sorted_degrees)-1] #node with the lowest degree
+Sorted_degrees.last() #node with the lowest degree
 
 
 # In[73]:
@@ -944,7 +769,7 @@ filelabels_total[22]
 # In[76]:
 
 
-print(Sorted_degrees)
+print(list(Sorted_degrees))
 
 
 # In[77]:
@@ -952,8 +777,7 @@ print(Sorted_degrees)
 
 
 clo_cen = nx.closeness_centrality(G)
-import operator
-c = sorted(clo_cen.items(), key=operator.itemgetter(1), reverse=True)
+c = list(Ranking.from_items(clo_cen.items()))
 print("Closeness centralities for G:", c)
 
 
@@ -962,7 +786,7 @@ print("Closeness centralities for G:", c)
 
 # Weighted Closeness Centrality:
 clo_cen_w = nx.closeness_centrality(G, distance = 'correlation')
-c_w = sorted(clo_cen_w.items(), key=operator.itemgetter(1), reverse=True)
+c_w = list(Ranking.from_items(clo_cen_w.items()))
 print("Weighted closeness centralities for G in decreasing order", c_w)
 
 
@@ -971,7 +795,7 @@ print("Weighted closeness centralities for G in decreasing order", c_w)
 
 #Betweeness centrality
 bet_cen = nx.betweenness_centrality(G, weight = "correlation")
-bet = sorted(bet_cen.items(), key=operator.itemgetter(1), reverse=True)
+bet = list(Ranking.from_items(bet_cen.items()))
 print("Betweenness centralities for G in decreasing order:", bet)
 
 
@@ -980,7 +804,7 @@ print("Betweenness centralities for G in decreasing order:", bet)
 
 #Eigenvector centrality
 eigenvector_centrality = nx.eigenvector_centrality(G, weight = "correlation")
-eigenvector = sorted(eigenvector_centrality.items(), key=operator.itemgetter(1), reverse=True)
+eigenvector = list(Ranking.from_items(eigenvector_centrality.items()))
 print("Eigenvector centralities for G in decreasing order:", eigenvector)
 
 
@@ -1073,14 +897,14 @@ print(weights_en_to_fr[0])
 
 
 
-Sorted_weights_en_to_fr = sorted(weights_en_to_fr, key = lambda t: t[1], reverse = True)
+Sorted_weights_en_to_fr = Ranking.edges(G, 'correlation', filelabels_en, filelabels_fr)
 
 
 # In[53]:
 
 
 
-Sorted_weights_en_to_fr[0]
+Sorted_weights_en_to_fr.first()
 
 
 # In[90]:
@@ -1189,6 +1013,46 @@ for i in range(len(List_poem_itinerary)):
     Itinerary_names.append(List_poem_itinerary[i][1])
 
 
+# # The same EN-FR block can be walked in other ways too (see itinerary.py and benchmarks/bench_itinerary.py): beam search on cumulative or mean weight, weakest-first, or the best route of bounded length
+
+# In[ ]:
+
+
+from itinerary import NeighbourIndex, STRATEGIES
+
+neighbour_index = NeighbourIndex.from_vectors(vect_total, n_en = len(filelabels1))
+
+Beam_itinerary = STRATEGIES['beam'](neighbour_index, beam_width = 8).labelled(filelabels_total)
+Weakest_first_itinerary = STRATEGIES['weakest_first'](neighbour_index).labelled(filelabels_total)
+Bounded_itinerary = STRATEGIES['bounded_best'](neighbour_index, max_length = 12, branch = 4).labelled(filelabels_total)
+
+
+# In[ ]:
+
+
+# To generate and rank journeys from many starting edges at once, save the poem vectors and run e.g.
+# python batch_itineraries.py vect_total.npy --n-en 200 --top-n 5000 --out journeys.jsonl
+
+np.save('vect_total.npy', np.array(vect_total))
+
+
+# # For live readings the journey can also be streamed: every verse is printed as soon as the walk reaches its poem (the poems are read in place, nothing is moved)
+
+# In[ ]:
+
+
+from itinerary import iter_greedy
+from journey import stream_journey, poem_lines_from_dirs
+
+poem_lines = poem_lines_from_dirs(filelabels_total, len(filelabels1), HOME + "/cannes_&_stuff/", HOME + "/cannes_fr/")
+
+for node, label, line_of_verse, score in stream_journey(iter_greedy(neighbour_index), vect_total, filelabels_total, poem_lines,
+                                                         dictionaries = {'en': en_dictionary, 'fr': fr_dictionary},
+                                                         stopwords = {'en': resources.stopwords('stop_words_poetry.txt'), 'fr': stopwords},
+                                                         n_en = len(filelabels1)):
+    print(line_of_verse)
+
+
 # In[ ]:
 
 
@@ -1224,7 +1088,7 @@ for y in Oceano:
         #count = count + 1
         #filelabels_fr[count] = os.path.basename(openf.name)
         #for line in y:
-            #sent_text = nltk.sent_tokenize(line)
+            #sent_text = sent_tokenize(line)
         
         tokens1 = tokenize(y)
         tokens1 = [item.translate(remove_punct_map)
@@ -1233,10 +1097,8 @@ for y in Oceano:
         tokens1 = [x for x in tokens1 if x!= ""]
         for token in tokens1:
                     tokens.append(token)
-                    #tokens_total.append(token)
                 #if random.random() > .99:
                 #print(tokens)
-    #print(tokens_total)
         texts_tokens.append(tokens)
 
 
@@ -1367,14 +1229,13 @@ pwd
 cd ..
 
 
-# # We need to move all--and only--the poems on our route into a new directory. We start with the EN ones and then do the same with the FR poems on the route.
+# # Instead of moving the poems on our route out of the corpus directories (which changed the corpus for the next run), we pack the whole corpus once into an indexed archive and read any poem by its node number:
 
 # In[83]:
 
 
-import shutil 
 import os 
-import logging
+from corpus_store import PackedCorpus
 
 
 # In[84]:
@@ -1386,13 +1247,11 @@ HOME = os.getcwd()
 # In[85]:
 
 
-source = HOME + "/cannes_&_stuff/"
-
-
-# In[91]:
+if not os.path.exists(HOME + "/cannes_corpus.idx.npz"):
+    PackedCorpus.build(HOME + "/cannes_corpus", [(HOME + "/cannes_&_stuff/", 'en', None),
+                                                 (HOME + "/cannes_fr/", 'fr', len(filelabels_fr))])
 
-
-destination = HOME + "/cannes_itinerary"
+corpus_store = PackedCorpus(HOME + "/cannes_corpus")
 
 
 # In[89]:
@@ -1407,77 +1266,13 @@ print(Itinerary_names)
 len(Itinerary_names)
 
 
-# In[90]:
-
-
-files = os.listdir(source)
-
-
-# In[93]:
-
-
-for f in files:
-    if f in Itinerary_names:
-        shutil.move(source+f, destination)
-
-
-# Now the FR ones:
-
-# In[94]:
-
-
-
-source = HOME + "/cannes_fr/"
-
-
-# In[95]:
-
-
-files = os.listdir(source)
-
-
-# In[96]:
-
-
-for f in files:
-    if f in Itinerary_names:
-        shutil.move(source+f, destination)
-
-
-# # Now that we got all the poems needed into one directory, we convert each of them into a list of lines (in which every element is a line in that specific poem) and consolidate these lists into a list of lists whose order of elements is the one of destinations on our route:
+# # We convert each poem on the route into a list of lines (in which every element is a line in that specific poem) and consolidate these lists into a list of lists whose order of elements is the one of destinations on our route:
 
 # In[226]:
 
 
 
-HOME = os.getcwd()
-
-Poems_Dir = HOME + "/cannes_itinerary/"
-#Poems_Dir = HOME
-
-os.chdir(Poems_Dir)
-lines = [i for i in range(len(Itinerary_names))]
-
-for i in range(len(List_poem_itinerary)):
-    lines_1 = []
-    with open (List_poem_itinerary[i][1], 'rt') as file:
-        for line in file:
-                line = line.replace('\\n', ' ')
-                line = line.replace('\\r', ' ')
-                line = line.replace('\\t', ' ')
-                pattern = re.compile(r'\s+')
-                line = re.sub(pattern, ' ', line)
-                line = line.strip()
-                line = line.lower()
-                # check for empty strings
-                if line != '' and line is not None:
-                    lines_1.append(line)
-        lines[i] = lines_1
-    
-    
-    
-
-        
+lines = [corpus_store.poem_lines(node) for node, label in List_poem_itinerary]
 
 
 # In[227]:
@@ -1575,7 +1370,7 @@ lines[189]
 
 
 
-stopwords_0 = nltk.corpus.stopwords.words('stop_words_poetry.txt')
+stopwords_0 = resources.stopwords('stop_words_poetry.txt')
 
 
 # In[229]:
@@ -1871,3 +1666,24 @@ for line_of_verse in Bilingual_Corpus_Journey_Poem:
 
 
 
+# # The run is kept as columnar tables (see run_artifacts.py) rather than printed: the nodes with their centralities, the strongest EN-FR edges, the itinerary and the selected lines
+
+# In[ ]:
+
+
+from run_artifacts import RunWriter, write_edges, write_itinerary, write_lines, write_nodes
+
+route_nodes = [node for node, label in List_poem_itinerary]
+
+with RunWriter('runs', metadata = {'notebook': 'Copy12'}) as run:
+    write_nodes(run, filelabels_total, len(filelabels1), vect_total,
+                centralities = {'closeness': clo_cen, 'closeness_weighted': clo_cen_w,
+                                'betweenness': bet_cen, 'eigenvector_nx': eigenvector_centrality})
+    write_edges(run, vect_total, len(filelabels1), k = 10)
+    write_itinerary(run, route_nodes, [float(dot(vect_total[u], vect_total[v]))
+                                       for u, v in zip(route_nodes, route_nodes[1:])], filelabels_total)
+    write_lines(run, [(node, label, lines[i][cos_max[i][0]], float(cos_max[i][1]))
+                      for i, (node, label) in enumerate(List_poem_itinerary[:len(lines)])])
+
+print(run.path)
+
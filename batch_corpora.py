@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Multi-corpus batch mode: run the journey over many corpus pairs in one job,
+loading and aligning every pair of embedding tables once instead of once per
+corpus.
+
+The job file is a JSON object: 'config' overrides DEFAULT_CONFIG for every
+corpus (the embedding tables, the tokenizer, ...) and every entry of
+'corpora' is a named set of further overrides, typically the corpus
+directories, the stopword lists and the strategy and its start. The EN/FR
+boundary of the walk (the notebook's i < 200) is the number of EN poems of
+each corpus, so it needs no setting:
+
+    {"config": {"en_vectors": "wiki.en.vec", "fr_vectors": "wiki.fr.vec"},
+     "corpora": [
+        {"name": "cannes", "en_dir": "cannes_&_stuff", "fr_dir": "cannes_fr"},
+        {"name": "oceano", "en_dir": "oceano_en", "fr_dir": "oceano_fr",
+         "strategy": "beam", "strategy_options": {"beam_width": 4}}]}
+
+The parent process builds the aligned FastVector tables of every distinct
+(en_vectors, fr_vectors) pair and publishes them in shared memory; a process
+pool runs the stage-cached pipeline of every corpus against them, attached
+zero-copy, so the workers never parse or hold their own copy of the tables.
+Results are streamed to a JSON-lines file, one line per corpus, and the job
+reports its throughput in corpora per hour.
+```
+Usage:
+    $ python batch_corpora.py trips.json --workers 4 --out corpora.jsonl
+```
+"""
+
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline import DEFAULT_CONFIG, Pipeline
+
+
+def load_job(path):
+    """(config, corpora) of a job file; every corpus must have a unique name."""
+    with open(path) as f:
+        job = json.load(f)
+    config, corpora = job.get('config', {}), job['corpora']
+    names = [corpus['name'] for corpus in corpora]
+    if len(set(names)) != len(names):
+        raise ValueError('corpus names must be unique')
+    return config, corpora
+
+
+def _tables(config):
+    return config['en_vectors'], config['fr_vectors']
+
+
+_worker = {}
+
+
+def _init_worker(config, handles, cache_dir):
+    _worker.update(config=config, handles=handles, cache_dir=cache_dir, dictionaries={})
+
+
+def _dictionaries(tables):
+    """The tables' EN and aligned FR FastVector, attached once per worker."""
+    from fastvector import FastVector
+    if tables not in _worker['dictionaries']:
+        _worker['dictionaries'][tables] = {
+            lang: FastVector.attach(handle)
+            for lang, handle in _worker['handles'][tables].items()}
+    return _worker['dictionaries'][tables]
+
+
+def _run_corpus(corpus, until):
+    overrides = {key: value for key, value in corpus.items() if key != 'name'}
+    config = dict(DEFAULT_CONFIG, **dict(_worker['config'], **overrides))
+    start = time.perf_counter()
+    record = {'name': corpus['name']}
+    try:
+        pipeline = Pipeline(config, cache_dir=_worker['cache_dir'], verbose=False,
+                            dictionaries=_dictionaries(_tables(config)))
+        pipeline.get(until)
+        vectors, route = pipeline.get('dedup'), pipeline.get('itinerary')
+        record.update(status='ok', poems=len(vectors['filelabels']), n_en=vectors['n_en'],
+                      route=len(route['nodes']), weight=float(route['weights'].sum()),
+                      stages=pipeline.status)
+        if until == 'export':
+            record['run'] = pipeline.get('export')['run']
+    except Exception as e:
+        record.update(status='error', error='%s: %s' % (type(e).__name__, e),
+                      traceback=traceback.format_exc())
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def run_job(config, corpora, out_path, cache_dir='.journey_cache', workers=None,
+            until=None):
+    """
+    Run every corpus in a process pool sharing the aligned tables and
+    stream one JSON record per corpus to out_path as they finish. until is
+    the last stage to evaluate (by default export when runs_dir is set,
+    else line_selection). A failing corpus is recorded, not raised. Returns
+    a summary with the counts and the throughput in corpora per hour.
+    """
+    job_start = time.perf_counter()
+    resolved = [dict(DEFAULT_CONFIG, **dict(config, **corpus)) for corpus in corpora]
+    for corpus_config in resolved:
+        del corpus_config['name']
+    if until is None:
+        until = 'export' if all(c['runs_dir'] for c in resolved) else 'line_selection'
+    shared, handles = [], {}
+    try:
+        for corpus_config in resolved:
+            tables = _tables(corpus_config)
+            if tables not in handles:
+                # the embeddings and align stages, cached, in this process only
+                dictionaries = Pipeline(corpus_config, cache_dir=cache_dir).dictionaries()
+                handles[tables] = {}
+                for lang, dictionary in dictionaries.items():
+                    shared.append(dictionary.share())
+                    handles[tables][lang] = shared[-1].handle
+        load_seconds = time.perf_counter() - job_start
+        done, failed = 0, 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(config, handles, cache_dir)) as pool, \
+                open(out_path, 'w') as fout:
+            futures = [pool.submit(_run_corpus, corpus, until) for corpus in corpora]
+            for future in as_completed(futures):
+                record = future.result()
+                done += 1
+                failed += record['status'] != 'ok'
+                fout.write(json.dumps(record, default=str) + '\n')
+                fout.flush()
+                print('%-20s %-6s %6.1fs  %s'
+                      % (record['name'], record['status'], record['seconds'],
+                         record.get('error') or '%d poems, route of %d'
+                         % (record['poems'], record['route'])))
+    finally:
+        for segment in shared:
+            segment.close()
+    elapsed = time.perf_counter() - job_start
+    return {'corpora': done, 'failed': failed, 'tables': len(handles),
+            'load_seconds': load_seconds, 'seconds': elapsed,
+            'corpora_per_hour': 3600. * done / elapsed if elapsed else 0.}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('job', help='JSON job file: {"config": {...}, "corpora": [...]}')
+    parser.add_argument('--cache-dir', default='.journey_cache')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--until', choices=['itinerary', 'line_selection', 'export'],
+                        help='last stage to evaluate per corpus')
+    parser.add_argument('--out', default='corpora.jsonl')
+    args = parser.parse_args()
+
+    config, corpora = load_job(args.job)
+    summary = run_job(config, corpora, args.out, cache_dir=args.cache_dir,
+                      workers=args.workers, until=args.until)
+    print('%d corpora (%d failed) in %.1fs, tables loaded in %.1fs: %.1f corpora per hour'
+          % (summary['corpora'], summary['failed'], summary['seconds'],
+             summary['load_seconds'], summary['corpora_per_hour']))
+    print('results in %s' % args.out)
+
+
+if __name__ == '__main__':
+    main()
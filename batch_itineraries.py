@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Batch mode: generate and rank many journeys at once, starting from the top-N
+EN-FR edges or from every EN poem, instead of the single itinerary that
+starts at Sorted_weights_en_to_fr[0].
+
+Walks run in a process pool. The neighbour index is published once in shared
+memory and every worker attaches to it zero-copy. Routes are deduplicated and
+streamed to a JSON-lines file together with their statistics, so thousands of
+candidate journeys can be produced in one job.
+```
+Usage:
+    $ python batch_itineraries.py vect_total.npy --n-en 200 --top-n 5000 \\
+          --strategy beam --out journeys.jsonl
+```
+"""
+
+import argparse
+import heapq
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from itinerary import NeighbourIndex, STRATEGIES
+from ranking import top_k
+
+
+def start_edges(index, top_n=None, every_en=False):
+    """
+    Starting edges for a batch, strongest first: the top_n strongest EN-FR
+    edges, or (every_en) the strongest edge of each EN poem.
+    """
+    n_en_entries = index.indptr[index.n_en]
+    if every_en:
+        nodes = np.flatnonzero(np.diff(index.indptr[:index.n_en + 1]) > 0)
+        firsts = index.weights[index.indptr[nodes]]
+        return [(int(nodes[i]), int(index.indices[index.indptr[nodes[i]]]))
+                for i in np.argsort(-firsts, kind='stable')]
+    weights = index.weights[:n_en_entries]
+    top_n = min(n_en_entries if top_n is None else top_n, n_en_entries)
+    positions = top_k(weights, top_n)
+    nodes = np.searchsorted(index.indptr, positions, side='right') - 1
+    return [(int(u), int(index.indices[p])) for u, p in zip(nodes, positions)]
+
+
+_worker = {}
+
+
+def _init_worker(handle, strategy, strategy_kwargs):
+    _worker['index'] = NeighbourIndex.attach(handle)
+    _worker['strategy'] = STRATEGIES[strategy]
+    _worker['kwargs'] = strategy_kwargs
+
+
+def _walk(start):
+    route = _worker['strategy'](_worker['index'], start=start, **_worker['kwargs'])
+    return start, route.nodes, route.weights
+
+
+def run_batch(index, starts, out_path, strategy='greedy', strategy_kwargs=None,
+              workers=None, chunksize=16, rank_by='total', keep_top=10):
+    """
+    Walk from every start edge in a process pool and stream the distinct
+    routes to out_path, one JSON object per line. Returns a summary with the
+    number of walks, distinct routes and duplicates, plus the keep_top best
+    routes ranked by rank_by ('total', 'mean', 'length' or 'min').
+    """
+    strategy_kwargs = strategy_kwargs or {}
+    seen = set()
+    ranked = []
+    walks = 0
+    with index.share() as shared, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(shared.handle, strategy,
+                                          strategy_kwargs)) as pool, \
+            open(out_path, 'w') as fout:
+        for start, nodes, weights in pool.map(_walk, starts, chunksize=chunksize):
+            walks += 1
+            key = tuple(nodes)
+            if key in seen:
+                continue
+            seen.add(key)
+            record = {'start': list(start), 'nodes': nodes, 'weights': weights}
+            record.update(_stats(weights, len(nodes)))
+            fout.write(json.dumps(record) + '\n')
+            item = (record[rank_by], len(seen), record)
+            if len(ranked) < keep_top:
+                heapq.heappush(ranked, item)
+            else:
+                heapq.heappushpop(ranked, item)
+    best = [record for _, _, record in sorted(ranked, key=lambda t: (-t[0], t[1]))]
+    return {'walks': walks, 'routes': len(seen),
+            'duplicates': walks - len(seen), 'best': best}
+
+
+def _stats(weights, length):
+    total = float(sum(weights))
+    return {'length': length,
+            'total': total,
+            'mean': total / len(weights) if weights else 0.,
+            'min': float(min(weights)) if weights else 0.}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('vectors', help='.npy file holding vect_total, EN rows first')
+    parser.add_argument('--n-en', type=int, required=True,
+                        help='number of EN poems (rows) in the vectors file')
+    parser.add_argument('--k', type=int, default=None,
+                        help='keep only the k strongest neighbours per node')
+    parser.add_argument('--top-n', type=int, default=1000,
+                        help='start from the top-N strongest EN-FR edges')
+    parser.add_argument('--every-en', action='store_true',
+                        help='start from the strongest edge of every EN poem')
+    parser.add_argument('--strategy', default='greedy', choices=sorted(STRATEGIES))
+    parser.add_argument('--beam-width', type=int, default=None)
+    parser.add_argument('--max-length', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--rank-by', default='total',
+                        choices=['total', 'mean', 'length', 'min'])
+    parser.add_argument('--out', default='journeys.jsonl')
+    args = parser.parse_args()
+
+    index = NeighbourIndex.from_vectors(np.load(args.vectors), args.n_en, k=args.k)
+    starts = start_edges(index, top_n=args.top_n, every_en=args.every_en)
+    strategy_kwargs = {}
+    if args.beam_width is not None:
+        strategy_kwargs['beam_width'] = args.beam_width
+    if args.max_length is not None:
+        strategy_kwargs['max_length'] = args.max_length
+
+    summary = run_batch(index, starts, args.out, strategy=args.strategy,
+                        strategy_kwargs=strategy_kwargs, workers=args.workers,
+                        rank_by=args.rank_by)
+    print('%d walks, %d distinct routes (%d duplicates) written to %s'
+          % (summary['walks'], summary['routes'], summary['duplicates'], args.out))
+    for record in summary['best']:
+        print('start %s: %d nodes, total %.4f, mean %.4f'
+              % (tuple(record['start']), record['length'], record['total'],
+                 record['mean']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Cold-start cost of the journey modules: every module is imported in a fresh
+interpreter (several times, the median is kept) and its wall time, the
+cumulative import time reported by -X importtime and the heaviest third-party
+imports it pulls in are recorded. Results are written as JSON so that
+regressions can be tracked with --compare.
+
+    $ python benchmarks/bench_import.py --out imports.json
+    $ python benchmarks/bench_import.py --compare imports.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODULES = ['resources', 'preprocessing', 'vocabulary', 'fastvector', 'poem_vectors',
+           'itinerary', 'journey', 'corpus_store', 'table_loader', 'pipeline',
+           'journey_service', 'graph_drawing', 'token_store', 'incremental_index', 'ranking',
+           'dedup', 'clustered_itinerary', 'run_artifacts', 'batch_corpora',
+           'multilingual', 'weighting', 'subwords', 'lexicon']
+
+
+def _importtime(module):
+    """(wall seconds, {top-level package: cumulative seconds}) of one import."""
+    code = ('import time; t0 = time.perf_counter(); import %s; '
+            'print(time.perf_counter() - t0)' % module)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.strip()
+        if '.' not in name:
+            # a package (or module) root, with everything it imported
+            packages[name] = max(packages.get(name, 0.), int(cumulative) / 1e6)
+    return float(proc.stdout.strip().splitlines()[-1]), packages
+
+
+def run(modules, repeat):
+    results = {}
+    for module in modules:
+        try:
+            runs = [_importtime(module) for _ in range(repeat)]
+        except RuntimeError as exc:
+            print('%-16s failed: %s' % (module, exc))
+            results[module] = {'error': str(exc)}
+            continue
+        seconds = statistics.median(wall for wall, _ in runs)
+        heaviest = sorted(runs[-1][1].items(), key=lambda item: -item[1])[:5]
+        results[module] = {'seconds': seconds,
+                           'heaviest': [{'package': p, 'seconds': s} for p, s in heaviest]}
+        print('%-16s %8.3fs   %s' % (module, seconds, ', '.join(
+            '%s %.3fs' % (p, s) for p, s in heaviest if p != module)))
+    return results
+
+
+def compare(results, baseline):
+    print('\n%-16s %10s %10s %8s' % ('module', 'baseline', 'now', 'ratio'))
+    for module, record in results.items():
+        old = baseline.get('modules', {}).get(module, {})
+        if 'seconds' in record and 'seconds' in old:
+            print('%-16s %9.3fs %9.3fs %7.2fx' % (module, old['seconds'], record['seconds'],
+                                                 record['seconds'] / old['seconds']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='write the results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    args = parser.parse_args()
+
+    results = run(args.modules, args.repeat)
+    if args.out:
+        with open(args.out, 'w') as fout:
+            json.dump({'python': sys.version.split()[0], 'modules': results}, fout, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
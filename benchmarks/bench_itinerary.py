@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Route quality and runtime of every itinerary strategy on one shared
+neighbour index, built from synthetic poem vectors.
+
+    $ python benchmarks/bench_itinerary.py --en 200 --fr 100 --dim 300
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from itinerary import NeighbourIndex, STRATEGIES
+from synthetic import synthetic_vectors
+
+
+def run(n_en, n_fr, dim, k, beam_width, max_length, seed):
+    vectors = synthetic_vectors(n_en, n_fr, dim, seed)
+    t0 = time.perf_counter()
+    index = NeighbourIndex.from_vectors(vectors, n_en, k=k)
+    index_time = time.perf_counter() - t0
+
+    runs = [
+        ('greedy', 'greedy', {}),
+        ('weakest_first', 'weakest_first', {}),
+        ('beam', 'beam', {'beam_width': beam_width}),
+        ('beam_mean', 'beam', {'beam_width': beam_width, 'objective': 'mean'}),
+        ('bounded_best', 'bounded_best', {'max_length': max_length, 'branch': 4}),
+    ]
+    results = {'n_en': n_en, 'n_fr': n_fr, 'dim': dim, 'k': k,
+               'index_seconds': index_time, 'strategies': {}}
+    for name, strategy_name, kwargs in runs:
+        strategy = STRATEGIES[strategy_name]
+        t0 = time.perf_counter()
+        route = strategy(index, **kwargs)
+        elapsed = time.perf_counter() - t0
+        stats = route.stats()
+        stats['seconds'] = elapsed
+        results['strategies'][name] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--en', type=int, default=200)
+    parser.add_argument('--fr', type=int, default=100)
+    parser.add_argument('--dim', type=int, default=300)
+    parser.add_argument('--k', type=int, default=None,
+                        help='keep only the k strongest neighbours per node')
+    parser.add_argument('--beam-width', type=int, default=8)
+    parser.add_argument('--max-length', type=int, default=10,
+                        help='route length bound for bounded_best')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = run(args.en, args.fr, args.dim, args.k, args.beam_width,
+                  args.max_length, args.seed)
+    print('neighbour index: %.3fs' % results['index_seconds'])
+    print('%-14s %7s %10s %8s %8s %10s'
+          % ('strategy', 'length', 'total', 'mean', 'min', 'seconds'))
+    for name, s in results['strategies'].items():
+        print('%-14s %7d %10.3f %8.4f %8.4f %10.4f'
+              % (name, s['length'], s['total'], s['mean'], s['min'], s['seconds']))
+    if args.json:
+        with open(args.json, 'w') as fout:
+            json.dump(results, fout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Time and memory of every stage of the journey on a synthetic corpus.
+
+Generates .vec files and EN/FR poem directories at the requested scale
+(vocabulary, dimensions, poems, lines), then runs the stages the notebook
+runs: FastVector load, alignment, tokenization, poem vectors, similarity,
+centralities, walk and line selection. Results are written as JSON so that
+runs of different versions can be compared with --compare.
+
+    $ python benchmarks/bench_pipeline.py --scale small --out bench.json
+    $ python benchmarks/bench_pipeline.py --scale small --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from instrumentation import peak_rss_mb
+from synthetic import make_corpus
+
+SCALES = {
+    'tiny': {'vocab': 2000, 'dim': 50, 'en_poems': 40, 'fr_poems': 20, 'lines': 10},
+    'small': {'vocab': 20000, 'dim': 100, 'en_poems': 200, 'fr_poems': 100, 'lines': 20},
+    'medium': {'vocab': 100000, 'dim': 300, 'en_poems': 1000, 'fr_poems': 500, 'lines': 25},
+    'large': {'vocab': 400000, 'dim': 300, 'en_poems': 5000, 'fr_poems': 2500, 'lines': 30},
+}
+
+
+class StageTimer:
+    """Collects wall time, CPU time, peak RSS and (optionally) peak traced
+    allocations of each stage."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn(*args, **kwargs)
+        record = {'seconds': time.perf_counter() - wall,
+                  'cpu_seconds': time.process_time() - cpu,
+                  'peak_rss_mb': peak_rss_mb()}
+        if self.trace_memory:
+            record['peak_alloc_mb'] = tracemalloc.get_traced_memory()[1] / 2.**20
+            tracemalloc.stop()
+        self.stages[name] = record
+        print('%-16s %9.3fs  rss %8.1f MB' % (name, record['seconds'],
+                                               record['peak_rss_mb']))
+        return result
+
+
+def run(paths, timer, skip=()):
+    from fastvector import FastVector, make_training_matrices, learn_transformation
+    from itinerary import NeighbourIndex, greedy
+    from journey import poem_lines_from_dirs, stream_journey
+    from poem_vectors import text_vector
+    from preprocessing import ingest_directory
+
+    en = timer.run('load_en', FastVector, vector_file=paths['en_vectors'])
+    fr = timer.run('load_fr', FastVector, vector_file=paths['fr_vectors'])
+
+    def align():
+        overlap = list(set(en.word2id) & set(fr.word2id))
+        source_matrix, target_matrix = make_training_matrices(
+            fr, en, [(entry, entry) for entry in overlap])
+        fr.apply_transform(learn_transformation(source_matrix, target_matrix))
+    timer.run('align', align)
+
+    def tokenize_corpus():
+        en_labels, en_texts = ingest_directory(paths['en_dir'], paths['en_stopwords'])
+        fr_labels, fr_texts = ingest_directory(paths['fr_dir'], paths['fr_stopwords'],
+                                               first_id=len(en_labels))
+        return en_labels, en_texts, fr_labels, fr_texts
+    en_labels, en_texts, fr_labels, fr_texts = timer.run('tokenize', tokenize_corpus)
+    n_en = len(en_texts)
+    filelabels_total = dict(en_labels)
+    filelabels_total.update(fr_labels)
+
+    vectors = timer.run('poem_vectors', lambda: np.array(
+        [text_vector(tokens, en) for tokens in en_texts]
+        + [text_vector(tokens, fr) for tokens in fr_texts]))
+
+    similarity = timer.run('similarity', np.matmul, vectors, vectors.transpose())
+
+    if 'centralities' not in skip:
+        def centralities():
+            import networkx as nx
+            # Dijkstra-based centralities reject the negative similarities
+            # random synthetic words produce, which real corpora rarely have
+            graph = nx.from_numpy_array(np.clip(similarity, 1e-9, None),
+                                        edge_attr='correlation')
+            graph.remove_edges_from(nx.selfloop_edges(graph))
+            graph.degree(weight='correlation')
+            nx.closeness_centrality(graph, distance='correlation')
+            nx.betweenness_centrality(graph, weight='correlation')
+            nx.eigenvector_centrality(graph, weight='correlation', max_iter=1000)
+        timer.run('centralities', centralities)
+
+    def walk():
+        index = NeighbourIndex.from_block(similarity[:n_en, n_en:])
+        return greedy(index)
+    route = timer.run('walk', walk)
+
+    def select_lines():
+        steps = zip(route.nodes, [None] + route.weights)
+        poem_lines = poem_lines_from_dirs(filelabels_total, n_en,
+                                          paths['en_dir'], paths['fr_dir'])
+        return list(stream_journey(steps, vectors, filelabels_total, poem_lines,
+                                   {'en': en, 'fr': fr},
+                                   {'en': paths['en_stopwords'],
+                                    'fr': paths['fr_stopwords']}, n_en))
+    timer.run('line_selection', select_lines)
+
+
+def compare(current, baseline):
+    print('\n%-16s %10s %10s %8s' % ('stage', 'baseline', 'current', 'ratio'))
+    for name, record in current['stages'].items():
+        if name not in baseline['stages']:
+            continue
+        before = baseline['stages'][name]['seconds']
+        ratio = record['seconds'] / before if before else float('nan')
+        print('%-16s %9.3fs %9.3fs %7.2fx' % (name, before, record['seconds'], ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', default='small', choices=sorted(SCALES))
+    parser.add_argument('--vocab', type=int)
+    parser.add_argument('--dim', type=int)
+    parser.add_argument('--en-poems', type=int)
+    parser.add_argument('--fr-poems', type=int)
+    parser.add_argument('--lines', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir',
+                        help='where to generate (and reuse) the synthetic data')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record peak traced allocations (slower)')
+    parser.add_argument('--skip', nargs='*', default=[],
+                        help='stages to skip, e.g. centralities')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+    data_dir = args.data_dir or os.path.join(
+        tempfile.gettempdir(), 'journey-bench-%s' % '-'.join(
+            str(scale[k]) for k in sorted(scale)) + '-%d' % args.seed)
+
+    print('generating synthetic corpus in %s' % data_dir)
+    paths = make_corpus(data_dir, seed=args.seed, **scale)
+
+    timer = StageTimer(trace_memory=args.trace_memory)
+    run(paths, timer, skip=args.skip)
+
+    results = {
+        'scale': scale,
+        'seed': args.seed,
+        'trace_memory': args.trace_memory,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'stages': timer.stages,
+    }
+    if args.out:
+        with open(args.out, 'w') as fout:
+            json.dump(results, fout, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Check the degree and eigenvector centralities run_artifacts computes from
+the poem vectors against networkx on the notebook's G (the similarity graph
+with its self-loops removed), for a small synthetic corpus.
+
+    $ python benchmarks/check_centralities.py --en 60 --fr 40 --dim 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from run_artifacts import vector_centralities
+from synthetic import synthetic_vectors
+
+
+def run(n_en, n_fr, dim, seed):
+    import networkx as nx
+    # poem vectors share a strong common direction, so their similarities
+    # are positive, as on real corpora (nx's power iteration needs it)
+    vectors = np.abs(synthetic_vectors(n_en, n_fr, dim, seed))
+    t0 = time.perf_counter()
+    computed = vector_centralities(vectors)
+    vector_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    graph = nx.from_numpy_array(np.matmul(vectors, vectors.transpose()),
+                                edge_attr='correlation')
+    graph.remove_edges_from(nx.selfloop_edges(graph))
+    degree = dict(graph.degree(weight='correlation'))
+    eigenvector = nx.eigenvector_centrality(graph, weight='correlation', max_iter=10000,
+                                            tol=1e-12)
+    graph_seconds = time.perf_counter() - t0
+    nodes = range(n_en + n_fr)
+    return {
+        'degree': float(np.max(np.abs(computed['degree'] - [degree[n] for n in nodes]))),
+        'eigenvector': float(np.max(np.abs(computed['eigenvector']
+                                           - [eigenvector[n] for n in nodes]))),
+        'vector_seconds': vector_seconds,
+        'graph_seconds': graph_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--en', type=int, default=60)
+    parser.add_argument('--fr', type=int, default=40)
+    parser.add_argument('--dim', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    results = run(args.en, args.fr, args.dim, args.seed)
+    print('largest difference to networkx: degree %.2e, eigenvector %.2e'
+          % (results['degree'], results['eigenvector']))
+    print('vectors %.4fs, networkx %.4fs' % (results['vector_seconds'],
+                                             results['graph_seconds']))
+    if max(results['degree'], results['eigenvector']) > args.tolerance:
+        sys.exit('centralities differ from networkx')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Load test of the resident journey service: concurrent keep-alive clients
+send a mix of score, journey and best_line requests and the latency
+percentiles (p50, p90, p99) and throughput are reported per request kind.
+
+Either targets a running service, or (--synthetic) starts one in-process on
+a synthetic corpus, cached under --root.
+
+    $ python benchmarks/load_test_service.py --port 8765 --clients 32
+    $ python benchmarks/load_test_service.py --synthetic --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+MIX = {'score': .8, 'journey': .1, 'best_line': .1}
+
+
+async def _request(reader, writer, path, payload):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(('POST %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                  'Content-Length: %d\r\n\r\n' % (path, len(body))).encode('latin-1') + body)
+    await writer.drain()
+    status = (await reader.readline()).split(b' ', 2)[1]
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status == b'200'
+
+
+def _payload(kind, rng, texts, poems):
+    if kind == 'score':
+        lang = 'en' if rng.random() < .5 else 'fr'
+        return {'text': texts[lang][rng.integers(len(texts[lang]))], 'lang': lang}
+    return {'poem': int(rng.integers(poems))}
+
+
+async def _client(connect, n, kinds, texts, poems, latencies, errors, seed):
+    rng = np.random.default_rng(seed)
+    reader, writer = await connect()
+    try:
+        for kind in rng.choice(kinds, size=n, p=[MIX[k] for k in kinds]):
+            payload = _payload(kind, rng, texts, poems)
+            t0 = time.perf_counter()
+            ok = await _request(reader, writer, '/' + kind, payload)
+            latencies[kind].append(time.perf_counter() - t0)
+            errors[kind] += not ok
+    finally:
+        writer.close()
+
+
+async def load_test(connect, clients, requests, texts, poems, seed=0):
+    kinds = [kind for kind in MIX if kind != 'score' or texts]
+    latencies = {kind: [] for kind in kinds}
+    errors = {kind: 0 for kind in kinds}
+    per_client = max(1, requests // clients)
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_client(connect, per_client, kinds, texts, poems,
+                                   latencies, errors, seed + c)
+                           for c in range(clients)])
+    elapsed = time.perf_counter() - t0
+    results = {'clients': clients, 'seconds': elapsed,
+               'requests': per_client * clients,
+               'throughput': per_client * clients / elapsed, 'kinds': {}}
+    for kind, values in latencies.items():
+        if values:
+            ms = np.array(values) * 1000
+            results['kinds'][kind] = {
+                'requests': len(values), 'errors': errors[kind],
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p90_ms': float(np.percentile(ms, 90)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'max_ms': float(ms.max())}
+    return results
+
+
+def synthetic_service(root, batch_window, max_batch):
+    from journey_service import JourneyService
+    from pipeline import Pipeline
+    from synthetic import make_corpus
+    paths = make_corpus(root, vocab=20000, dim=100, en_poems=400, fr_poems=200,
+                        lines=15)
+    config = {key: paths[key] for key in ('en_vectors', 'fr_vectors', 'en_dir', 'fr_dir')}
+    config['fr_limit'] = None
+    for lang in ('en', 'fr'):
+        config[lang + '_stopwords'] = {'files': [], 'extra': paths[lang + '_stopwords']}
+    config['line_stopwords'] = {lang: config[lang + '_stopwords'] for lang in ('en', 'fr')}
+    pipeline = Pipeline(config, cache_dir=os.path.join(root, 'cache'), verbose=False)
+    service = JourneyService.from_pipeline(pipeline, batch_window=batch_window,
+                                           max_batch=max_batch)
+    texts = {lang: [line for node in range(first, first + 20)
+                    for line in service.poem_lines(node)]
+             for lang, first in (('en', 0), ('fr', service.n_en))}
+    return service, texts
+
+
+async def _run(args):
+    texts = {'en': ['the sea at night', 'a city of glass and rain'],
+             'fr': ['la mer la nuit', 'une ville de verre et de pluie']}
+    server = None
+    if args.synthetic:
+        service, texts = synthetic_service(args.root, args.batch_window, args.max_batch)
+        poems = len(service.filelabels)
+        service._queue = asyncio.Queue()
+        batcher = asyncio.ensure_future(service._batcher())
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        connect = lambda: asyncio.open_connection('127.0.0.1', port)
+    elif args.unix:
+        poems = args.poems
+        connect = lambda: asyncio.open_unix_connection(args.unix)
+    else:
+        poems = args.poems
+        connect = lambda: asyncio.open_connection(args.host, args.port)
+    try:
+        return await load_test(connect, args.clients, args.requests, texts, poems,
+                               args.seed)
+    finally:
+        if server is not None:
+            server.close()
+            batcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='connect to this Unix socket instead')
+    parser.add_argument('--poems', type=int, default=100,
+                        help='node ids to draw journey/best_line requests from')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='start an in-process service on a synthetic corpus')
+    parser.add_argument('--root', default=os.path.join(tempfile.gettempdir(),
+                                                       'journey-service-load'))
+    parser.add_argument('--batch-window', type=float, default=0.002)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print JSON results')
+    args = parser.parse_args()
+
+    results = asyncio.run(_run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print('%d requests from %d clients in %.2fs: %.0f requests/s'
+          % (results['requests'], results['clients'], results['seconds'],
+             results['throughput']))
+    print('%-10s %8s %6s %9s %9s %9s %9s' % ('request', 'count', 'errors',
+                                            'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for kind, row in results['kinds'].items():
+        print('%-10s %8d %6d %9.2f %9.2f %9.2f %9.2f'
+              % (kind, row['requests'], row['errors'], row['p50_ms'],
+                 row['p90_ms'], row['p99_ms'], row['max_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# coding: utf-8
+"""
+Synthetic stand-ins for the real inputs, which are either huge (wiki.*.vec)
+or private (the poem corpora): fastText-format .vec files with a partly
+shared EN/FR vocabulary, and directories of poems whose words follow a
+Zipf-like distribution over that vocabulary.
+"""
+
+import os
+
+import numpy as np
+
+
+def synthetic_vectors(n_en, n_fr, dim, seed=0):
+    """Mean-of-unit-vectors-like poem vectors, EN first then FR."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((8, dim))
+    mix = rng.dirichlet(np.ones(8) * .3, size=n_en + n_fr)
+    vectors = np.matmul(mix, topics) + .5 * rng.standard_normal((n_en + n_fr, dim))
+    return vectors / np.sqrt(dim)
+
+
+def vocabulary(size, prefix, shared=0, seed=0):
+    """
+    size distinct lower-case words; the first shared ones carry no prefix
+    and therefore appear in both languages, like numbers and names do.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    words, seen = [], set()
+    while len(words) < size:
+        length = int(rng.integers(2, 10))
+        word = ''.join(rng.choice(letters, length))
+        if len(words) >= shared:
+            word = prefix + word
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def write_vec(path, words, dim, seed=0, rotation=None):
+    """Write words with random vectors, optionally rotated, in .vec format."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((len(words), dim)).astype(np.float32)
+    if rotation is not None:
+        vectors = np.matmul(vectors, rotation)
+    with open(path, 'w') as fout:
+        fout.write('%d %d\n' % (len(words), dim))
+        for word, vector in zip(words, vectors):
+            fout.write(word + ' ' + ' '.join('%.5f' % x for x in vector) + '\n')
+    return path
+
+
+def write_poems(directory, words, n_poems, n_lines, words_per_line, seed=0):
+    """Write n_poems poem files of n_lines lines each into directory."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    ranks = np.arange(1, len(words) + 1)
+    probabilities = 1. / ranks
+    probabilities /= probabilities.sum()
+    words = np.array(words)
+    for p in range(n_poems):
+        drawn = rng.choice(words, size=(n_lines, words_per_line), p=probabilities)
+        lines = []
+        for row in drawn:
+            line = ' '.join(row)
+            lines.append(line[0].upper() + line[1:] + rng.choice(['', ',', '.', ';']))
+        with open(os.path.join(directory, 'poem_%05d.txt' % p), 'w',
+                  encoding='utf-8') as fout:
+            fout.write('\n'.join(lines) + '\n')
+    return directory
+
+
+def make_corpus(root, vocab=20000, dim=300, en_poems=200, fr_poems=100,
+                lines=20, words_per_line=7, shared=.1, seed=0, reuse=True):
+    """
+    Build a complete synthetic bilingual setup under root and return its
+    paths: wiki.en.vec, wiki.fr.vec (the FR space a random rotation of a
+    space partly aligned with EN), an EN and a FR poem directory and a
+    stopword list per language (the most frequent words). With reuse, a
+    setup already complete under root is not written again.
+    """
+    os.makedirs(root, exist_ok=True)
+    n_shared = int(vocab * shared)
+    en_words = vocabulary(vocab, 'e', shared=n_shared, seed=seed)
+    fr_words = vocabulary(vocab, 'f', shared=n_shared, seed=seed)
+    paths = {
+        'en_vectors': os.path.join(root, 'wiki.en.vec'),
+        'fr_vectors': os.path.join(root, 'wiki.fr.vec'),
+        'en_dir': os.path.join(root, 'en'),
+        'fr_dir': os.path.join(root, 'fr'),
+        'en_stopwords': en_words[:20],
+        'fr_stopwords': fr_words[:20],
+    }
+    done = os.path.join(root, '.complete')
+    if reuse and os.path.exists(done):
+        return paths
+    rng = np.random.default_rng(seed)
+    rotation, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+    write_vec(paths['en_vectors'], en_words, dim, seed)
+    write_vec(paths['fr_vectors'], fr_words, dim, seed,
+              rotation=rotation.astype(np.float32))
+    write_poems(paths['en_dir'], en_words, en_poems, lines, words_per_line, seed + 1)
+    write_poems(paths['fr_dir'], fr_words, fr_poems, lines, words_per_line, seed + 2)
+    open(done, 'w').close()
+    return paths
@@ -0,0 +1,169 @@
+"""
+Hierarchical itinerary for large corpora. The poem vectors of both languages
+(aligned into one space) are clustered with mini-batch k-means; the journey
+first orders the clusters by walking their centroids, strongest similarity
+first, then walks within every cluster in that order with one of the
+itinerary strategies, on a neighbour index of the cluster's own EN x FR
+block. Consecutive clusters are joined by the strongest cross-lingual edge
+from the last poem reached into the next cluster.
+
+Nothing of size EN x FR is ever built: every hop costs at most the size of a
+cluster (or k with a k-truncated index), so the walk stays cheap on very
+large graphs, and it moves through the corpus region by region instead of
+wandering.
+```
+Usage:
+    $ clustered = ClusteredIndex.build(vect_total, n_en=len(filelabels1), n_clusters=16)
+    $ route = clustered.walk(strategy='greedy')
+    $ route.labelled(filelabels_total)
+```
+"""
+
+import numpy as np
+
+from instrumentation import instrumented
+from itinerary import NeighbourIndex, Route, STRATEGIES
+
+
+def _nearest(vectors, centroids, block=4096):
+    """Index of the nearest centroid (Euclidean) of every row of vectors."""
+    half_norms = .5 * np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        scores = np.matmul(vectors[start:start + block], centroids.transpose()) - half_norms
+        labels[start:start + block] = np.argmax(scores, axis=1)
+    return labels
+
+
+def _kmeans_plus_plus(sample, n_clusters, rng):
+    centroids = [sample[rng.integers(len(sample))]]
+    distances = np.sum((sample - centroids[0])**2, axis=1)
+    for _ in range(1, n_clusters):
+        total = distances.sum()
+        pick = rng.choice(len(sample), p=distances / total) if total > 0 \
+            else rng.integers(len(sample))
+        centroids.append(sample[pick])
+        distances = np.minimum(distances, np.sum((sample - sample[pick])**2, axis=1))
+    return np.array(centroids)
+
+
+@instrumented('clustering.kmeans')
+def minibatch_kmeans(vectors, n_clusters, batch_size=1024, iterations=100, seed=0):
+    """
+    (centroids, labels) of mini-batch k-means (Sculley 2010): k-means++
+    seeds drawn from a sample, then every iteration moves the centroids
+    towards the mean of their points in a random batch, with per-centroid
+    learning rates decaying as 1 / points seen.
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    n_clusters = min(n_clusters, n)
+    sample = vectors[rng.choice(n, min(n, max(10 * n_clusters, batch_size)), replace=False)]
+    centroids = _kmeans_plus_plus(sample, n_clusters, rng)
+    counts = np.zeros(n_clusters)
+    for _ in range(iterations):
+        batch = vectors[rng.choice(n, min(batch_size, n), replace=False)]
+        nearest = _nearest(batch, centroids)
+        sizes = np.bincount(nearest, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, nearest, batch)
+        hit = sizes > 0
+        counts[hit] += sizes[hit]
+        rate = (sizes[hit] / counts[hit])[:, None]
+        centroids[hit] += rate * (sums[hit] / sizes[hit][:, None] - centroids[hit])
+    return centroids, _nearest(vectors, centroids)
+
+
+class ClusteredIndex:
+    """
+    Clusters of the poem-nodes (node ids as in vect_total, EN first) with,
+    for each, a NeighbourIndex over its own EN x FR block. Clusters holding
+    a single language have no index and are left out of journeys.
+    """
+
+    def __init__(self, vectors, n_en, centroids, labels, k=None):
+        self.vectors = np.asarray(vectors, dtype=np.float64)
+        self.n_en = int(n_en)
+        self.centroids = centroids
+        self.labels = labels
+        self.members, self.indexes = [], []
+        for cluster in range(len(centroids)):
+            members = np.flatnonzero(labels == cluster)
+            local_en = int(np.count_nonzero(members < self.n_en))
+            self.members.append(members)
+            self.indexes.append(
+                NeighbourIndex.from_vectors(self.vectors[members], local_en, k=k)
+                if 0 < local_en < len(members) else None)
+
+    @classmethod
+    def build(cls, vectors, n_en, n_clusters=16, k=None, **kmeans_options):
+        """Cluster the poem vectors and index every cluster."""
+        centroids, labels = minibatch_kmeans(vectors, n_clusters, **kmeans_options)
+        return cls(vectors, n_en, centroids, labels, k=k)
+
+    def cluster_order(self, first):
+        """
+        The clusters that have an index, from first on, each followed by
+        the unvisited one whose centroid is the most similar to it.
+        """
+        candidates = [c for c, index in enumerate(self.indexes) if index is not None]
+        if first not in candidates:
+            raise ValueError('cluster %d has no EN-FR edges' % first)
+        similarity = np.matmul(self.centroids, self.centroids.transpose())
+        order, left = [first], set(candidates) - {first}
+        while left:
+            nxt = max(left, key=lambda c: (similarity[order[-1], c], -c))
+            order.append(nxt)
+            left.discard(nxt)
+        return order
+
+    def _global(self, cluster, local):
+        return int(self.members[cluster][local])
+
+    def _entry(self, cluster, node):
+        """Local id of the strongest neighbour of node across languages in cluster."""
+        members = self.members[cluster]
+        other = (members >= self.n_en) if node < self.n_en else (members < self.n_en)
+        candidates = np.flatnonzero(other)
+        weights = np.matmul(self.vectors[members[candidates]], self.vectors[node])
+        best = int(np.argmax(weights))
+        return int(candidates[best]), float(weights[best])
+
+    @instrumented('itinerary.clustered', items=len)
+    def walk(self, start=None, strategy='greedy', **strategy_options):
+        """
+        Route over the whole corpus: the clusters in cluster_order, each
+        walked with STRATEGIES[strategy]. start is an optional (EN, FR) edge
+        of one cluster; by default the strongest EN-FR edge of the cluster
+        whose centroid is the most central is used.
+        """
+        if start is None:
+            candidates = [c for c, index in enumerate(self.indexes) if index is not None]
+            if not candidates:
+                raise ValueError('no cluster has EN-FR edges (both languages); '
+                                 'use fewer clusters')
+            centrality = np.matmul(self.centroids, self.centroids.sum(axis=0))
+            first = max(candidates, key=lambda c: (centrality[c], -c))
+            local_start = None
+        else:
+            first = int(self.labels[start[0]])
+            if self.labels[start[1]] != first:
+                raise ValueError('the start edge must lie within one cluster')
+            position = {int(node): i for i, node in enumerate(self.members[first])}
+            local_start = (position[start[0]], position[start[1]])
+        walker = STRATEGIES[strategy]
+        nodes, weights = [], []
+        for cluster in self.cluster_order(first):
+            index = self.indexes[cluster]
+            if nodes:
+                entry, weight = self._entry(cluster, nodes[-1])
+                ids, _ = index.neighbours(entry)
+                if not len(ids):
+                    continue
+                local_start = (entry, int(ids[0]))
+                weights.append(weight)
+            route = walker(index, start=local_start, **strategy_options)
+            nodes.extend(self._global(cluster, local) for local in route.nodes)
+            weights.extend(route.weights)
+        return Route(nodes, weights)
@@ -0,0 +1,118 @@
+"""
+Packed, read-only corpus archive. The cleaned lines of every poem are
+concatenated into one UTF-8 data file, and a small index records the line
+offsets, the first line of each poem and the poem labels and languages.
+The data file is memory-mapped, so any poem or line is read by id in O(1)
+without moving, re-opening or even listing the corpus files.
+```
+Usage:
+    $ PackedCorpus.build('cannes', [(HOME + '/cannes_&_stuff/', 'en', None),
+    $                               (HOME + '/cannes_fr/', 'fr', 100)])
+    $ store = PackedCorpus('cannes')
+    $ store.label(22), store.poem_lines(22)[0]
+```
+Node ids follow the order of the sources and, within each directory, the
+os.listdir() order used by the notebook's ingestion, so they line up with
+filelabels_total.
+"""
+
+import os
+
+import numpy as np
+
+from preprocessing import read_lines
+
+
+class PackedCorpus:
+    """
+    Memory-mapped view of a corpus packed by PackedCorpus.build(), stored
+    as <prefix>.dat (text) and <prefix>.idx.npz (index).
+    """
+
+    def __init__(self, prefix):
+        with np.load(prefix + '.idx.npz') as index:
+            self.line_offsets = index['line_offsets']
+            self.poem_starts = index['poem_starts']
+            self.labels = index['labels']
+            self.languages = index['languages']
+        if self.line_offsets[-1] > 0:
+            self.data = np.memmap(prefix + '.dat', dtype=np.uint8, mode='r')
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+        self._nodes = None
+
+    @classmethod
+    def build(cls, prefix, sources):
+        """
+        Pack the poems of each (directory, language, limit) source, limit
+        being the maximum number of poems taken from the directory (None for
+        all of them). Lines are cleaned the same way as in the notebook.
+        Returns the opened store.
+        """
+        line_offsets, poem_starts = [0], [0]
+        labels, languages = [], []
+        with open(prefix + '.dat', 'wb') as fout:
+            for directory, language, limit in sources:
+                files = [f for f in os.listdir(directory)
+                         if os.path.isfile(os.path.join(directory, f))]
+                for f in files[:limit]:
+                    for line in read_lines(os.path.join(directory, f)):
+                        encoded = line.encode('utf-8')
+                        fout.write(encoded)
+                        line_offsets.append(line_offsets[-1] + len(encoded))
+                    poem_starts.append(len(line_offsets) - 1)
+                    labels.append(f)
+                    languages.append(language)
+        np.savez(prefix + '.idx.npz',
+                 line_offsets=np.array(line_offsets, dtype=np.int64),
+                 poem_starts=np.array(poem_starts, dtype=np.int64),
+                 labels=np.array(labels, dtype=str),
+                 languages=np.array(languages, dtype=str))
+        return cls(prefix)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def n_lines(self):
+        return len(self.line_offsets) - 1
+
+    def line(self, line_id):
+        """Text of the line with global id line_id."""
+        start, end = self.line_offsets[line_id], self.line_offsets[line_id + 1]
+        return bytes(self.data[start:end]).decode('utf-8')
+
+    def line_ids(self, node):
+        """Global ids of the lines of poem node."""
+        return range(self.poem_starts[node], self.poem_starts[node + 1])
+
+    def poem_lines(self, node):
+        """The cleaned lines of poem node, like the notebook's lines[i]."""
+        start, end = self.poem_starts[node], self.poem_starts[node + 1]
+        offsets = self.line_offsets[start:end + 1]
+        raw = bytes(self.data[offsets[0]:offsets[-1]])
+        bounds = offsets - offsets[0]
+        return [raw[bounds[k]:bounds[k + 1]].decode('utf-8')
+                for k in range(end - start)]
+
+    def poem_text(self, node):
+        """Whole poem as one string, one cleaned line per row."""
+        return '\n'.join(self.poem_lines(node))
+
+    def label(self, node):
+        return str(self.labels[node])
+
+    def language(self, node):
+        return str(self.languages[node])
+
+    def node(self, label):
+        """Node id of the poem stored under label."""
+        if self._nodes is None:
+            self._nodes = {str(l): i for i, l in enumerate(self.labels)}
+        return self._nodes[label]
+
+    def filelabels(self, language=None):
+        """{node: label} dict like filelabels_en / filelabels_fr."""
+        return {i: str(l) for i, (l, lang) in
+                enumerate(zip(self.labels, self.languages))
+                if language is None or lang == language}
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Near-duplicate poems: reposts and slightly edited versions of the same poem
+that the Google-sourced corpora contain several times. They are found within
+each language, either
+
+- 'minhash': MinHash signatures of the token shingles of every poem, banded
+  into LSH buckets; poems sharing a bucket whose estimated Jaccard similarity
+  reaches the threshold are duplicates, or
+- 'cosine': poem vectors compared block by block (memory bounded by the
+  block size), pairs at or above the threshold cosine being duplicates,
+
+or both ('both', the union). Duplicates are grouped transitively and every
+group collapses onto its first poem, before the similarity step.
+```
+Usage:
+    $ groups = find_duplicates(texts_data, method='minhash', threshold=.8)
+    $ kept, merged = collapse(len(texts_data), groups)
+    $ python dedup.py cannes_&_stuff --stopwords stop_words_poetry.txt
+```
+"""
+
+import argparse
+import zlib
+
+import numpy as np
+
+from fastvector import normalized
+
+_PRIME = (1 << 31) - 1
+
+
+def _shingle_hashes(tokens, shingle):
+    """CRC-32 of every run of shingle consecutive tokens (all of them if fewer)."""
+    n = max(len(tokens) - shingle + 1, 1)
+    return np.fromiter((zlib.crc32('\x1f'.join(tokens[i:i + shingle]).encode('utf-8'))
+                        for i in range(n)), dtype=np.uint64, count=n)
+
+
+def minhash_signatures(texts, num_perm=128, shingle=3, seed=0):
+    """
+    (len(texts), num_perm) uint64 MinHash signatures of the token lists,
+    with universal hashes (a * h + b) mod (2**31 - 1). Empty poems get no
+    signature: their row is all _PRIME and they never match anything.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(texts), num_perm), _PRIME, dtype=np.uint64)
+    for i, tokens in enumerate(texts):
+        if tokens:
+            hashes = _shingle_hashes(list(tokens), shingle) % np.uint64(_PRIME)
+            signatures[i] = ((np.outer(hashes, a) + b) % np.uint64(_PRIME)).min(axis=0)
+    return signatures
+
+
+def minhash_duplicates(texts, threshold=.8, num_perm=128, bands=32, shingle=3, seed=0):
+    """
+    (i, j, estimated Jaccard) for the pairs of near-duplicate token lists,
+    i < j. Only pairs that share one of the bands LSH buckets are compared.
+    """
+    if num_perm % bands:
+        raise ValueError('num_perm must be a multiple of bands')
+    signatures = minhash_signatures(texts, num_perm, shingle, seed)
+    valid = np.flatnonzero((signatures != _PRIME).any(axis=1))
+    rows = num_perm // bands
+    candidates = set()
+    for band in range(bands):
+        buckets = {}
+        for i in valid:
+            key = signatures[i, band * rows:(band + 1) * rows].tobytes()
+            buckets.setdefault(key, []).append(int(i))
+        for members in buckets.values():
+            candidates.update((members[x], members[y]) for x in range(len(members))
+                              for y in range(x + 1, len(members)))
+    pairs = []
+    for i, j in sorted(candidates):
+        jaccard = float(np.mean(signatures[i] == signatures[j]))
+        if jaccard >= threshold:
+            pairs.append((i, j, jaccard))
+    return pairs
+
+
+def cosine_duplicates(vectors, threshold=.95, block=1024):
+    """
+    (i, j, cosine) for the pairs of rows of vectors whose cosine similarity
+    is at least threshold, i < j, computed block by block of rows against
+    the rows after them. Zero vectors never match.
+    """
+    unit = normalized(np.asarray(vectors, dtype=np.float64))
+    pairs = []
+    for start in range(0, len(unit), block):
+        end = min(start + block, len(unit))
+        sims = np.matmul(unit[start:end], unit[start:].transpose())
+        rows, cols = np.nonzero(np.triu(sims, k=1) >= threshold)
+        pairs.extend((start + int(r), start + int(c), float(sims[r, c]))
+                     for r, c in zip(rows, cols))
+    return pairs
+
+
+def group_pairs(n, pairs):
+    """Connected components of the duplicate pairs, as sorted lists of size > 1."""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, _ in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    members = {}
+    for x in range(n):
+        members.setdefault(find(x), []).append(x)
+    return [group for group in members.values() if len(group) > 1]
+
+
+def find_duplicates(texts, vectors=None, method='minhash', threshold=None, **options):
+    """
+    Duplicate groups among the poems of one language (texts: token lists,
+    vectors: their poem vectors, needed for 'cosine' and 'both'). threshold
+    defaults to .8 (Jaccard) for 'minhash' and .95 (cosine) for 'cosine';
+    with 'both' it may be a (jaccard, cosine) pair.
+    """
+    if method not in ('minhash', 'cosine', 'both'):
+        raise ValueError("method must be 'minhash', 'cosine' or 'both'")
+    jaccard_threshold, cosine_threshold = .8, .95
+    if isinstance(threshold, (tuple, list)):
+        jaccard_threshold, cosine_threshold = threshold
+    elif threshold is not None:
+        jaccard_threshold = cosine_threshold = threshold
+    pairs = []
+    if method in ('minhash', 'both'):
+        pairs += minhash_duplicates(texts, jaccard_threshold, **options)
+    if method in ('cosine', 'both'):
+        pairs += cosine_duplicates(vectors, cosine_threshold)
+    return group_pairs(len(texts), pairs)
+
+
+def collapse(n, duplicate_groups):
+    """
+    (kept, merged): the ids of the poems kept, in order, the first of every
+    group standing for it, and {kept id: [ids merged into it]}.
+    """
+    dropped = np.zeros(n, dtype=bool)
+    merged = {}
+    for group in duplicate_groups:
+        merged[group[0]] = group[1:]
+        dropped[group[1:]] = True
+    return np.flatnonzero(~dropped), merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the near-duplicate poems of a directory.')
+    parser.add_argument('directory')
+    parser.add_argument('--stopwords', nargs='*', default=[], help='stopword lists')
+    parser.add_argument('--threshold', type=float, default=.8, help='estimated Jaccard similarity')
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--bands', type=int, default=32)
+    parser.add_argument('--shingle', type=int, default=3, help='tokens per shingle')
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    from preprocessing import iter_poems, load_stopwords
+    labels, texts = [], []
+    for label, tokens in iter_poems(args.directory, load_stopwords(args.stopwords), args.limit):
+        labels.append(label)
+        texts.append(tokens)
+    duplicate_groups = find_duplicates(texts, threshold=args.threshold, num_perm=args.num_perm,
+                                       bands=args.bands, shingle=args.shingle)
+    for group in duplicate_groups:
+        print('%s <- %s' % (labels[group[0]], ', '.join(labels[i] for i in group[1:])))
+    print('%d poems, %d near-duplicates in %d groups'
+          % (len(texts), sum(len(group) - 1 for group in duplicate_groups),
+             len(duplicate_groups)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+FastVector, the minimal wrapper for fastText embeddings from Babylon Health's
+fastText_multilingual (fasttext.py), and the helpers used to align two
+languages with an orthogonal Procrustes transformation.
+"""
+
+import os
+
+import numpy as np
+
+from instrumentation import add_items, instrumented
+from shared_arrays import SharedArrays, attach_arrays
+from vocabulary import Vocabulary, WordList
+
+
+class FastVector:
+    """
+    Minimal wrapper for fastvector embeddings.
+    ```
+    Usage:
+        $ model = FastVector(vector_file='/path/to/wiki.en.vec')
+        $ 'apple' in model
+        > TRUE
+        $ model['apple'].shape
+        > (300,)
+    ```
+    """
+
+    @instrumented('FastVector.__init__')
+    def __init__(self, vector_file='', transform=None, progress=None):
+        """
+        Read in word vectors in fasttext format. progress, if given, is
+        called as progress(words_read, n_words) every tenth of the file
+        (and replaces the 'reading word vectors' message).
+        """
+        # Captures word order, for export() and translate methods
+        words = []
+
+        if progress is None:
+            print('reading word vectors from %s' % vector_file)
+        with open(vector_file, 'r') as f:
+            (self.n_words, self.n_dim) =                 (int(x) for x in f.readline().rstrip('\n').split(' '))
+            self.embed = np.zeros((self.n_words, self.n_dim))
+            step = max(1, self.n_words // 10)
+            for i, line in enumerate(f):
+                elems = line.rstrip('\n').split(' ')
+                self.embed[i] = elems[1:self.n_dim+1]
+                words.append(elems[0])
+                if progress is not None and (i + 1) % step == 0:
+                    progress(i + 1, self.n_words)
+        self.vocabulary = Vocabulary.from_words(words)
+        add_items('FastVector.__init__', self.n_words)
+
+        # Used in translate_inverted_softmax()
+        self.softmax_denominators = None
+        
+        if transform is not None:
+            print('Applying transformation to embedding')
+            self.apply_transform(transform)
+
+    @classmethod
+    def from_arrays(cls, embed, words, transform=None):
+        """
+        Build a FastVector from an embedding matrix (possibly memory-mapped)
+        and its Vocabulary or word list, without parsing a .vec file.
+        """
+        self = cls.__new__(cls)
+        self.embed = embed
+        self.vocabulary = (words if isinstance(words, Vocabulary)
+                           else Vocabulary.from_words(words))
+        (self.n_words, self.n_dim) = embed.shape
+        self.softmax_denominators = None
+        if transform is not None:
+            self.apply_transform(transform)
+        return self
+
+    def save(self, prefix):
+        """
+        Write the table as <prefix>.embed.npy and the Vocabulary files, for
+        FastVector.load. The matrix is written last, so that its presence
+        marks a complete store.
+        """
+        self.vocabulary.save(prefix)
+        np.save(prefix + '.embed.tmp.npy', self.embed)
+        os.replace(prefix + '.embed.tmp.npy', prefix + '.embed.npy')
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r', transform=None):
+        """Table saved by save(), memory-mapped by default."""
+        return cls.from_arrays(np.load(prefix + '.embed.npy', mmap_mode=mmap_mode),
+                               Vocabulary.load(prefix, mmap_mode=mmap_mode),
+                               transform=transform)
+
+    def share(self):
+        """
+        Publish the embedding matrix and the vocabulary in shared memory.
+        Returns the owning SharedArrays; pass its handle to FastVector.attach
+        in worker processes, and close it once they are done.
+        """
+        arrays = self.vocabulary.arrays()
+        arrays['embed'] = self.embed
+        return SharedArrays.publish(arrays)
+
+    @classmethod
+    def attach(cls, handle):
+        """
+        FastVector on the arrays published by share(), matrix and
+        vocabulary both used zero-copy.
+        """
+        arrays, segments = attach_arrays(handle)
+        self = cls.from_arrays(arrays['embed'], Vocabulary.from_arrays(arrays))
+        self._segments = segments
+        return self
+
+    @property
+    def word2id(self):
+        """The dict-like word -> id lookup (the Vocabulary itself)."""
+        return self.vocabulary
+
+    @property
+    def id2word(self):
+        """All words in id order, as a WordList (each word decoded on access)."""
+        return WordList(self.vocabulary)
+
+    def apply_transform(self, transform):
+        """
+        Apply the given transformation to the vector space
+        Right-multiplies given transform with embeddings E:
+            E = E * transform
+        Transform can either be a string with a filename to a
+        text file containing a ndarray (compat. with np.loadtxt)
+        or a numpy ndarray.
+        """
+        transmat = np.loadtxt(transform) if isinstance(transform, str) else transform
+        self.embed = np.matmul(self.embed, transmat)
+
+    def export(self, outpath):
+        """
+        Transforming a large matrix of WordVectors is expensive. 
+        This method lets you write the transformed matrix back to a file for future use
+        :param The path to the output file to be written 
+        """
+        fout = open(outpath, "w")
+
+        # Header takes the guesswork out of loading by recording how many lines, vector dims
+        fout.write(str(self.n_words) + " " + str(self.n_dim) + "\n")
+        for token in self.id2word:
+            vector_components = ["%.6f" % number for number in self[token]]
+            vector_as_string = " ".join(vector_components)
+
+            out_line = token + " " + vector_as_string + "\n"
+            fout.write(out_line)
+
+        fout.close()
+
+    def translate_nearest_neighbour(self, source_vector):
+        """Obtain translation of source_vector using nearest neighbour retrieval"""
+        similarity_vector = np.matmul(FastVector.normalised(self.embed), source_vector)
+        target_id = np.argmax(similarity_vector)
+        return self.vocabulary.word(target_id)
+
+    def translate_inverted_softmax(self, source_vector, source_space, nsamples,
+                                   beta=10., batch_size=100, recalculate=True):
+        """
+        Obtain translation of source_vector using sampled inverted softmax retrieval
+        with inverse temperature beta.
+        nsamples vectors are drawn from source_space in batches of batch_size
+        to calculate the inverted softmax denominators.
+        Denominators from previous call are reused if recalculate=False. This saves
+        time if multiple words are translated from the same source language.
+        """
+        embed_normalised = FastVector.normalised(self.embed)
+        # calculate contributions to softmax denominators in batches
+        # to save memory
+        if self.softmax_denominators is None or recalculate is True:
+            self.softmax_denominators = np.zeros(self.embed.shape[0])
+            while nsamples > 0:
+                # get batch of randomly sampled vectors from source space
+                sample_vectors = source_space.get_samples(min(nsamples, batch_size))
+                # calculate cosine similarities between sampled vectors and
+                # all vectors in the target space
+                sample_similarities =                     np.matmul(embed_normalised,
+                              FastVector.normalised(sample_vectors).transpose())
+                # accumulate contribution to denominators
+                self.softmax_denominators                     += np.sum(np.exp(beta * sample_similarities), axis=1)
+                nsamples -= batch_size
+        # cosine similarities between source_vector and all target vectors
+        similarity_vector = np.matmul(embed_normalised,
+                                      source_vector/np.linalg.norm(source_vector))
+        # exponentiate and normalise with denominators to obtain inverted softmax
+        softmax_scores = np.exp(beta * similarity_vector) /                          self.softmax_denominators
+        # pick highest score as translation
+        target_id = np.argmax(softmax_scores)
+        return self.vocabulary.word(target_id)
+
+    def get_samples(self, nsamples):
+        """Return a matrix of nsamples randomly sampled vectors from embed"""
+        sample_ids = np.random.choice(self.embed.shape[0], nsamples, replace=False)
+        return self.embed[sample_ids]
+
+    @classmethod
+    def normalised(cls, mat, axis=-1, order=2):
+        """Utility function to normalise the rows of a numpy array."""
+        norm = np.linalg.norm(
+            mat, axis=axis, ord=order, keepdims=True)
+        norm[norm == 0] = 1
+        return mat / norm
+    
+    @classmethod
+    def cosine_similarity(cls, vec_a, vec_b):
+        """Compute cosine similarity between vec_a and vec_b"""
+        return np.dot(vec_a, vec_b) /             (np.linalg.norm(vec_a) * np.linalg.norm(vec_b))
+
+    def __contains__(self, key):
+        return key in self.vocabulary
+
+    def __getitem__(self, key):
+        return self.embed[self.vocabulary[key]]
+
+
+# from https://stackoverflow.com/questions/21030391/how-to-normalize-array-numpy
+def normalized(a, axis=-1, order=2):
+    """Utility function to normalize the rows of a numpy array."""
+    l2 = np.atleast_1d(np.linalg.norm(a, order, axis))
+    l2[l2==0] = 1
+    return a / np.expand_dims(l2, axis)
+
+def make_training_matrices(source_dictionary, target_dictionary, bilingual_dictionary):
+    """
+    Source and target dictionaries are the FastVector objects of
+    source/target languages. bilingual_dictionary is a list of 
+    translation pair tuples [(source_word, target_word), ...].
+    """
+    source_matrix = []
+    target_matrix = []
+
+    for (source, target) in bilingual_dictionary:
+        if source in source_dictionary and target in target_dictionary:
+            source_matrix.append(source_dictionary[source])
+            target_matrix.append(target_dictionary[target])
+
+    # return training matrices
+    return np.array(source_matrix), np.array(target_matrix)
+
+def learn_transformation(source_matrix, target_matrix, normalize_vectors=True):
+    """
+    Source and target matrices are numpy arrays, shape
+    (dictionary_length, embedding_dimension). These contain paired
+    word vectors from the bilingual dictionary.
+    """
+    # optionally normalize the training vectors
+    if normalize_vectors:
+        source_matrix = normalized(source_matrix)
+        target_matrix = normalized(target_matrix)
+
+    # perform the SVD
+    product = np.matmul(source_matrix.transpose(), target_matrix)
+    U, s, V = np.linalg.svd(product)
+
+    # return orthogonal transformation which aligns source language to the target
+    return np.matmul(U, V)
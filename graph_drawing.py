@@ -0,0 +1,119 @@
+"""
+Fast drawing of the corpus network. The complete graph is sparsified to the
+k strongest edges of every node, the layout is computed on that sparse graph
+and cached on disk under a fingerprint of the graph, and all edges are drawn
+as one LineCollection instead of one artist per edge.
+```
+Usage:
+    $ draw_corpus(similarity_matrix_array, labels, k=5, cache_dir='layouts')
+```
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import networkx as nx
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+
+def sparse_edges(weights, k=5, block_size=1024):
+    """
+    (rows, cols, weights) of the undirected edges kept when every node keeps
+    its k strongest edges, self-loops excluded; row < col for every edge.
+    The dense matrix is scanned in blocks of rows and never copied whole.
+    """
+    weights = np.asarray(weights)
+    n = weights.shape[0]
+    k = min(k, n - 1)
+    rows, cols = [], []
+    for start in range(0, n, block_size):
+        block = np.array(weights[start:start + block_size], dtype=np.float64)
+        ids = np.arange(start, start + len(block))
+        block[np.arange(len(block)), ids] = -np.inf
+        rows.append(np.repeat(ids, k))
+        cols.append(np.argpartition(-block, k - 1, axis=1)[:, :k].ravel())
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    lo, hi = np.minimum(rows, cols), np.maximum(rows, cols)
+    pairs = np.unique(lo * n + hi)
+    lo, hi = pairs // n, pairs % n
+    return lo, hi, np.asarray(weights[lo, hi], dtype=np.float64)
+
+
+def fingerprint(n_nodes, rows, cols, weights):
+    """Stable hash of a sparse graph, used as the layout cache key."""
+    digest = hashlib.sha1()
+    digest.update(np.int64(n_nodes).tobytes())
+    digest.update(np.ascontiguousarray(rows, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(cols, dtype=np.int64).tobytes())
+    digest.update(np.round(np.asarray(weights, dtype=np.float64), 6).tobytes())
+    return digest.hexdigest()
+
+
+def compute_layout(n_nodes, rows, cols, weights, method=None, seed=0):
+    """
+    Node positions, shape (n_nodes, 2). The spring layout is used for
+    graphs up to 2000 nodes and the (sparse) spectral layout above that,
+    unless method ('spring' or 'spectral') says otherwise.
+    """
+    graph = nx.Graph()
+    graph.add_nodes_from(range(n_nodes))
+    # spring_layout pulls harder on heavier edges, negative ones would repel
+    graph.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(),
+                                      np.clip(weights, 1e-9, None).tolist()))
+    method = method or ('spring' if n_nodes <= 2000 else 'spectral')
+    if method == 'spring':
+        pos = nx.spring_layout(graph, weight='weight', seed=seed)
+    elif method == 'spectral':
+        pos = nx.spectral_layout(graph, weight='weight')
+    else:
+        raise ValueError("method must be 'spring' or 'spectral'")
+    return np.array([pos[node] for node in range(n_nodes)])
+
+
+def cached_layout(n_nodes, rows, cols, weights, cache_dir=None, method=None,
+                  seed=0):
+    """compute_layout(), memoised in cache_dir under the graph fingerprint."""
+    if cache_dir is None:
+        return compute_layout(n_nodes, rows, cols, weights, method, seed)
+    key = fingerprint(n_nodes, rows, cols, weights)
+    path = os.path.join(cache_dir, 'layout-%s-%s-%d.npy'
+                        % (key, method or 'auto', seed))
+    if os.path.exists(path):
+        return np.load(path)
+    positions = compute_layout(n_nodes, rows, cols, weights, method, seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(path, positions)
+    return positions
+
+
+def draw_corpus(weights, labels=None, k=5, cache_dir=None, method=None,
+                ax=None, node_size=800, node_color='r', font_color='w',
+                font_size=20, figsize=(25, 16)):
+    """
+    Draw the corpus network from its dense weight matrix (e.g. the
+    correlation field of similarity_matrix). Edge widths are proportional
+    to the edge weights, scaled so that they sum to 400 as in draw_graph.
+    Labels are drawn when given, as a list indexed by node.
+    """
+    weights = np.asarray(weights)
+    n_nodes = weights.shape[0]
+    rows, cols, edge_weights = sparse_edges(weights, k)
+    pos = cached_layout(n_nodes, rows, cols, edge_weights, cache_dir, method)
+
+    if ax is None:
+        fig, ax = plt.subplots(figsize=figsize)
+    total = edge_weights.sum()
+    widths = 400 * edge_weights / total if total else np.ones(len(edge_weights))
+    segments = np.stack([pos[rows], pos[cols]], axis=1)
+    ax.add_collection(LineCollection(segments, linewidths=widths,
+                                     colors='k', zorder=1))
+    ax.scatter(pos[:, 0], pos[:, 1], s=node_size, c=node_color, zorder=2)
+    if labels is not None:
+        for node, (x, y) in enumerate(pos):
+            ax.text(x, y, labels[node], color=font_color, fontsize=font_size,
+                    ha='center', va='center', zorder=3)
+    ax.autoscale_view()
+    ax.set_axis_off()
+    return ax
@@ -0,0 +1,196 @@
+"""
+A neighbour index that follows the corpus as poems are added or removed,
+instead of re-ingesting both languages and recomputing the whole similarity
+matrix. Every node keeps its k strongest cross-lingual neighbours, sorted
+strongest first. Adding a poem computes its similarities to the poems of the
+other language (one matrix-vector product) and merges the new edge into the
+lists it enters, by binary search: O(N log k) on top of the product, with no
+re-sort. Removing a poem only recomputes the lists that held it at full
+length, the others shrink in place.
+
+Node ids are stable: they are given out in insertion order and never reused.
+to_index() renumbers the live nodes EN first, as the walk strategies expect.
+```
+Usage:
+    $ graph = IncrementalIndex.from_vectors(vect_total, n_en=len(filelabels1),
+    $                                       k=32, labels=filelabels_total.values())
+    $ node = graph.add(text_vector(tokens, fr_dictionary), 'fr', label='nouveau.txt')
+    $ graph.remove(22)
+    $ index, nodes = graph.to_index()
+    $ route = STRATEGIES['greedy'](index)
+    $ [graph.label(nodes[i]) for i in route.nodes]
+```
+"""
+
+import numpy as np
+
+from instrumentation import instrumented
+from itinerary import NeighbourIndex
+
+
+class IncrementalIndex:
+    """
+    Growable store of poem vectors plus the k strongest cross-lingual
+    neighbours of every node, in fixed-width rows (ids, weights, degree).
+    Edge weights are dot products of the poem vectors, like
+    similarity_matrix.
+    """
+
+    def __init__(self, n_dim, k=32, capacity=1024):
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        self.k = int(k)
+        self.n_nodes = 0
+        self.vectors = np.zeros((capacity, n_dim))
+        self.is_en = np.zeros(capacity, dtype=bool)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.ids = np.zeros((capacity, self.k), dtype=np.int64)
+        self.weights = np.zeros((capacity, self.k))
+        self.degree = np.zeros(capacity, dtype=np.int64)
+        self.labels = []
+
+    @classmethod
+    def from_vectors(cls, vectors, n_en, k=32, labels=None):
+        """
+        Index the poem vectors, EN ones first (vect_total), in one batch:
+        node i is row i of vectors.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        graph = cls(vectors.shape[1], k, capacity=max(2 * len(vectors), 1024))
+        n = len(vectors)
+        graph.n_nodes = n
+        graph.vectors[:n] = vectors
+        graph.is_en[:n_en] = True
+        graph.active[:n] = True
+        graph.labels = list(labels) if labels is not None else [None] * n
+        if n_en and n > n_en:
+            block = np.matmul(vectors[:n_en], vectors[n_en:].transpose())
+            for rows, mat, shift in ((slice(0, n_en), block, n_en),
+                                     (slice(n_en, n), block.transpose(), 0)):
+                order = NeighbourIndex._sorted_rows(mat, graph.k)
+                width = order.shape[1]
+                graph.ids[rows, :width] = order + shift
+                graph.weights[rows, :width] = np.take_along_axis(mat, order, axis=1)
+                graph.degree[rows] = width
+        return graph
+
+    def __len__(self):
+        """Number of live poems."""
+        return int(np.count_nonzero(self.active[:self.n_nodes]))
+
+    def _grow(self):
+        capacity = 2 * len(self.vectors)
+        for name in ('vectors', 'is_en', 'active', 'ids', 'weights', 'degree'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _others(self, node):
+        """Live nodes on the other side of the language barrier from node."""
+        n = self.n_nodes
+        return np.flatnonzero(self.active[:n] & (self.is_en[:n] != self.is_en[node]))
+
+    def _fill_row(self, node, others=None, sims=None):
+        """Recompute the neighbour list of node from scratch."""
+        if others is None:
+            others = self._others(node)
+            sims = np.matmul(self.vectors[others], self.vectors[node])
+        order = NeighbourIndex._sorted_rows(sims[None, :], self.k)[0]
+        self.ids[node, :len(order)] = others[order]
+        self.weights[node, :len(order)] = sims[order]
+        self.degree[node] = len(order)
+
+    def _insert(self, node, neighbour, weight):
+        """Merge the edge (neighbour, weight) into the list of node."""
+        degree = self.degree[node]
+        # ties keep the lower (older) id first, as the stable sort does
+        pos = int(np.searchsorted(-self.weights[node, :degree], -weight, side='right'))
+        if pos >= self.k:
+            return
+        end = min(degree, self.k - 1)
+        self.ids[node, pos + 1:end + 1] = self.ids[node, pos:end]
+        self.weights[node, pos + 1:end + 1] = self.weights[node, pos:end]
+        self.ids[node, pos] = neighbour
+        self.weights[node, pos] = weight
+        self.degree[node] = end + 1
+
+    @instrumented('incremental.add', items=lambda node: 1)
+    def add(self, vector, language, label=None):
+        """
+        Add a poem ('en' or 'fr') and its edges; returns its node id.
+        """
+        if language not in ('en', 'fr'):
+            raise ValueError("language must be 'en' or 'fr'")
+        if self.n_nodes == len(self.vectors):
+            self._grow()
+        node = self.n_nodes
+        self.n_nodes += 1
+        self.vectors[node] = vector
+        self.is_en[node] = language == 'en'
+        self.active[node] = True
+        self.labels.append(label)
+
+        others = self._others(node)
+        sims = np.matmul(self.vectors[others], self.vectors[node])
+        self._fill_row(node, others, sims)
+        # the new edge only enters the lists it beats the last entry of
+        full = self.degree[others] == self.k
+        last = np.where(full, self.weights[others, self.k - 1], -np.inf)
+        entering = sims > last
+        for neighbour, weight in zip(others[entering], sims[entering]):
+            self._insert(neighbour, node, weight)
+        return node
+
+    @instrumented('incremental.remove', items=lambda result: 1)
+    def remove(self, node):
+        """
+        Remove a poem and its edges. Lists that held it and were full are
+        recomputed, since their next strongest neighbour is not stored.
+        """
+        if not (0 <= node < self.n_nodes and self.active[node]):
+            raise KeyError('no live node %d' % node)
+        self.active[node] = False
+        self.degree[node] = 0
+        others = self._others(node)
+        held = ((self.ids[others] == node)
+                & (np.arange(self.k) < self.degree[others][:, None]))
+        rows, positions = np.nonzero(held)
+        n_others = len(others)
+        for neighbour, pos in zip(others[rows], positions):
+            degree = self.degree[neighbour]
+            if degree == self.k and n_others > degree - 1:
+                self._fill_row(neighbour)
+                continue
+            self.ids[neighbour, pos:degree - 1] = self.ids[neighbour, pos + 1:degree]
+            self.weights[neighbour, pos:degree - 1] = self.weights[neighbour, pos + 1:degree]
+            self.degree[neighbour] = degree - 1
+
+    def neighbours(self, node):
+        """Neighbour node ids and edge weights of node, strongest first."""
+        degree = self.degree[node]
+        return self.ids[node, :degree], self.weights[node, :degree]
+
+    def label(self, node):
+        return self.labels[node]
+
+    def language(self, node):
+        return 'en' if self.is_en[node] else 'fr'
+
+    def to_index(self):
+        """
+        (NeighbourIndex, nodes) over the live poems, renumbered EN first
+        (in node order) then FR; nodes[i] is the node id of index node i.
+        """
+        n = self.n_nodes
+        en = np.flatnonzero(self.active[:n] & self.is_en[:n])
+        fr = np.flatnonzero(self.active[:n] & ~self.is_en[:n])
+        nodes = np.concatenate([en, fr])
+        position = np.full(max(n, 1), -1, dtype=np.int64)
+        position[nodes] = np.arange(len(nodes))
+        degrees = self.degree[nodes]
+        kept = np.arange(self.k) < degrees[:, None]
+        indptr = np.concatenate([[0], np.cumsum(degrees)])
+        index = NeighbourIndex(indptr, position[self.ids[nodes]][kept],
+                               self.weights[nodes][kept], len(en))
+        return index, nodes
@@ -0,0 +1,207 @@
+"""
+Opt-in instrumentation of the pipeline stages and hot functions: wall time,
+CPU time, peak RSS and item counts per named stage, with optional cProfile
+and tracemalloc capture, gathered into a machine-readable run report.
+
+Everything is off by default; a disabled stage() or instrumented function
+costs one flag check.
+```
+Usage:
+    $ instrumentation.enable(profile=['ingest_en'], trace_memory=True)
+    $ with instrumentation.stage('ingest_en') as s:
+    $     ...
+    $     s.add_items(len(texts_data))
+    $ instrumentation.write_report('run.json')
+```
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.profile = ()
+        self.profile_dir = None
+        self.trace_memory = False
+        self.profiling = False
+        self.records = {}
+
+
+_state = _State()
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process so far, in MB."""
+    if resource is None:
+        return float('nan')
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage / (1024. * 1024.) if sys.platform == 'darwin' else usage / 1024.
+
+
+def enable(profile=(), profile_dir=None, trace_memory=False):
+    """
+    Start recording. profile is a collection of stage names to run under
+    cProfile (True for all of them); their stats are summarised in the
+    report and, with profile_dir, dumped as <profile_dir>/<name>.prof.
+    trace_memory records the peak of traced allocations of every stage.
+    """
+    _state.enabled = True
+    _state.profile = profile
+    _state.profile_dir = profile_dir
+    _state.trace_memory = trace_memory
+
+
+def disable():
+    _state.enabled = False
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def reset():
+    _state.records = {}
+
+
+def _record(name):
+    if name not in _state.records:
+        _state.records[name] = {'calls': 0, 'wall_seconds': 0., 'cpu_seconds': 0.,
+                                'items': 0, 'peak_rss_mb': 0.}
+    return _state.records[name]
+
+
+def add_items(name, n):
+    """Add n to the item count of stage name (no-op when disabled)."""
+    if _state.enabled:
+        _record(name)['items'] += n
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_items(self, n):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+        self.profiler = None
+        self.tracing = False
+
+    def __enter__(self):
+        profile = _state.profile
+        if (profile is True or self.name in profile) and not _state.profiling:
+            self.profiler = cProfile.Profile()
+            _state.profiling = True
+        if _state.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        self.rss = peak_rss_mb()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler is not None:
+            self.profiler.disable()
+        record = _record(self.name)
+        record['calls'] += 1
+        record['wall_seconds'] += time.perf_counter() - self.wall
+        record['cpu_seconds'] += time.process_time() - self.cpu
+        rss = peak_rss_mb()
+        record['peak_rss_mb'] = max(record['peak_rss_mb'], rss)
+        record['rss_growth_mb'] = record.get('rss_growth_mb', 0.) + rss - self.rss
+        if self.tracing:
+            peak = tracemalloc.get_traced_memory()[1] / 2.**20
+            record['peak_alloc_mb'] = max(record.get('peak_alloc_mb', 0.), peak)
+            tracemalloc.stop()
+        if self.profiler is not None:
+            _state.profiling = False
+            record['profile'] = _summarise(self.profiler)
+            if _state.profile_dir is not None:
+                os.makedirs(_state.profile_dir, exist_ok=True)
+                self.profiler.dump_stats(
+                    os.path.join(_state.profile_dir, self.name + '.prof'))
+        return False
+
+    def add_items(self, n):
+        _record(self.name)['items'] += n
+
+
+def _summarise(profiler, top=20):
+    """The top functions by cumulative time, as report-friendly dicts."""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({'function': '%s:%d(%s)' % (filename, line, function),
+                     'calls': nc, 'total_seconds': tt, 'cumulative_seconds': ct})
+    rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+    return rows[:top]
+
+
+def stage(name):
+    """Context manager measuring the enclosed block as stage name."""
+    if not _state.enabled:
+        return _null_stage
+    return _Stage(name)
+
+
+def instrumented(name=None, items=None):
+    """
+    Decorator measuring every call of the function as stage name (defaults
+    to the function's qualified name). items, if given, maps the return
+    value to the number of items processed, e.g. len.
+    """
+    def decorate(fn):
+        stage_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            with _Stage(stage_name) as s:
+                result = fn(*args, **kwargs)
+                if items is not None:
+                    s.add_items(items(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def report():
+    """The run report: one record per stage, in first-seen order."""
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': {name: dict(record)
+                       for name, record in _state.records.items()}}
+
+
+def write_report(path):
+    with open(path, 'w') as fout:
+        json.dump(report(), fout, indent=2)
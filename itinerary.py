@@ -0,0 +1,328 @@
+"""
+Walk strategies over the EN x FR block of the poem similarity matrix.
+
+Nodes follow the numbering used in the notebook: EN poems are 0 .. n_en-1 and
+FR poems come right after them, so node ids index straight into vect_total
+and filelabels_total. Every strategy works on one precomputed NeighbourIndex,
+which keeps, for each node, its cross-lingual neighbours sorted by decreasing
+edge weight.
+```
+Usage:
+    $ index = NeighbourIndex.from_vectors(vect_total, n_en=len(filelabels1))
+    $ route = STRATEGIES['beam'](index, beam_width=8)
+    $ route.nodes[:2], route.mean
+    > ([22, 287], 0.41)
+```
+"""
+
+import heapq
+
+import numpy as np
+
+from instrumentation import instrumented
+from shared_arrays import SharedArrays, attach_arrays
+
+
+class NeighbourIndex:
+    """
+    Cross-lingual neighbour lists stored CSR-style: the neighbours of node u
+    are indices[indptr[u]:indptr[u+1]], with matching weights, strongest first.
+    Optionally only the k strongest neighbours of each node are kept.
+    """
+
+    def __init__(self, indptr, indices, weights, n_en):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.n_en = int(n_en)
+        self.n_nodes = len(self.indptr) - 1
+
+    @classmethod
+    def from_vectors(cls, vectors, n_en, k=None):
+        """Build the index from the poem vectors, EN ones first (vect_total)."""
+        vectors = np.asarray(vectors, dtype=np.float64)
+        block = np.matmul(vectors[:n_en], vectors[n_en:].transpose())
+        return cls.from_block(block, k=k)
+
+    @classmethod
+    def from_block(cls, block, k=None):
+        """
+        Build the index from the similarity block, block[i, j] being the
+        weight of the edge between EN node i and FR node n_en + j.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        n_en, n_fr = block.shape
+        en_order = cls._sorted_rows(block, k)
+        fr_order = cls._sorted_rows(block.transpose(), k)
+        rows = np.arange(n_en)[:, None]
+        cols = np.arange(n_fr)[:, None]
+        indices = np.concatenate([(en_order + n_en).ravel(), fr_order.ravel()])
+        weights = np.concatenate([block[rows, en_order].ravel(),
+                                  block.transpose()[cols, fr_order].ravel()])
+        degrees = np.concatenate([np.full(n_en, en_order.shape[1]),
+                                  np.full(n_fr, fr_order.shape[1])])
+        indptr = np.concatenate([[0], np.cumsum(degrees)])
+        return cls(indptr, indices, weights, n_en)
+
+    @staticmethod
+    def _sorted_rows(mat, k):
+        """
+        Column ids of each row of mat in decreasing order, cut to k. Ties
+        keep the lower column id first, also at the cut, so the result is
+        the stable full sort truncated to k.
+        """
+        if k is None or k >= mat.shape[1]:
+            return np.argsort(-mat, axis=1, kind='stable')
+        rows = np.arange(mat.shape[0])[:, None]
+        top = np.sort(np.argpartition(-mat, k - 1, axis=1)[:, :k], axis=1)
+        kth = mat[rows, top].min(axis=1)[:, None]
+        # rows with more ties at the cut than were kept: keep the lowest ids
+        cut = np.flatnonzero(np.count_nonzero(mat == kth, axis=1)
+                             > np.count_nonzero(mat[rows, top] == kth, axis=1))
+        for row in cut:
+            above = np.flatnonzero(mat[row] > kth[row])
+            tied = np.flatnonzero(mat[row] == kth[row])[:k - len(above)]
+            top[row] = np.sort(np.concatenate([above, tied]))
+        return top[rows, np.argsort(-mat[rows, top], axis=1, kind='stable')]
+
+    def share(self):
+        """
+        Publish the index arrays in shared memory. Returns the owning
+        SharedArrays; pass its handle to NeighbourIndex.attach in workers.
+        """
+        return SharedArrays.publish({'indptr': self.indptr,
+                                     'indices': self.indices,
+                                     'weights': self.weights,
+                                     'n_en': np.array([self.n_en])})
+
+    @classmethod
+    def attach(cls, handle):
+        """Zero-copy index on arrays published by share()."""
+        arrays, segments = attach_arrays(handle)
+        index = cls(arrays['indptr'], arrays['indices'], arrays['weights'],
+                    arrays['n_en'][0])
+        index._segments = segments
+        return index
+
+    def neighbours(self, node):
+        """Neighbour ids and edge weights of node, strongest first."""
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def is_en(self, node):
+        return node < self.n_en
+
+    def strongest_edge(self):
+        """(en_node, fr_node, weight) of the strongest EN-FR edge."""
+        en_weights = self.weights[:self.indptr[self.n_en]]
+        pos = int(np.argmax(en_weights))
+        return self._edge_at(pos)
+
+    def weakest_edge(self):
+        """(en_node, fr_node, weight) of the weakest EN-FR edge kept."""
+        en_weights = self.weights[:self.indptr[self.n_en]]
+        pos = int(np.argmin(en_weights))
+        return self._edge_at(pos)
+
+    def _edge_at(self, pos):
+        node = int(np.searchsorted(self.indptr, pos, side='right')) - 1
+        return node, int(self.indices[pos]), float(self.weights[pos])
+
+    def max_weight(self):
+        return float(self.weights.max()) if len(self.weights) else 0.
+
+
+class Route:
+    """
+    A journey across the corpus: the poem-nodes in visiting order and the
+    weights of the edges crossed between consecutive nodes.
+    """
+
+    def __init__(self, nodes, weights):
+        self.nodes = list(nodes)
+        self.weights = list(weights)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def total(self):
+        return float(sum(self.weights))
+
+    @property
+    def mean(self):
+        return self.total / len(self.weights) if self.weights else 0.
+
+    def stats(self):
+        """Route quality figures, as reported by the benchmark."""
+        return {'length': len(self.nodes),
+                'total': self.total,
+                'mean': self.mean,
+                'min': float(min(self.weights)) if self.weights else 0.}
+
+    def labelled(self, filelabels_total):
+        """The route as (node, label) tuples, i.e. List_poem_itinerary."""
+        return [(node, filelabels_total[node]) for node in self.nodes]
+
+    def __repr__(self):
+        return 'Route(%d nodes, mean=%.4f)' % (len(self.nodes), self.mean)
+
+
+def _start_edge(index, start, weakest=False):
+    if start is not None:
+        return start
+    en, fr, _ = index.weakest_edge() if weakest else index.strongest_edge()
+    return en, fr
+
+
+def _edge_weight(index, u, v):
+    ids, weights = index.neighbours(u)
+    hit = np.flatnonzero(ids == v)
+    if len(hit) == 0:
+        raise KeyError('no edge between %d and %d in the index' % (u, v))
+    return float(weights[hit[0]])
+
+
+def iter_greedy(index, start=None, weakest=False, max_length=None):
+    """
+    Lazily walk the corpus the way the notebook does: from the start edge,
+    always hop to the strongest (or weakest) unvisited neighbour across the
+    language barrier, and stop at a dead end. Yields (node, weight) pairs,
+    the weight being that of the edge that led to the node (None for the
+    first node).
+    """
+    u, v = _start_edge(index, start, weakest)
+    visited = {u, v}
+    yield u, None
+    yield v, _edge_weight(index, u, v)
+    node, length = v, 2
+    while max_length is None or length < max_length:
+        ids, weights = index.neighbours(node)
+        order = range(len(ids) - 1, -1, -1) if weakest else range(len(ids))
+        for pos in order:
+            nxt = int(ids[pos])
+            if nxt not in visited:
+                break
+        else:
+            return
+        visited.add(nxt)
+        node, length = nxt, length + 1
+        yield nxt, float(weights[pos])
+
+
+@instrumented('itinerary.greedy', items=len)
+def greedy(index, start=None, max_length=None):
+    """Strongest-first greedy walk, the notebook's original itinerary."""
+    return _route(iter_greedy(index, start, max_length=max_length))
+
+
+@instrumented('itinerary.weakest_first', items=len)
+def weakest_first(index, start=None, max_length=None):
+    """
+    Descending journey: start from the weakest EN-FR edge and keep hopping
+    to the weakest unvisited neighbour.
+    """
+    return _route(iter_greedy(index, start, weakest=True,
+                              max_length=max_length))
+
+
+def _route(steps):
+    nodes, weights = [], []
+    for node, weight in steps:
+        nodes.append(node)
+        if weight is not None:
+            weights.append(weight)
+    return Route(nodes, weights)
+
+
+def _unvisited(index, node, visited, branch):
+    """Up to branch strongest unvisited neighbours of node."""
+    ids, weights = index.neighbours(node)
+    found = []
+    for pos in range(len(ids)):
+        nxt = int(ids[pos])
+        if nxt not in visited:
+            found.append((nxt, float(weights[pos])))
+            if branch is not None and len(found) == branch:
+                break
+    return found
+
+
+@instrumented('itinerary.beam', items=len)
+def beam(index, start=None, beam_width=8, branch=None, objective='total',
+         max_length=None):
+    """
+    Beam search from the start edge, keeping at every hop the beam_width
+    partial routes with the best cumulative ('total') or mean ('mean') edge
+    weight. Each route is extended with at most branch of its strongest
+    unvisited neighbours (defaults to beam_width). Returns the best route
+    among those that could not be extended any further.
+    """
+    if objective not in ('total', 'mean'):
+        raise ValueError("objective must be 'total' or 'mean'")
+    branch = beam_width if branch is None else branch
+    u, v = _start_edge(index, start)
+    first = Route([u, v], [_edge_weight(index, u, v)])
+    score = (lambda r: r.total) if objective == 'total' else (lambda r: r.mean)
+
+    states = [first]
+    best = None
+    while states:
+        extended = []
+        for route in states:
+            candidates = []
+            if max_length is None or len(route) < max_length:
+                candidates = _unvisited(index, route.nodes[-1],
+                                        set(route.nodes), branch)
+            if not candidates:
+                if best is None or score(route) > score(best):
+                    best = route
+                continue
+            for nxt, weight in candidates:
+                extended.append(Route(route.nodes + [nxt],
+                                      route.weights + [weight]))
+        states = heapq.nlargest(beam_width, extended, key=score)
+    return best
+
+
+@instrumented('itinerary.bounded_best', items=len)
+def bounded_best(index, start=None, max_length=12, branch=None):
+    """
+    Exact search for the simple path of at most max_length nodes with the
+    largest cumulative edge weight, starting from the start edge. Depth-first
+    branch and bound; the bound assumes every remaining hop could take the
+    strongest edge in the index. With branch set, only the branch strongest
+    unvisited neighbours of each node are explored, trading exactness for
+    speed. max_length cannot be None: the search needs a bound.
+    """
+    if max_length is None:
+        raise ValueError('bounded_best needs a max_length, the exact search is '
+                         'exponential without one')
+    u, v = _start_edge(index, start)
+    top = index.max_weight()
+    best = [Route([u, v], [_edge_weight(index, u, v)])]
+
+    def search(nodes, weights, total, visited):
+        if total > best[0].total:
+            best[0] = Route(nodes, weights)
+        remaining = max_length - len(nodes)
+        if remaining <= 0 or total + remaining * top <= best[0].total:
+            return
+        for nxt, weight in _unvisited(index, nodes[-1], visited, branch):
+            if total + weight + (remaining - 1) * top <= best[0].total:
+                # neighbours are sorted, nothing further down can do better
+                break
+            visited.add(nxt)
+            search(nodes + [nxt], weights + [weight], total + weight, visited)
+            visited.discard(nxt)
+
+    search([u, v], list(best[0].weights), best[0].total, {u, v})
+    return best[0]
+
+
+STRATEGIES = {
+    'greedy': greedy,
+    'weakest_first': weakest_first,
+    'beam': beam,
+    'bounded_best': bounded_best,
+}
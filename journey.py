@@ -0,0 +1,78 @@
+"""
+Streaming Bilingual Corpus Journey: yields each verse as soon as the hop of
+the walk that reaches its poem is decided, instead of waiting for the whole
+itinerary, the moving and reading of every itinerary file and the sorting of
+every cosine list.
+```
+Usage:
+    $ steps = iter_greedy(neighbour_index)
+    $ for node, label, line, score in stream_journey(
+    $         steps, vect_total, filelabels_total, poem_lines,
+    $         dictionaries={'en': en_dictionary, 'fr': fr_dictionary},
+    $         stopwords={'en': stopwords_0, 'fr': stopwords}, n_en=200):
+    $     print(line)
+```
+"""
+
+import os
+
+from poem_vectors import best_line
+from preprocessing import read_lines, tokenize
+
+
+def poem_lines_from_dirs(filelabels_total, n_en, en_dir, fr_dir):
+    """
+    node -> cleaned lines of its poem, read in place from the EN and FR
+    corpus directories (nothing is moved).
+    """
+    def poem_lines(node):
+        directory = en_dir if node < n_en else fr_dir
+        return read_lines(os.path.join(directory, filelabels_total[node]))
+    return poem_lines
+
+
+def poem_lines_by_language(filelabels_total, languages, directories):
+    """
+    node -> cleaned lines of its poem, read from directories[languages[node]]
+    (languages: the language code of every node, see multilingual.py).
+    """
+    def poem_lines(node):
+        return read_lines(os.path.join(directories[languages[node]],
+                                       filelabels_total[node]))
+    return poem_lines
+
+
+def stream_journey(steps, poem_vectors, filelabels_total, poem_lines,
+                   dictionaries, stopwords, n_en, tokenizers=None, languages=None,
+                   poolings=None):
+    """
+    Generator of (node, poem label, chosen line, score) along the walk.
+
+    steps yields (node, weight) pairs as the walk proceeds, e.g.
+    itinerary.iter_greedy(). For every node the poem is read with
+    poem_lines(node), its lines are tokenized with the stopwords of the
+    node's language and the line closest to poem_vectors[node] is picked on
+    the spot. dictionaries and stopwords map 'en' and 'fr' to the FastVector
+    and stopword collection of each language, tokenizers (optional) to the
+    word tokenizer of each language (see preprocessing.tokenize). With
+    languages, the language code of every node, nodes are not told apart
+    by n_en and any number of languages can be keyed. poolings (optional)
+    maps languages to the weighting.Pooling or subwords.Subwords their poem
+    vectors were made with, so that lines are pooled the same way.
+    """
+    stopsets = {lang: set(words) for lang, words in stopwords.items()}
+    tokenizers = tokenizers or {}
+    poolings = poolings or {}
+    for node, _ in steps:
+        if languages is not None:
+            lang = languages[node]
+        else:
+            lang = 'en' if node < n_en else 'fr'
+        lines = poem_lines(node)
+        line_tokens = [tokenize(line, stopsets[lang], tokenizers.get(lang))
+                       for line in lines]
+        j, score = best_line(line_tokens, poem_vectors[node], dictionaries[lang],
+                             poolings.get(lang))
+        if j is None:
+            continue
+        yield node, filelabels_total[node], lines[j], score
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Resident journey service: the aligned EN and FR embeddings, the poem vectors
+and the neighbour index are loaded once (from the pipeline cache) and kept
+warm, and requests are answered over a small JSON-over-HTTP protocol, on a
+TCP port or a Unix socket. Concurrent "score" requests are micro-batched so
+that a whole batch is scored against the corpus with a single matmul.
+
+    POST /score      {"text": "...", "lang": "en", "top": 10}
+    POST /journey    {"poem": 22 or "label.txt", "strategy": "greedy",
+                      "options": {...}, "lines": false}
+    POST /best_line  {"poem": 22 or "label.txt"}
+```
+Usage:
+    $ python journey_service.py --config cannes.json --port 8765
+    $ curl -d '{"text": "la mer", "lang": "fr"}' localhost:8765/score
+```
+"""
+
+import argparse
+import asyncio
+import json
+
+import numpy as np
+
+from fastvector import normalized
+from itinerary import NeighbourIndex, STRATEGIES
+from poem_vectors import best_line, text_vector
+from preprocessing import tokenize
+from ranking import top_k
+
+
+class RequestError(ValueError):
+    """A malformed request, answered with 400 Bad Request."""
+
+
+class JourneyService:
+    """
+    In-memory corpus state and the request handlers. dictionaries and
+    stopwords map 'en' and 'fr' to a FastVector and a stopword collection,
+    poem_lines(node) returns the cleaned lines of a poem (e.g.
+    PackedCorpus.poem_lines). tokenizers maps a language to the word
+    tokenizer its poems were ingested with (None for nltk's), poolings to
+    the weighting.Pooling or subwords.Subwords its poem vectors were made
+    with (plain means if missing), so that queries and lines are pooled the
+    same way, OOV tokens included.
+    """
+
+    def __init__(self, dictionaries, stopwords, poem_vectors, filelabels,
+                 n_en, poem_lines, batch_window=0.002, max_batch=64, tokenizers=None,
+                 poolings=None):
+        self.dictionaries = dictionaries
+        self.stopwords = {lang: set(words) for lang, words in stopwords.items()}
+        self.tokenizers = tokenizers or {}
+        self.poolings = poolings or {}
+        self.poem_vectors = np.asarray(poem_vectors, dtype=np.float64)
+        self.unit_vectors = normalized(self.poem_vectors)
+        self.filelabels = dict(filelabels)
+        self.nodes = {label: node for node, label in self.filelabels.items()}
+        self.n_en = n_en
+        self.poem_lines = poem_lines
+        self.index = NeighbourIndex.from_vectors(self.poem_vectors, n_en)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._best_lines = {}
+        self._queue = None
+
+    @classmethod
+    def from_pipeline(cls, pipeline, **kwargs):
+        """Service state from the (cached) stages of a pipeline.Pipeline."""
+        from journey import poem_lines_from_dirs
+        from pipeline import _poolings, _tokenizer
+        from preprocessing import load_stopwords
+        config = pipeline.config
+        vectors = pipeline.get('dedup')
+        stopwords = {lang: load_stopwords(**spec)
+                     for lang, spec in config['line_stopwords'].items()}
+        poem_lines = poem_lines_from_dirs(vectors['filelabels'], vectors['n_en'],
+                                          config['en_dir'], config['fr_dir'])
+        return cls(pipeline.dictionaries(), stopwords, vectors['vectors'],
+                   vectors['filelabels'], vectors['n_en'], poem_lines,
+                   tokenizers={lang: _tokenizer(config, lang) for lang in ('en', 'fr')},
+                   poolings=_poolings(pipeline, config), **kwargs)
+
+    def language(self, node):
+        return 'en' if node < self.n_en else 'fr'
+
+    def node(self, poem):
+        """Node id of a poem given by id or by label."""
+        if isinstance(poem, str) and poem in self.nodes:
+            return self.nodes[poem]
+        if isinstance(poem, int) and poem in self.filelabels:
+            return poem
+        raise RequestError('unknown poem %r' % (poem,))
+
+    # Synchronous handlers
+
+    def text_vector(self, text, lang):
+        if lang not in self.dictionaries:
+            raise RequestError('unknown language %r' % (lang,))
+        tokens = []
+        for line in text.split('\n'):
+            tokens.extend(tokenize(line, self.stopwords[lang], self.tokenizers.get(lang)))
+        if lang in self.poolings:
+            return self.poolings[lang].vectors([tokens], self.dictionaries[lang])[0]
+        return text_vector(tokens, self.dictionaries[lang])
+
+    def score_batch(self, vectors):
+        """Cosine similarity of every row of vectors to every poem."""
+        return np.matmul(normalized(np.asarray(vectors)), self.unit_vectors.transpose())
+
+    def ranked(self, scores, top):
+        best = top_k(scores, top)
+        return [{'poem': int(node), 'label': self.filelabels[int(node)],
+                 'lang': self.language(int(node)), 'score': float(scores[node])}
+                for node in best]
+
+    def best_line(self, node):
+        if node not in self._best_lines:
+            lang = self.language(node)
+            lines = self.poem_lines(node)
+            line_tokens = [tokenize(line, self.stopwords[lang], self.tokenizers.get(lang))
+                           for line in lines]
+            j, score = best_line(line_tokens, self.poem_vectors[node],
+                                 self.dictionaries[lang], self.poolings.get(lang))
+            self._best_lines[node] = ((None, None) if j is None
+                                      else (lines[j], float(score)))
+        line, score = self._best_lines[node]
+        return {'poem': node, 'label': self.filelabels[node], 'line': line,
+                'score': score}
+
+    def journey(self, poem, strategy='greedy', options=None, lines=False):
+        if strategy not in STRATEGIES:
+            raise RequestError('unknown strategy %r' % (strategy,))
+        start = self.node(poem)
+        ids, _ = self.index.neighbours(start)
+        if len(ids) == 0:
+            raise RequestError('poem %r has no cross-lingual neighbour' % (poem,))
+        route = STRATEGIES[strategy](self.index, start=(start, int(ids[0])),
+                                     **(options or {}))
+        result = route.stats()
+        result['route'] = [{'poem': int(node), 'label': self.filelabels[int(node)]}
+                           for node in route.nodes]
+        if lines:
+            for step in result['route']:
+                step['line'] = self.best_line(step['poem'])['line']
+        return result
+
+    # Micro-batched scoring
+
+    async def score(self, text, lang='en', top=10):
+        vector = self.text_vector(text, lang)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((vector, future))
+        scores = await future
+        return {'results': self.ranked(scores, int(top))}
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            vectors = np.array([vector for vector, _ in batch])
+            try:
+                scores = await loop.run_in_executor(None, self.score_batch, vectors)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.cancelled():
+                        future.set_exception(exc)
+                continue
+            for row, (_, future) in zip(scores, batch):
+                if not future.cancelled():
+                    future.set_result(row)
+
+    # HTTP
+
+    async def dispatch(self, method, path, body):
+        if method != 'POST':
+            raise RequestError('use POST')
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise RequestError('body is not valid JSON')
+        if path == '/score':
+            if 'text' not in request:
+                raise RequestError('missing "text"')
+            return await self.score(request['text'], request.get('lang', 'en'),
+                                    request.get('top', 10))
+        if path == '/journey':
+            return self.journey(request.get('poem'), request.get('strategy', 'greedy'),
+                                request.get('options'), request.get('lines', False))
+        if path == '/best_line':
+            return self.best_line(self.node(request.get('poem')))
+        return None
+
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 requests on one (keep-alive) connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                try:
+                    result = await self.dispatch(method, path, body)
+                    status = '200 OK' if result is not None else '404 Not Found'
+                    if result is None:
+                        result = {'error': 'unknown path %s' % path}
+                except (RequestError, TypeError, ValueError) as exc:
+                    status, result = '400 Bad Request', {'error': str(exc)}
+                except Exception as exc:
+                    status = '500 Internal Server Error'
+                    result = {'error': '%s: %s' % (type(exc).__name__, exc)}
+                payload = json.dumps(result).encode('utf-8')
+                close = headers.get('connection', '').lower() == 'close'
+                writer.write(('HTTP/1.1 %s\r\nContent-Type: application/json\r\n'
+                              'Content-Length: %d\r\nConnection: %s\r\n\r\n'
+                              % (status, len(payload), 'close' if close else 'keep-alive')
+                              ).encode('latin-1') + payload)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None):
+        self._queue = asyncio.Queue()
+        batcher = asyncio.ensure_future(self._batcher())
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            print('journey service listening on %s' % unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            print('journey service listening on http://%s:%d' % (host, port))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--config', help='pipeline JSON configuration')
+    parser.add_argument('--cache-dir', default='.journey_cache')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket instead')
+    parser.add_argument('--batch-window', type=float, default=0.002,
+                        help='seconds to wait for more score requests to batch')
+    parser.add_argument('--max-batch', type=int, default=64)
+    args = parser.parse_args()
+
+    from pipeline import Pipeline
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    service = JourneyService.from_pipeline(
+        Pipeline(config, cache_dir=args.cache_dir),
+        batch_window=args.batch_window, max_batch=args.max_batch)
+    asyncio.run(service.serve(args.host, args.port, args.unix))
+
+
+if __name__ == '__main__':
+    main()
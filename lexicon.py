@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Bilingual lexicon induction beyond identical spellings. The notebook's
+bilingual dictionary is en_words & fr_words: the words spelt the same in
+both tables, many of them numbers and names. refine() iterates the
+Procrustes step the way fastText_multilingual and MUSE do: map the top_n
+most frequent source words with the current transform, pair every word with
+its nearest neighbour in the other language by CSLS (cross-domain
+similarity local scaling, Conneau et al. 2018), keep the mutual pairs as the
+new dictionary, learn the transform again, and repeat.
+
+Scores are computed block by block of source words in float32, so an
+iteration never holds more than block x top_n similarities (two matmul
+passes over top_n x top_n), and runs in seconds on CPU for top_n in the
+tens of thousands.
+```
+Usage:
+    $ transform = learn_transformation(source_matrix, target_matrix)
+    $ transform, pairs = refine(fr_dictionary, en_dictionary, transform, iterations=5)
+    $ python lexicon.py wiki.fr.vec wiki.en.vec --out fr_to_en.txt --pairs lexicon.tsv
+```
+"""
+
+import argparse
+
+import numpy as np
+
+from fastvector import learn_transformation, normalized
+from instrumentation import instrumented
+
+
+def _top_mean(sims, k, axis):
+    """Mean of the k largest values of sims along axis."""
+    k = min(k, sims.shape[axis])
+    return -np.partition(-sims, k - 1, axis=axis).take(np.arange(k), axis=axis).mean(axis=axis)
+
+
+def csls_neighbourhoods(source, target, k=10, block=1024):
+    """
+    (r_source, r_target): for every row of source, the mean cosine of its
+    k nearest rows of target, and for every row of target that of its k
+    nearest rows of source. Rows are unit vectors; one pass of blocks.
+    """
+    r_source = np.empty(len(source), dtype=np.float32)
+    k_target = min(k, len(source))
+    nearest = np.full((k_target, len(target)), -np.inf, dtype=np.float32)
+    for start in range(0, len(source), block):
+        sims = np.matmul(source[start:start + block], target.transpose())
+        r_source[start:start + block] = _top_mean(sims, k, axis=1)
+        # running k best of every target column over the blocks seen
+        stacked = np.concatenate([nearest, sims])
+        nearest = -np.partition(-stacked, k_target - 1, axis=0)[:k_target]
+    return r_source, nearest.mean(axis=0)
+
+
+def mutual_nearest_pairs(source, target, k=10, block=1024):
+    """
+    (source row, target row, CSLS score) of the pairs that are each
+    other's nearest neighbour by CSLS, 2 cos(x, y) - r_T(x) - r_S(y).
+    """
+    r_source, r_target = csls_neighbourhoods(source, target, k, block)
+    forward = np.empty(len(source), dtype=np.int64)
+    forward_score = np.empty(len(source), dtype=np.float32)
+    backward = np.zeros(len(target), dtype=np.int64)
+    backward_score = np.full(len(target), -np.inf, dtype=np.float32)
+    for start in range(0, len(source), block):
+        scores = 2 * np.matmul(source[start:start + block], target.transpose())
+        scores -= r_source[start:start + block, None]
+        scores -= r_target[None, :]
+        forward[start:start + block] = np.argmax(scores, axis=1)
+        forward_score[start:start + block] = scores.max(axis=1)
+        best = np.argmax(scores, axis=0)
+        better = scores[best, np.arange(len(target))] > backward_score
+        backward[better] = best[better] + start
+        backward_score[better] = scores[best[better], np.flatnonzero(better)]
+    rows = np.flatnonzero(backward[forward] == np.arange(len(source)))
+    return [(int(i), int(forward[i]), float(forward_score[i])) for i in rows]
+
+
+@instrumented('lexicon.refine')
+def refine(source_dictionary, target_dictionary, transform, iterations=5, top_n=15000,
+           k=10, block=1024, verbose=False):
+    """
+    (transform, pairs): the transform of source_dictionary onto
+    target_dictionary (FastVectors, unaligned) refined over iterations of
+    CSLS mutual nearest neighbours among the top_n first (most frequent)
+    words of each, and the induced dictionary as (source id, target id,
+    score) of the last iteration. Stops early once the dictionary no longer
+    changes. verbose prints the size and mean score of every iteration's
+    dictionary.
+    """
+    source = np.asarray(source_dictionary.embed[:top_n], dtype=np.float64)
+    target = np.asarray(target_dictionary.embed[:top_n], dtype=np.float64)
+    target_unit = normalized(target).astype(np.float32)
+    pairs, previous = [], None
+    for iteration in range(iterations):
+        mapped = normalized(np.matmul(normalized(source), transform)).astype(np.float32)
+        pairs = mutual_nearest_pairs(mapped, target_unit, k, block)
+        current = {(i, j) for i, j, _ in pairs}
+        if verbose:
+            print('refine %d: %d mutual pairs, mean CSLS %.4f'
+                  % (iteration + 1, len(pairs),
+                     np.mean([score for _, _, score in pairs]) if pairs else 0.))
+        if current == previous or not pairs:
+            break
+        source_rows = np.array([i for i, _, _ in pairs])
+        target_rows = np.array([j for _, j, _ in pairs])
+        transform = learn_transformation(source[source_rows], target[target_rows])
+        previous = current
+    return transform, pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Align a source table onto a target one with iterative Procrustes.')
+    parser.add_argument('source', help='.vec table (or store prefix) to align, e.g. FR')
+    parser.add_argument('target', help='.vec table (or store prefix) of the pivot, e.g. EN')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--top-n', type=int, default=15000,
+                        help='most frequent words of each table to induce pairs among')
+    parser.add_argument('--k', type=int, default=10, help='CSLS neighbourhood size')
+    parser.add_argument('--block', type=int, default=1024, help='source words per block')
+    parser.add_argument('--out', default='transform.txt',
+                        help='transform, loadable by FastVector.apply_transform')
+    parser.add_argument('--pairs', help='write the induced lexicon as TSV')
+    args = parser.parse_args()
+
+    from multilingual import identical_spelling_transform
+    from table_loader import load_tables
+    tables = load_tables({'source': args.source, 'target': args.target})
+    source, target = tables['source'], tables['target']
+    transform, pairs = refine(source, target, identical_spelling_transform(source, target),
+                              iterations=args.iterations, top_n=args.top_n, k=args.k,
+                              block=args.block, verbose=True)
+    np.savetxt(args.out, transform)
+    if args.pairs:
+        with open(args.pairs, 'w', encoding='utf-8') as fout:
+            for i, j, score in pairs:
+                fout.write('%s\t%s\t%.4f\n' % (source.vocabulary.word(i),
+                                               target.vocabulary.word(j), score))
+    print('transform written to %s' % args.out)
+
+
+if __name__ == '__main__':
+    main()
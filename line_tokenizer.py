@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Line-oriented tokenizer for verse. Lines are the unit, so there is no Punkt
+sentence splitting, and word tokens are those of nltk's word_tokenize
+(NLTKWordTokenizer, whose rules are precompiled below) at a fraction of the
+cost: a line is cut at whitespace and every whitespace-delimited chunk is
+tokenized once, in the exact context the rules can see, then memoised. Verse
+repeats its words, so most chunks are dictionary hits.
+
+Optional elision rules, which deliberately depart from NLTK:
+- 'en': typographic apostrophes inside words (’ ʼ) become ', so that NLTK's
+  clitic rules apply to them (sea’s -> sea 's, don’t -> do n't),
+- 'fr': the same, plus French elided words are split off their host
+  (l'amour -> l' amour, qu'il -> qu' il, jusqu'à -> jusqu' à).
+
+    $ python line_tokenizer.py diff en_dir --elision en --stopwords stop_words_poetry.txt
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from functools import lru_cache
+
+# The rules of nltk.tokenize.destructive.NLTKWordTokenizer, in order
+_STARTING_QUOTES = [
+    (re.compile('([«“‘„]|[`]+)'), r' \1 '),
+    (re.compile(r'^\"'), r'``'),
+    (re.compile(r'(``)'), r' \1 '),
+    (re.compile(r'([ \(\[{<])(\"|\'{2})'), r'\1 `` '),
+    (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r'\1 '),
+]
+_PUNCTUATION = [
+    (re.compile(r'([^\.])(\.)([\]\)}>"\'' '»”’ ' r']*)\s*$'), r'\1 \2 \3 '),
+    (re.compile(r'([:,])([^\d])'), r' \1 \2'),
+    (re.compile(r'([:,])$'), r' \1 '),
+    (re.compile(r'\.{2,}'), r' \g<0> '),
+    (re.compile(r'[;@#$%&]'), r' \g<0> '),
+    (re.compile('[\u2012-\u2015]'), r' \g<0> '),
+    (re.compile(r'([^\.])(\.)([\]\)}>"\']*)\s*$'), r'\1 \2\3 '),
+    (re.compile(r'[?!]'), r' \g<0> '),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r'[*]'), r' \g<0> '),
+    (re.compile(r'[\]\[\(\)\{\}\<\>]'), r' \g<0> '),
+    (re.compile(r'--'), r' -- '),
+]
+_ENDING_QUOTES = [
+    (re.compile('([»”’])'), r' \1 '),
+    (re.compile(r"''"), " '' "),
+    (re.compile(r'"'), " '' "),
+    (re.compile(r'\s+'), ' '),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r'\1 \2 '),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r'\1 \2 '),
+]
+_CONTRACTIONS = [re.compile(pattern) for pattern in (
+    r"(?i)\b(can)(?#X)(not)\b",
+    r"(?i)\b(d)(?#X)('ye)\b",
+    r"(?i)\b(gim)(?#X)(me)\b",
+    r"(?i)\b(gon)(?#X)(na)\b",
+    r"(?i)\b(got)(?#X)(ta)\b",
+    r"(?i)\b(lem)(?#X)(me)\b",
+    r"(?i)\b(more)(?#X)('n)\b",
+    r"(?i)\b(wan)(?#X)(na)(?=\s)",
+    r"(?i) ('t)(?#X)(is)\b",
+    r"(?i) ('t)(?#X)(was)\b",
+)]
+
+_chunk = re.compile(r'\S+')
+_closing = re.compile('[\\]\\)}>"\'»”’]+')
+
+_APOSTROPHE = re.compile(r'(?<=\w)[’ʼ](?=\w)')
+_FR_ELISION = re.compile(r"(?i)\b(qu|jusqu|lorsqu|puisqu|quoiqu|presqu|[cdjlmnst])'(?=\w)")
+
+
+def nltk_rules(text):
+    """word_tokenize(text, preserve_line=True), without nltk."""
+    for regexp, substitution in _STARTING_QUOTES:
+        text = regexp.sub(substitution, text)
+    for regexp, substitution in _PUNCTUATION:
+        text = regexp.sub(substitution, text)
+    text = ' ' + text + ' '
+    for regexp, substitution in _ENDING_QUOTES:
+        text = regexp.sub(substitution, text)
+    for regexp in _CONTRACTIONS:
+        text = regexp.sub(r' \1 \2 ', text)
+    return text.split()
+
+
+@lru_cache(maxsize=1 << 18)
+def _chunk_tokens(text, first, last):
+    """
+    Tokens of one chunk, text being the chunk with the whitespace around it
+    and, unless it starts (ends) the line, a dummy word before (after) it.
+    """
+    tokens = nltk_rules(text)
+    return tuple(tokens[0 if first else 1:len(tokens) if last else -1])
+
+
+def word_tokenize(line):
+    """The tokens of nltk's word_tokenize(line, preserve_line=True)."""
+    spans = [match.span() for match in _chunk.finditer(line)]
+    # trailing chunks of closing quotes and brackets are still within reach of
+    # the final period rule: they go with the last other chunk
+    k = len(spans) - 1
+    while k > 0 and _closing.fullmatch(line, *spans[k]):
+        k -= 1
+    if k < len(spans) - 1:
+        spans[k:] = [(spans[k][0], spans[-1][1])]
+    tokens = []
+    n = len(spans)
+    for k, (start, end) in enumerate(spans):
+        first, last = k == 0, k == n - 1
+        before = line[spans[k - 1][1] if k else 0:start]
+        after = line[end:spans[k + 1][0] if not last else len(line)]
+        text = ('' if first else 'x') + before + line[start:end] + after + ('' if last else 'x')
+        tokens.extend(_chunk_tokens(text, first, last))
+    return tokens
+
+
+class LineTokenizer:
+    """
+    Callable line -> word tokens, NLTK-identical unless elision is 'en' or
+    'fr' (see the module docstring).
+    """
+
+    def __init__(self, elision=None):
+        if elision not in (None, 'en', 'fr'):
+            raise ValueError('elision must be None, "en" or "fr"')
+        self.elision = elision
+
+    def __call__(self, line):
+        if self.elision is not None:
+            line = _APOSTROPHE.sub("'", line)
+            if self.elision == 'fr':
+                line = _FR_ELISION.sub(r"\1' ", line)
+        return word_tokenize(line)
+
+    def __repr__(self):
+        return 'LineTokenizer(elision=%r)' % (self.elision,)
+
+
+def diff_report(directories, stopwords=(), elision=None, limit=None, examples=20):
+    """
+    Tokenize every line of the poems of directories with the NLTK path
+    (Punkt sentences, nltk word tokens) and with the line tokenizer, both
+    through preprocessing.tokenize, and compare.
+    """
+    import resources
+    from preprocessing import list_poems, tokenize
+    sent_tokenize = resources.sentence_tokenizer()
+    tokenizer = LineTokenizer(elision)
+    stopwords = set(stopwords)
+    report = {'lines': 0, 'tokens': 0, 'differing_lines': 0, 'nltk_seconds': 0.,
+              'line_seconds': 0., 'examples': []}
+    for directory in directories:
+        for f in list_poems(directory, limit):
+            with open(os.path.join(directory, f), encoding='utf-8', errors='ignore') as openf:
+                lines = openf.readlines()
+            t0 = time.perf_counter()
+            expected = [[token for sentence in sent_tokenize(line)
+                         for token in tokenize(sentence, stopwords)] for line in lines]
+            t1 = time.perf_counter()
+            actual = [tokenize(line, stopwords, tokenizer) for line in lines]
+            t2 = time.perf_counter()
+            report['nltk_seconds'] += t1 - t0
+            report['line_seconds'] += t2 - t1
+            for line, old, new in zip(lines, expected, actual):
+                report['lines'] += 1
+                report['tokens'] += len(old)
+                if old != new:
+                    report['differing_lines'] += 1
+                    if len(report['examples']) < examples:
+                        report['examples'].append({'file': f, 'line': line.rstrip('\n'),
+                                                   'nltk': old, 'line_tokenizer': new})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the line tokenizer with the NLTK path on poem directories.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    diff = commands.add_parser('diff')
+    diff.add_argument('directories', nargs='+')
+    diff.add_argument('--elision', choices=['en', 'fr'])
+    diff.add_argument('--stopwords', nargs='*', default=[],
+                      help='stopword lists, e.g. stop_words_poetry.txt')
+    diff.add_argument('--limit', type=int, help='poems per directory')
+    diff.add_argument('--examples', type=int, default=20)
+    args = parser.parse_args()
+
+    from preprocessing import load_stopwords
+    report = diff_report(args.directories, load_stopwords(args.stopwords),
+                         args.elision, args.limit, args.examples)
+    for example in report['examples']:
+        print('%s: %s' % (example['file'], example['line']))
+        print('    nltk: %s' % ' '.join(example['nltk']))
+        print('    line: %s' % ' '.join(example['line_tokenizer']))
+    print('%d of %d lines differ (%d tokens); nltk path %.2fs, line tokenizer %.2fs '
+          '(%.1fx)' % (report['differing_lines'], report['lines'], report['tokens'],
+                       report['nltk_seconds'], report['line_seconds'],
+                       report['nltk_seconds'] / max(report['line_seconds'], 1e-9)))
+    sys.exit(1 if report['differing_lines'] and args.elision is None else 0)
+
+
+if __name__ == '__main__':
+    main()
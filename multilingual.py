@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Journeys across any number of languages. Every fastText table is aligned
+onto one pivot language (Procrustes over the words spelt the same in both,
+as the pipeline's align stage does for FR onto EN), so the poem vectors of
+all the corpora live in a single space. Nodes are numbered corpus after
+corpus and a per-node language code array replaces the n_en boundary of the
+two-language code.
+
+MultilingualIndex stands in for itinerary.NeighbourIndex, so the walk
+strategies run on it unchanged. The similarity block of a language pair is
+computed the first time a node of one of the two languages asks for its
+neighbours, and only for the pairs the walk is allowed to cross: a journey
+that never leaves EN-FR costs the same with a third corpus loaded.
+```
+Usage:
+    $ aligned, transforms = align_tables({'en': en_dictionary, 'fr': fr_dictionary,
+    $                                     'ro': ro_dictionary}, pivot='en')
+    $ index = MultilingualIndex(vectors, languages, codes=['en', 'fr', 'ro'],
+    $                           pairs=[('en', 'fr'), ('fr', 'ro')])
+    $ route = STRATEGIES['greedy'](index)
+    $ python multilingual.py trip.json
+```
+The job file of the command line names the pivot and, per language, its
+table, corpus directory and stopwords:
+
+    {"pivot": "en", "pairs": [["en", "fr"], ["fr", "ro"]], "strategy": "greedy",
+     "languages": {
+        "en": {"vectors": "wiki.en.vec", "dir": "cannes_&_stuff",
+               "stopwords": {"files": ["stop_words_poetry.txt"]}},
+        "fr": {"vectors": "wiki.fr.vec", "dir": "cannes_fr", "limit": 100,
+               "stopwords": {"files": ["french1.txt"]}},
+        "ro": {"vectors": "wiki.ro.vec", "dir": "cannes_ro"}}}
+"""
+
+import argparse
+import itertools
+import json
+
+import numpy as np
+
+from fastvector import FastVector, learn_transformation
+from instrumentation import instrumented
+from itinerary import NeighbourIndex
+
+
+def identical_spelling_transform(source, target):
+    """
+    Procrustes transform of the source FastVector onto the target one,
+    learnt over the words of source that target spells the same.
+    """
+    target_ids = target.vocabulary.ids(source.vocabulary.words())
+    source_rows = np.flatnonzero(target_ids >= 0)
+    return learn_transformation(np.asarray(source.embed[source_rows]),
+                                np.asarray(target.embed[target_ids[source_rows]]))
+
+
+@instrumented('multilingual.align')
+def align_tables(tables, pivot='en', refine=None):
+    """
+    ({lang: FastVector}, {lang: transform}): every table of the {lang:
+    FastVector} dict aligned onto tables[pivot], which is returned as is.
+    refine, if given, holds the options of lexicon.refine.
+    """
+    aligned, transforms = {pivot: tables[pivot]}, {}
+    for lang, table in tables.items():
+        if lang != pivot:
+            transforms[lang] = identical_spelling_transform(table, tables[pivot])
+            if refine is not None:
+                from lexicon import refine as refine_transform
+                transforms[lang], _ = refine_transform(table, tables[pivot], transforms[lang],
+                                                       **refine)
+            aligned[lang] = FastVector.from_arrays(table.embed, table.vocabulary,
+                                                   transform=transforms[lang])
+    return aligned, transforms
+
+
+class MultilingualIndex:
+    """
+    Cross-language neighbour lists of the poem-nodes (rows of vectors),
+    with the interface the walk strategies use from NeighbourIndex.
+    languages[node] indexes codes; the neighbours of a node are the nodes
+    of the languages it may cross to (pairs, a list of (code, code); every
+    pair by default), strongest first, ties by lower id, cut to k. The walk
+    starts across the first pair, the way the two-language walk starts
+    across EN-FR.
+    """
+
+    def __init__(self, vectors, languages, codes, pairs=None, k=None):
+        self.vectors = np.asarray(vectors, dtype=np.float64)
+        self.codes = list(codes)
+        self.languages = np.asarray(languages, dtype=np.int16)
+        self.n_nodes = len(self.languages)
+        self.k = k
+        self.members = [np.flatnonzero(self.languages == c) for c in range(len(self.codes))]
+        self.position = np.empty(self.n_nodes, dtype=np.int64)
+        for members in self.members:
+            self.position[members] = np.arange(len(members))
+        if pairs is None:
+            pairs = itertools.combinations(self.codes, 2)
+        self.pairs = [(self.codes.index(a), self.codes.index(b)) for a, b in pairs]
+        self.partners = {c: sorted({b for a, b in self.pairs if a == c}
+                                   | {a for a, b in self.pairs if b == c})
+                         for c in range(len(self.codes))}
+        self._blocks = {}
+        self._rows = {}
+
+    @classmethod
+    def from_corpora(cls, vectors_by_language, pairs=None, k=None):
+        """
+        Index of the {code: poem vectors} of every corpus, nodes numbered
+        corpus after corpus in the dict's order. Returns (index, first
+        node of every corpus).
+        """
+        codes = list(vectors_by_language)
+        sizes = [len(vectors_by_language[code]) for code in codes]
+        firsts = dict(zip(codes, np.concatenate([[0], np.cumsum(sizes)[:-1]]).tolist()))
+        vectors = np.concatenate([np.asarray(vectors_by_language[code], dtype=np.float64)
+                                  for code in codes])
+        return cls(vectors, np.repeat(np.arange(len(codes)), sizes), codes, pairs, k), firsts
+
+    def language(self, node):
+        """Code of the language of node, e.g. 'fr'."""
+        return self.codes[self.languages[node]]
+
+    def block(self, a, b):
+        """
+        Similarity block of languages a and b (code ids): block[i, j]
+        weighs the edge between members[a][i] and members[b][j]. Computed
+        on first use; (b, a) is served transposed.
+        """
+        if (a, b) not in self._blocks:
+            if (b, a) in self._blocks:
+                return self._blocks[b, a].transpose()
+            self._blocks[a, b] = np.matmul(self.vectors[self.members[a]],
+                                           self.vectors[self.members[b]].transpose())
+        return self._blocks[a, b]
+
+    def computed_pairs(self):
+        """The language pairs whose block has been computed so far."""
+        return [(self.codes[a], self.codes[b]) for a, b in self._blocks]
+
+    def neighbours(self, node):
+        """Neighbour ids and edge weights of node, strongest first."""
+        if node not in self._rows:
+            lang, row = self.languages[node], self.position[node]
+            partners = self.partners[lang]
+            ids = np.concatenate([self.members[b] for b in partners]
+                                 or [np.zeros(0, dtype=np.int64)])
+            weights = np.concatenate([self.block(lang, b)[row] for b in partners]
+                                     or [np.zeros(0)])
+            # ids ascending, so the tie order is that of NeighbourIndex
+            by_id = np.argsort(ids, kind='stable')
+            ids, weights = ids[by_id], weights[by_id]
+            order = NeighbourIndex._sorted_rows(weights[None, :], self.k)[0]
+            self._rows[node] = (ids[order], weights[order])
+        return self._rows[node]
+
+    def _start_edge(self, pick):
+        a, b = self.pairs[0]
+        if self.k is None:
+            block = self.block(a, b)
+            i, j = np.unravel_index(pick(block), block.shape)
+            return (int(self.members[a][i]), int(self.members[b][j]), float(block[i, j]))
+        # only the kept neighbours are edges of a k-truncated index
+        edges = []
+        for u in self.members[a]:
+            ids, weights = self.neighbours(u)
+            across = np.flatnonzero(self.languages[ids] == b)
+            if len(across):
+                pos = across[pick(weights[across])]
+                edges.append((int(u), int(ids[pos]), float(weights[pos])))
+        weights = np.array([w for _, _, w in edges])
+        return edges[int(pick(weights))]
+
+    def strongest_edge(self):
+        """(node, node, weight) of the strongest edge of the first pair."""
+        return self._start_edge(np.argmax)
+
+    def weakest_edge(self):
+        """(node, node, weight) of the weakest edge of the first pair kept."""
+        return self._start_edge(np.argmin)
+
+    def max_weight(self):
+        """Strongest edge weight over every pair (computes all their blocks)."""
+        return max((float(self.block(a, b).max()) for a, b in self.pairs
+                    if len(self.members[a]) and len(self.members[b])), default=0.)
+
+
+def ingest_corpora(corpora, tables, tokenizer=None):
+    """
+    ({code: poem vectors}, {node: label}) of the corpora, a {code: {'dir',
+    'stopwords', 'limit'}} dict, with the aligned tables; nodes are numbered
+    corpus after corpus.
+    """
+    from poem_vectors import text_vector
+    from preprocessing import ingest_directory, load_stopwords
+    vectors, filelabels, first = {}, {}, 0
+    for code, corpus in corpora.items():
+        labels, texts = ingest_directory(corpus['dir'],
+                                         load_stopwords(**corpus.get('stopwords', {})),
+                                         first_id=first, limit=corpus.get('limit'),
+                                         tokenizer=tokenizer)
+        vectors[code] = np.array([text_vector(tokens, tables[code]) for tokens in texts])
+        filelabels.update(labels)
+        first += len(texts)
+    return vectors, filelabels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk a journey across several languages.')
+    parser.add_argument('job', help='JSON file: {"pivot", "languages", "pairs", "strategy"}')
+    parser.add_argument('--k', type=int, default=None,
+                        help='keep only the k strongest neighbours per node')
+    parser.add_argument('--store-dir', help='memory-mappable copies of the .vec tables')
+    args = parser.parse_args()
+
+    with open(args.job) as f:
+        job = json.load(f)
+    from itinerary import STRATEGIES
+    from journey import poem_lines_by_language, stream_journey
+    from preprocessing import load_stopwords
+    from table_loader import load_tables
+    languages = job['languages']
+    tables = load_tables({code: spec['vectors'] for code, spec in languages.items()},
+                         store_dir=args.store_dir)
+    aligned, _ = align_tables(tables, pivot=job.get('pivot', next(iter(languages))),
+                              refine=job.get('refine'))
+    vectors, filelabels = ingest_corpora(languages, aligned)
+    index, _ = MultilingualIndex.from_corpora(vectors, pairs=job.get('pairs'), k=args.k)
+    route = STRATEGIES[job.get('strategy', 'greedy')](index, **job.get('strategy_options', {}))
+    stopwords = {code: load_stopwords(**spec.get('stopwords', {}))
+                 for code, spec in languages.items()}
+    node_languages = [index.language(node) for node in range(index.n_nodes)]
+    poem_lines = poem_lines_by_language(
+        filelabels, node_languages, {code: spec['dir'] for code, spec in languages.items()})
+    for node, label, line, score in stream_journey(
+            ((node, None) for node in route.nodes), index.vectors, filelabels, poem_lines,
+            aligned, stopwords, n_en=None, languages=node_languages):
+        print('%s  %s' % (index.language(node), line))
+    print('\n%d poems, route of %d; blocks computed: %s'
+          % (index.n_nodes, len(route),
+             ', '.join('%s-%s' % pair for pair in index.computed_pairs())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Headless, stage-cached run of the Bilingual Corpus Journey.
+
+The notebook is split into nine stages, plus the optional n-gram table for
+OOV tokens and the export of the run's artifacts; the result of each one is
+memoised on disk under a key made of the stage's configuration, the
+fingerprints of its input files and the keys of the stages it depends on. Stages are evaluated lazily from the requested
+target backwards, so only invalidated stages run and a cached stage is only
+loaded when a stage downstream of it has to be recomputed: changing a
+stopword list re-runs the ingestion and what follows it, while the
+embeddings come back from the cache (memory-mapped) instead of being parsed
+again from the .vec files.
+```
+Usage:
+    $ python pipeline.py --config cannes.json
+    $ python pipeline.py --config cannes.json --until similarity --status
+```
+The configuration file is a JSON object overriding DEFAULT_CONFIG.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+import instrumentation
+
+EN_STOPWORDS_EXTRA = [
+    '...', "'d", '...', '&', 'upon', 'also', 'hath', 'must', 'therefore', 'doth',
+    'could', 'would', 'another', 'much', 'like', 'since', 'without', 'though',
+    'often', 'either', 'even', 'shall', 'what', 'their', 'them',
+    'a', 'like', 'you', 'they', 'he', 'be', 'it', 'your', 'her', 'of', 'more',
+    'there', 'no', 'not', '’', 'what', 'my', 'his', 'she', 'to', 'our', 'me',
+    'we', 'in', 'can', 'us', 'an', 'if', 'do', 'this', '”', 'because', 'who',
+    'hand', 'but', 'him']
+
+DEFAULT_CONFIG = {
+    'en_vectors': 'wiki.en.vec',
+    'fr_vectors': 'wiki.fr.vec',
+    'en_dir': 'cannes_&_stuff',
+    'fr_dir': 'cannes_fr',
+    # the notebook computes vectors for the first 100 FR poems only
+    'fr_limit': 100,
+    # None, or the options of lexicon.refine, e.g. {'iterations': 5, 'top_n': 15000},
+    # to refine the identical-spelling alignment with induced word pairs
+    'refine': None,
+    'en_stopwords': {'files': ['stop_words_poetry.txt'], 'extra': EN_STOPWORDS_EXTRA},
+    'fr_stopwords': {'files': ['french1.txt'], 'extra': []},
+    'line_stopwords': {'en': {'files': ['stop_words_poetry.txt'], 'extra': []},
+                       'fr': {'files': ['french1.txt'], 'extra': []}},
+    'strategy': 'greedy',
+    'strategy_options': {},
+    # 'nltk' (Punkt sentences, nltk word tokens), 'lines' (line_tokenizer, same
+    # tokens, no sentence splitting) or 'lines_elision' (plus EN/FR elision)
+    'tokenizer': 'nltk',
+    # None (plain means, as in the notebook), or the options of
+    # weighting.Pooling.fit, e.g. {'scheme': 'sif', 'remove_pc': True}
+    'weighting': None,
+    # None, or vectors for OOV tokens from their character n-grams (subwords.py):
+    # {'bin': {'en': 'wiki.en.bin', 'fr': 'wiki.fr.bin'}} reads them from the
+    # fastText models, the options of Subwords.derive (e.g. {'max_words': 50000})
+    # derive them from the .vec tables for the languages without a model
+    'subwords': None,
+    # None, or the options of dedup.find_duplicates, e.g. {'method': 'minhash',
+    # 'threshold': .8}, to collapse near-duplicate poems before the similarity
+    'dedup': None,
+    # None, or the options of clustered_itinerary.ClusteredIndex.build, e.g.
+    # {'n_clusters': 16}, to walk cluster by cluster on large corpora
+    'clusters': None,
+    # every run's nodes, top-k edges, itinerary and lines are written under
+    # runs_dir as columnar tables (run_artifacts.py); None to skip
+    'runs_dir': 'runs',
+    'export_k': 10,
+}
+
+
+class Stage:
+    """
+    One step of the pipeline. run(pipeline, config) returns a dict of
+    results and fetches the results it needs with pipeline.get(). The
+    cache key covers config[key] for key in config_keys, the files returned
+    by inputs(config), the keys of deps and version, to be bumped when the
+    stage's code changes what it produces.
+    """
+
+    def __init__(self, name, run, deps=(), config_keys=(), inputs=None,
+                 version=1):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.config_keys = tuple(config_keys)
+        self.inputs = inputs or (lambda config: [])
+        self.version = version
+
+
+def file_fingerprint(path):
+    """(path, size, mtime) of a file, or of every file of a directory."""
+    if os.path.isdir(path):
+        return [file_fingerprint(os.path.join(path, f))
+                for f in sorted(os.listdir(path))]
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def _stopword_files(spec):
+    """Paths of the NLTK stopword files named in a stopwords spec."""
+    import resources
+    return [resources.stopword_file(name) for name in spec['files']]
+
+
+class Pipeline:
+    """Lazily evaluated, disk-memoised stages of one configuration."""
+
+    def __init__(self, config, cache_dir='.journey_cache', stages=None,
+                 force=(), verbose=True, dictionaries=None):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.cache_dir = cache_dir
+        self.stages = {stage.name: stage for stage in (stages or STAGES)}
+        self.force = set(force)
+        self.verbose = verbose
+        self.status = {}
+        self._results = {}
+        self._keys = {}
+        # e.g. tables attached from shared memory by batch_corpora.py
+        self._dictionaries = dictionaries
+        self._tables = None
+
+    def key(self, name):
+        if name not in self._keys:
+            stage = self.stages[name]
+            description = {
+                'stage': name,
+                'version': stage.version,
+                'config': {k: self.config[k] for k in stage.config_keys},
+                'inputs': [file_fingerprint(p) for p in stage.inputs(self.config)],
+                'deps': [self.key(dep) for dep in stage.deps],
+            }
+            encoded = json.dumps(description, sort_keys=True, default=str)
+            self._keys[name] = hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+        return self._keys[name]
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, '%s-%s' % (name, self.key(name)))
+
+    def is_cached(self, name):
+        return os.path.isdir(self.path(name)) and name not in self.force
+
+    def get(self, name):
+        """Result of stage name, from memory, from the cache or computed."""
+        if name in self._results:
+            return self._results[name]
+        path = self.path(name)
+        if self.is_cached(name):
+            result = _load(path)
+            self.status[name] = 'cached'
+        else:
+            start = time.perf_counter()
+            with instrumentation.stage(name):
+                result = self.stages[name].run(self, self.config)
+            _save(path, result)
+            self.status[name] = 'computed in %.1fs' % (time.perf_counter() - start)
+        if self.verbose:
+            print('%-15s %s' % (name, self.status[name]))
+        self._results[name] = result
+        return result
+
+    def dictionaries(self):
+        """The EN and the aligned FR FastVector, built once per process."""
+        if self._dictionaries is None:
+            from fastvector import FastVector
+            tables = self.tables()
+            transform = self.get('align')['transform']
+            self._dictionaries = {
+                'en': tables['en'],
+                'fr': FastVector.from_arrays(tables['fr'].embed, tables['fr'].vocabulary,
+                                             transform=transform),
+            }
+        return self._dictionaries
+
+    def tables(self):
+        """
+        The EN and FR FastVector, unaligned, memory-mapped from the stores
+        the embeddings stage names (parsed again if they were deleted).
+        """
+        if self._tables is None:
+            from fastvector import FastVector
+            prefixes = {lang: os.path.join(self.cache_dir, self.get('embeddings')[lang + '_store'])
+                        for lang in ('en', 'fr')}
+            if not all(os.path.exists(prefix + '.embed.npy') for prefix in prefixes.values()):
+                self._results.pop('embeddings')
+                self.force.add('embeddings')
+                self.get('embeddings')
+            self._tables = {lang: FastVector.load(prefix) for lang, prefix in prefixes.items()}
+        return self._tables
+
+
+def _save(path, result):
+    """Arrays go to .npy files (memory-mappable), everything else is pickled."""
+    # per process, as the workers of batch_corpora.py may save the same stage
+    tmp = '%s.tmp%d' % (path, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    objects = {}
+    for name, value in result.items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp, name + '.npy'), value)
+        else:
+            objects[name] = value
+    with open(os.path.join(tmp, 'objects.pkl'), 'wb') as fout:
+        pickle.dump(objects, fout, protocol=pickle.HIGHEST_PROTOCOL)
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # another process saved it in between; both results are the same
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _load(path):
+    with open(os.path.join(path, 'objects.pkl'), 'rb') as f:
+        result = pickle.load(f)
+    for f in os.listdir(path):
+        if f.endswith('.npy'):
+            result[f[:-4]] = np.load(os.path.join(path, f), mmap_mode='r')
+    return result
+
+
+def _print(name, message):
+    print('%-15s %s' % (name, message))
+
+
+def _quiet(name, message):
+    pass
+
+
+# Stages
+
+def load_embeddings(pipeline, config):
+    """
+    The prefixes, relative to the cache directory, of the stores of the
+    EN and FR tables (see Pipeline.tables). The parsing workers save the
+    stores under cache_dir/tables, and they are the only copy of the tables:
+    nothing is sent back through the process pool or saved again with the
+    stage.
+    """
+    from table_loader import load_tables, store_prefix
+    store_dir = os.path.join(pipeline.cache_dir, 'tables')
+    sources = {'en': config['en_vectors'], 'fr': config['fr_vectors']}
+    load_tables(sources, store_dir=store_dir,
+                progress=_print if pipeline.verbose else _quiet)
+    return {lang + '_store': os.path.relpath(store_prefix(path, store_dir), pipeline.cache_dir)
+            for lang, path in sources.items()}
+
+
+def align(pipeline, config):
+    """
+    Procrustes alignment of FR onto EN over the identical-spelling overlap,
+    refined with config['refine'] over CSLS mutual nearest neighbours (see
+    lexicon.py), whose induced word pairs are kept as lexicon.
+    """
+    from fastvector import learn_transformation
+    tables = pipeline.tables()
+    en_ids = tables['en'].vocabulary.ids(tables['fr'].vocabulary.words())
+    fr_rows = np.flatnonzero(en_ids >= 0)
+    en_rows = en_ids[fr_rows]
+    source_matrix = np.asarray(tables['fr'].embed[fr_rows])
+    target_matrix = np.asarray(tables['en'].embed[en_rows])
+    transform = learn_transformation(source_matrix, target_matrix)
+    if not config['refine']:
+        return {'transform': transform}
+    from lexicon import refine
+    transform, pairs = refine(tables['fr'], tables['en'],
+                              transform, **dict(config['refine'], verbose=pipeline.verbose))
+    return {'transform': transform,
+            'lexicon': np.array([(i, j) for i, j, _ in pairs], dtype=np.int64).reshape(-1, 2)}
+
+
+def _tokenizer(config, lang):
+    """The word tokenizer of lang under config['tokenizer'] (None for nltk)."""
+    if config['tokenizer'] == 'nltk':
+        return None
+    from line_tokenizer import LineTokenizer
+    return LineTokenizer(lang if config['tokenizer'] == 'lines_elision' else None)
+
+
+def ingest_en(pipeline, config):
+    from preprocessing import ingest_directory, load_stopwords
+    stopwords = load_stopwords(**config['en_stopwords'])
+    filelabels, texts = ingest_directory(config['en_dir'], stopwords, first_id=0,
+                                         tokenizer=_tokenizer(config, 'en'))
+    return {'filelabels': filelabels, 'texts': texts}
+
+
+def ingest_fr(pipeline, config):
+    from preprocessing import ingest_directory, load_stopwords
+    stopwords = load_stopwords(**config['fr_stopwords'])
+    n_en = len(pipeline.get('ingest_en')['filelabels'])
+    filelabels, texts = ingest_directory(config['fr_dir'], stopwords,
+                                         first_id=n_en, limit=config['fr_limit'],
+                                         tokenizer=_tokenizer(config, 'fr'))
+    return {'filelabels': filelabels, 'texts': texts}
+
+
+def subwords(pipeline, config):
+    """
+    The n-gram rows derived from the .vec tables (see subwords.py) of the
+    languages config['subwords'] gives no fastText .bin model for.
+    """
+    if not config['subwords']:
+        return {}
+    from subwords import Subwords
+    options = dict(config['subwords'])
+    models = options.pop('bin', {})
+    result = {}
+    for lang, dictionary in pipeline.dictionaries().items():
+        if lang not in models:
+            result.update(Subwords.derive(dictionary, **options).arrays(prefix=lang + '_'))
+    return result
+
+
+def _subwords(pipeline, config):
+    """{lang: subwords.Subwords} under config['subwords']."""
+    from subwords import Subwords, load_bin
+    models = config['subwords'].get('bin', {})
+    tables = {}
+    for lang in ('en', 'fr'):
+        if lang in models:
+            transform = pipeline.get('align')['transform'] if lang == 'fr' else None
+            tables[lang] = load_bin(models[lang], transform=transform)
+        else:
+            tables[lang] = Subwords.from_arrays(pipeline.get('subwords'), prefix=lang + '_')
+    return tables
+
+
+def poem_vectors(pipeline, config):
+    """
+    The poem vectors, plain means as in the notebook or, with
+    config['weighting'], pooled with the SIF or TF-IDF weights of each
+    language (see weighting.py), saved as <lang>_weights/<lang>_component.
+    With config['subwords'], OOV tokens get their n-gram vectors.
+    """
+    from poem_vectors import text_vector
+    en, fr = pipeline.get('ingest_en'), pipeline.get('ingest_fr')
+    dictionaries = pipeline.dictionaries()
+    filelabels_total = dict(en['filelabels'])
+    filelabels_total.update(fr['filelabels'])
+    result = {'n_en': len(en['texts']), 'filelabels': filelabels_total}
+    if config['subwords']:
+        if config['weighting']:
+            raise ValueError('weighting and subwords cannot be combined')
+        subword_tables = _subwords(pipeline, config)
+        return dict(result, vectors=np.concatenate([
+            subword_tables[lang].vectors(texts, dictionaries[lang])
+            for lang, texts in (('en', en['texts']), ('fr', fr['texts']))]))
+    if not config['weighting']:
+        vectors = ([text_vector(tokens, dictionaries['en']) for tokens in en['texts']]
+                   + [text_vector(tokens, dictionaries['fr']) for tokens in fr['texts']])
+        return dict(result, vectors=np.array(vectors))
+    from weighting import Pooling
+    vectors = []
+    for lang, texts in (('en', en['texts']), ('fr', fr['texts'])):
+        pooling = Pooling.fit(texts, dictionaries[lang], **config['weighting'])
+        vectors.append(pooling.vectors(texts, dictionaries[lang]))
+        result.update(pooling.arrays(prefix=lang + '_'))
+    return dict(result, vectors=np.concatenate(vectors))
+
+
+def dedup(pipeline, config):
+    """
+    Collapse the near-duplicate poems of each language onto their first
+    copy (see dedup.py), renumbering the nodes; merged maps every kept label
+    to the labels merged into it. Without config['dedup'] nothing changes.
+    """
+    vectors = pipeline.get('poem_vectors')
+    if not config['dedup']:
+        return dict(vectors, merged={})
+    from dedup import collapse, find_duplicates
+    n_en, labels = vectors['n_en'], vectors['filelabels']
+    all_vectors = np.asarray(vectors['vectors'])
+    kept, merged = [], {}
+    for stage, first in (('ingest_en', 0), ('ingest_fr', n_en)):
+        texts = pipeline.get(stage)['texts']
+        rows = slice(first, first + len(texts))
+        ids, groups = collapse(len(texts), find_duplicates(texts, all_vectors[rows],
+                                                           **config['dedup']))
+        kept.append(ids + first)
+        for node, copies in groups.items():
+            label = labels[first + node]
+            merged[label] = [labels[first + copy] for copy in copies]
+            if pipeline.verbose:
+                print('%-15s %s <- %s' % ('dedup', label, ', '.join(merged[label])))
+    kept = np.concatenate(kept)
+    return {'vectors': all_vectors[kept], 'n_en': int(np.count_nonzero(kept < n_en)),
+            'filelabels': {node: labels[int(old)] for node, old in enumerate(kept)},
+            'merged': merged}
+
+
+def similarity(pipeline, config):
+    vectors = np.asarray(pipeline.get('dedup')['vectors'])
+    return {'similarity': np.matmul(vectors, vectors.transpose())}
+
+
+def itinerary(pipeline, config):
+    from itinerary import NeighbourIndex, STRATEGIES
+    n_en = pipeline.get('dedup')['n_en']
+    if config['clusters']:
+        # walks cluster by cluster, the similarity matrix is never needed
+        from clustered_itinerary import ClusteredIndex
+        clustered = ClusteredIndex.build(pipeline.get('dedup')['vectors'], n_en,
+                                         **config['clusters'])
+        route = clustered.walk(strategy=config['strategy'], **config['strategy_options'])
+    else:
+        sim = pipeline.get('similarity')['similarity']
+        index = NeighbourIndex.from_block(sim[:n_en, n_en:])
+        route = STRATEGIES[config['strategy']](index, **config['strategy_options'])
+    return {'nodes': np.array(route.nodes, dtype=np.int64),
+            'weights': np.array(route.weights)}
+
+
+def _poolings(pipeline, config):
+    """
+    {lang: weighting.Pooling or subwords.Subwords} the poem vectors were
+    pooled with, None for plain means.
+    """
+    if config['subwords']:
+        return _subwords(pipeline, config)
+    if not config['weighting']:
+        return None
+    from weighting import Pooling
+    arrays = pipeline.get('poem_vectors')
+    return {lang: Pooling.from_arrays(arrays, prefix=lang + '_') for lang in ('en', 'fr')}
+
+
+def line_selection(pipeline, config):
+    from journey import poem_lines_from_dirs, stream_journey
+    from preprocessing import load_stopwords
+    route = pipeline.get('itinerary')
+    vectors = pipeline.get('dedup')
+    n_en, filelabels = vectors['n_en'], vectors['filelabels']
+    steps = zip(route['nodes'].tolist(), [None] + route['weights'].tolist())
+    stopwords = {lang: load_stopwords(**spec)
+                 for lang, spec in config['line_stopwords'].items()}
+    journey = stream_journey(
+        steps, vectors['vectors'], filelabels,
+        poem_lines_from_dirs(filelabels, n_en, config['en_dir'], config['fr_dir']),
+        pipeline.dictionaries(), stopwords, n_en,
+        tokenizers={lang: _tokenizer(config, lang) for lang in ('en', 'fr')},
+        poolings=_poolings(pipeline, config))
+    return {'journey': [(node, label, line, score)
+                        for node, label, line, score in journey]}
+
+
+def export(pipeline, config):
+    """
+    Write the run's nodes, top-k edges, itinerary and selected lines as
+    columnar artifacts (see run_artifacts.py) under runs_dir/<stage key>.
+    """
+    from run_artifacts import RunWriter, write_edges, write_itinerary, write_lines, \
+        write_nodes
+    vectors = pipeline.get('dedup')
+    route = pipeline.get('itinerary')
+    n_en, labels = vectors['n_en'], vectors['filelabels']
+    with RunWriter(config['runs_dir'], run_id=pipeline.key('export'),
+                   metadata={'config': config}) as run:
+        write_nodes(run, labels, n_en, vectors['vectors'])
+        write_edges(run, vectors['vectors'], n_en, k=config['export_k'])
+        write_itinerary(run, route['nodes'].tolist(), route['weights'].tolist(), labels)
+        write_lines(run, pipeline.get('line_selection')['journey'])
+    return {'run': run.path}
+
+
+def _corpus_inputs(config):
+    return [config['en_dir'], config['fr_dir']]
+
+
+STAGES = [
+    Stage('embeddings', load_embeddings, config_keys=(),
+          inputs=lambda c: [c['en_vectors'], c['fr_vectors']], version=3),
+    Stage('align', align, deps=('embeddings',), config_keys=('refine',)),
+    Stage('ingest_en', ingest_en, config_keys=('en_dir', 'en_stopwords', 'tokenizer'),
+          inputs=lambda c: [c['en_dir']] + _stopword_files(c['en_stopwords'])),
+    Stage('ingest_fr', ingest_fr, deps=('ingest_en',),
+          config_keys=('fr_dir', 'fr_stopwords', 'fr_limit', 'tokenizer'),
+          inputs=lambda c: [c['fr_dir']] + _stopword_files(c['fr_stopwords'])),
+    Stage('subwords', subwords, deps=('embeddings', 'align'), config_keys=('subwords',),
+          inputs=lambda c: list((c['subwords'] or {}).get('bin', {}).values())),
+    Stage('poem_vectors', poem_vectors,
+          deps=('embeddings', 'align', 'subwords', 'ingest_en', 'ingest_fr'),
+          config_keys=('weighting',), version=2),
+    Stage('dedup', dedup, deps=('poem_vectors', 'ingest_en', 'ingest_fr'),
+          config_keys=('dedup',)),
+    Stage('similarity', similarity, deps=('dedup',)),
+    Stage('itinerary', itinerary, deps=('similarity', 'dedup'),
+          config_keys=('strategy', 'strategy_options', 'clusters')),
+    Stage('line_selection', line_selection,
+          deps=('itinerary', 'dedup', 'poem_vectors', 'subwords', 'embeddings', 'align'),
+          config_keys=('en_dir', 'fr_dir', 'line_stopwords', 'tokenizer'),
+          inputs=lambda c: _corpus_inputs(c) + [
+              path for spec in c['line_stopwords'].values()
+              for path in _stopword_files(spec)]),
+    Stage('export', export, deps=('dedup', 'itinerary', 'line_selection'),
+          config_keys=('runs_dir', 'export_k')),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--config', help='JSON file overriding DEFAULT_CONFIG')
+    parser.add_argument('--cache-dir', default='.journey_cache')
+    parser.add_argument('--until', default='line_selection',
+                        choices=[stage.name for stage in STAGES],
+                        help='last stage to evaluate')
+    parser.add_argument('--force', nargs='*', default=[],
+                        help='stages to recompute even if cached')
+    parser.add_argument('--status', action='store_true',
+                        help='only report which stages are cached')
+    parser.add_argument('--report',
+                        help='write a JSON report of per-stage time, CPU, RSS and item counts')
+    parser.add_argument('--profile', nargs='*',
+                        help='run these stages (all if none given) under cProfile')
+    parser.add_argument('--profile-dir', help='where to dump the .prof files')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='record peak traced allocations with tracemalloc')
+    args = parser.parse_args()
+
+    if args.report or args.profile is not None or args.trace_memory:
+        profile = () if args.profile is None else (args.profile or True)
+        instrumentation.enable(profile=profile, profile_dir=args.profile_dir,
+                               trace_memory=args.trace_memory)
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    pipeline = Pipeline(config, cache_dir=args.cache_dir, force=args.force)
+
+    if args.status:
+        for stage in STAGES:
+            print('%-15s %-17s %s' % (stage.name, pipeline.key(stage.name),
+                                      'cached' if pipeline.is_cached(stage.name)
+                                      else 'to run'))
+        return
+
+    result = pipeline.get(args.until)
+    if args.report:
+        instrumentation.write_report(args.report)
+    if args.until == 'line_selection':
+        print()
+        for node, label, line_of_verse, score in result['journey']:
+            print(line_of_verse)
+        if pipeline.config['runs_dir']:
+            print('\nrun artifacts in %s' % pipeline.get('export')['run'])
+
+
+if __name__ == '__main__':
+    main()
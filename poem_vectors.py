@@ -0,0 +1,69 @@
+"""
+Poem and line vectors: the mean of the normalised word vectors of a token
+list, as computed in the notebook (weighting.py pools them with SIF or
+TF-IDF weights instead), and the selection of the line whose vector
+is closest to the vector of the whole poem (vector prosody).
+"""
+
+import numpy as np
+
+from instrumentation import instrumented
+
+
+def l2_norm(x):
+    return np.sqrt(np.sum(x**2))
+
+
+def div_norm(x):
+    norm_value = l2_norm(x)
+    if norm_value > 0:
+        return x * (1.0 / norm_value)
+    else:
+        return x
+
+
+@instrumented('text_vector')
+def text_vector(tokens, dictionary):
+    """
+    Sum of the normalised vectors of the tokens found in dictionary (a
+    FastVector), divided by the number of tokens, found or not. Returns a
+    zero vector for an empty token list.
+    """
+    vector = np.zeros(dictionary.n_dim)
+    for token in tokens:
+        if token in dictionary:
+            vector += div_norm(dictionary[token])
+    return vector / len(tokens) if tokens else vector
+
+
+def line_scores(line_vectors, poem_vector):
+    """
+    Cosine similarity of each line vector (rows of line_vectors) to the poem
+    vector. Lines without any vector (zero rows) score -inf so that they are
+    never selected over a real line.
+    """
+    line_vectors = np.atleast_2d(line_vectors)
+    norms = np.linalg.norm(line_vectors, axis=1) * np.linalg.norm(poem_vector)
+    scores = np.full(len(line_vectors), -np.inf)
+    valid = norms > 0
+    scores[valid] = np.matmul(line_vectors[valid], poem_vector) / norms[valid]
+    return scores
+
+
+@instrumented('best_line', items=lambda result: 1)
+def best_line(line_tokens, poem_vector, dictionary, pooling=None):
+    """
+    (line number, cosine similarity) of the line most representative of the
+    poem, line_tokens being the token list of each of its lines. With a
+    weighting.Pooling, the line vectors are pooled with it, in one batch.
+    """
+    if not line_tokens:
+        return None, -np.inf
+    if pooling is not None:
+        line_vectors = pooling.vectors(line_tokens, dictionary)
+    else:
+        line_vectors = np.array([text_vector(tokens, dictionary)
+                                 for tokens in line_tokens])
+    scores = line_scores(line_vectors, poem_vector)
+    j = int(np.argmax(scores))
+    return j, float(scores[j])
@@ -0,0 +1,138 @@
+"""
+Text cleaning and tokenization shared by poem ingestion and line selection,
+factored out of the notebook so that other modules can use it. nltk is only
+imported on the first tokenize() call, and stopwords and sentence models come
+from the offline resources module.
+"""
+
+import os
+import re
+import string
+
+import resources
+from instrumentation import instrumented
+
+remove_punct_map = dict.fromkeys(map(ord, string.punctuation))
+
+_whitespace = re.compile(r'\s+')
+
+
+def clean_text(text):
+    """
+    Preliminary cleaning of one piece of text
+    - remove (escaped) new line characters i.e. \\n or \\r
+    - remove tabs i.e. \\t
+    - remove extra spaces
+    - lower case
+    """
+    text = text.replace('\\n', ' ')
+    text = text.replace('\\r', ' ')
+    text = text.replace('\\t', ' ')
+    text = _whitespace.sub(' ', text)
+    return text.strip().lower()
+
+
+def _pre_clean(list_of_text):
+    """clean_text() over a list, dropping the strings left empty."""
+    cleaned_list = []
+    for text in list_of_text:
+        text = clean_text(text)
+        if text != '':
+            cleaned_list.append(text)
+    return cleaned_list
+
+
+_word_tokenize = None
+
+
+def word_tokenize(text):
+    """nltk's word_tokenize on a single line, importing nltk on first use."""
+    global _word_tokenize
+    if _word_tokenize is None:
+        from nltk.tokenize import word_tokenize as _word_tokenize
+    return _word_tokenize(text, preserve_line=True)
+
+
+@instrumented('tokenize', items=len)
+def tokenize(text, stopwords=(), tokenizer=None):
+    """
+    Tokenize a sentence or line of verse the way the notebook does: NLTK word
+    tokens, cleaned and lower-cased, stopwords removed, punctuation stripped
+    from the remaining tokens. Pass stopwords as a set, membership is tested
+    for every token. The text is already a sentence or a line, so it is not
+    run through the Punkt sentence splitter a second time. tokenizer
+    replaces nltk's word_tokenize, e.g. a line_tokenizer.LineTokenizer.
+    """
+    tokens = _pre_clean((tokenizer or word_tokenize)(text))
+    tokens = [token.translate(remove_punct_map) for token in tokens
+              if token not in stopwords]
+    return [token for token in tokens if token != '' and token not in stopwords]
+
+
+def load_stopwords(files=(), extra=()):
+    """
+    Stopword list made of the NLTK stopword corpus files named in files
+    (e.g. 'stop_words_poetry.txt', 'french1.txt') plus the extra words.
+    The files are found offline, see resources.find.
+    """
+    words = []
+    for name in files:
+        words.extend(resources.stopwords(name))
+    words.extend(extra)
+    return words
+
+
+def list_poems(directory, limit=None):
+    """Poem file names of directory, in os.listdir() order, cut to limit."""
+    files = [f for f in os.listdir(directory)
+             if os.path.isfile(os.path.join(directory, f))]
+    return files[:limit]
+
+
+def _single_line(line):
+    return [line]
+
+
+def iter_poems(directory, stopwords=(), limit=None, tokenizer=None, skip=0):
+    """
+    Generator of (label, tokens) for the poems of directory, in list_poems()
+    order, tokenized the way the notebook does: every physical line is split
+    into sentences with nltk's Punkt and every sentence tokenized. With a
+    tokenizer (e.g. a LineTokenizer) lines are not split into sentences but
+    tokenized whole by it instead. The first skip poems are not read.
+    """
+    if tokenizer is None:
+        sent_tokenize = resources.sentence_tokenizer()
+    else:
+        sent_tokenize = _single_line
+    stopwords = set(stopwords)
+    for f in list_poems(directory, limit)[skip:]:
+        tokens = []
+        with open(os.path.join(directory, f), 'r', encoding='utf-8',
+                  errors='ignore') as openf:
+            for line in openf:
+                for sentence in sent_tokenize(line):
+                    tokens.extend(tokenize(sentence, stopwords, tokenizer))
+        yield f, tokens
+
+
+@instrumented('ingest_directory', items=lambda result: len(result[1]))
+def ingest_directory(directory, stopwords=(), first_id=0, limit=None, tokenizer=None):
+    """
+    Open, label and tokenize the poems of directory (see iter_poems).
+    Returns ({node: label}, [tokens of each poem]), nodes being numbered
+    from first_id.
+    """
+    filelabels, texts_data = {}, []
+    for count, (f, tokens) in enumerate(iter_poems(directory, stopwords, limit,
+                                                   tokenizer), first_id):
+        filelabels[count] = f
+        texts_data.append(tokens)
+    return filelabels, texts_data
+
+
+def read_lines(path):
+    """The non-empty, cleaned lines of a poem file."""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as openf:
+        lines = [clean_text(line) for line in openf]
+    return [line for line in lines if line != '']
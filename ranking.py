@@ -0,0 +1,174 @@
+"""
+Rankings of edges and nodes by weight without sorting the whole set: the
+notebook's Sorted_weights, Sorted_degrees and centrality lists are mostly read
+at their first or last element. top_k/bottom_k select with np.argpartition and
+only sort the k selected values; the full ordering, when needed, is produced
+lazily in blocks of growing size.
+
+Orders are those of Python's sorted(..., reverse=True), which is stable: by
+decreasing value, ties in their original order. The last element of that
+list (Sorted_weights[len(Sorted_weights)-1]) is bottom_k(values, 1).
+```
+Usage:
+    $ Sorted_weights = Ranking.edges(G, 'correlation')
+    $ Sorted_weights.first(), Sorted_weights.last()
+    > (((22, 287), 0.41), ((3, 171), -0.02))
+    $ Sorted_degrees = Ranking.from_items(G.degree(weight='correlation'))
+    $ Sorted_degrees.top(5)
+```
+"""
+
+import numpy as np
+
+
+def top_k(values, k):
+    """Indices of the k largest values, largest first, ties by index."""
+    values = np.asarray(values)
+    k = min(k, len(values))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k == len(values):
+        return np.argsort(-values, kind='stable')
+    kth = values[np.argpartition(-values, k - 1)[:k]].min()
+    above = np.flatnonzero(values > kth)
+    tied = np.flatnonzero(values == kth)[:k - len(above)]
+    top = np.concatenate([above, tied])
+    return top[np.argsort(-values[top], kind='stable')]
+
+
+def bottom_k(values, k):
+    """
+    Indices of the k smallest values, smallest first, ties by decreasing
+    index: the last k elements of the descending order, reversed.
+    """
+    values = np.asarray(values)
+    return len(values) - 1 - top_k(-values[::-1], k)
+
+
+def iter_descending(values, block=1024):
+    """
+    Lazily yield the indices of values in the order of top_k(values,
+    len(values)). Every block is selected from what is left, and blocks
+    double in size, so reading the first few costs O(n) and exhausting the
+    iterator O(n log n).
+    """
+    values = np.asarray(values)
+    remaining = np.arange(len(values))
+    while len(remaining):
+        chosen = top_k(values[remaining], block)
+        for i in remaining[chosen]:
+            yield int(i)
+        left = np.ones(len(remaining), dtype=bool)
+        left[chosen] = False
+        remaining = remaining[left]
+        block *= 2
+
+
+class Ranking:
+    """
+    (key, value) pairs ranked by decreasing value. keys is a sequence of
+    keys, or a function of the position that builds the key on demand, so
+    that large edge sets need no Python tuple per edge.
+    """
+
+    def __init__(self, values, keys):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.keys = keys
+        self._order = None
+
+    @classmethod
+    def from_items(cls, items):
+        """Rank (key, value) pairs, e.g. dict.items() or G.degree(weight=...)."""
+        items = list(items)
+        return cls(np.fromiter((value for _, value in items), dtype=np.float64,
+                               count=len(items)),
+                   [key for key, _ in items])
+
+    @classmethod
+    def edges(cls, G, weight, source=None, target=None):
+        """
+        Rank the edges of the networkx graph G by their weight attribute, as
+        ((u, v), weight) pairs. With source and target (node containers,
+        e.g. filelabels_en and filelabels_fr) only the edges going from one
+        to the other are kept, like weights_en_to_fr.
+        """
+        m = G.number_of_edges()
+        ends = np.fromiter((node for edge in G.edges() for node in edge),
+                           dtype=np.int64, count=2 * m).reshape(m, 2)
+        values = np.fromiter((w for _, _, w in G.edges(data=weight)),
+                             dtype=np.float64, count=m)
+        if source is not None or target is not None:
+            kept = np.ones(m, dtype=bool)
+            if source is not None:
+                kept &= np.isin(ends[:, 0], np.fromiter(source, dtype=np.int64))
+            if target is not None:
+                kept &= np.isin(ends[:, 1], np.fromiter(target, dtype=np.int64))
+            ends, values = ends[kept], values[kept]
+        return cls(values, lambda i: (int(ends[i, 0]), int(ends[i, 1])))
+
+    @classmethod
+    def block_edges(cls, block, n_en):
+        """
+        Rank the EN-FR edges of the similarity block (block[i, j] weighs
+        the edge between EN node i and FR node n_en + j) straight from the
+        matrix, as ((i, n_en + j), weight) pairs.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        n_fr = block.shape[1]
+        return cls(block.ravel(), lambda i: (int(i // n_fr), n_en + int(i % n_fr)))
+
+    def __len__(self):
+        return len(self.values)
+
+    def _key(self, i):
+        return self.keys(i) if callable(self.keys) else self.keys[i]
+
+    def _items(self, positions):
+        return [(self._key(i), float(self.values[i])) for i in positions]
+
+    def top(self, k=1):
+        """The k highest-ranked (key, value) pairs."""
+        return self._items(top_k(self.values, k))
+
+    def bottom(self, k=1):
+        """The k lowest-ranked (key, value) pairs, lowest first."""
+        return self._items(bottom_k(self.values, k))
+
+    def first(self):
+        return self.top(1)[0]
+
+    def last(self):
+        return self.bottom(1)[0]
+
+    def order(self):
+        """Positions of all pairs in ranking order (computed once)."""
+        if self._order is None:
+            self._order = np.argsort(-self.values, kind='stable')
+        return self._order
+
+    def __iter__(self):
+        """
+        All (key, value) pairs in ranking order, produced lazily; a full
+        pass keeps the order for later passes.
+        """
+        if self._order is not None:
+            for i in self._order:
+                yield self._key(i), float(self.values[i])
+            return
+        seen = []
+        for i in iter_descending(self.values):
+            seen.append(i)
+            yield self._key(i), float(self.values[i])
+        self._order = np.array(seen, dtype=np.int64)
+
+    def __getitem__(self, rank):
+        """The pair at rank (negative ranks count from the end)."""
+        if rank < 0:
+            rank += len(self)
+        if not 0 <= rank < len(self):
+            raise IndexError('rank out of range')
+        if self._order is None and rank < 64:
+            return self.top(rank + 1)[rank]
+        if self._order is None and len(self) - rank <= 64:
+            return self.bottom(len(self) - rank)[-1]
+        return self._items([self.order()[rank]])[0]
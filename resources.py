@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Offline-first lookup of the NLP resources the journey uses: stopword lists
+(the NLTK stopwords corpus and the custom stop_words_poetry.txt and
+french1.txt) and Punkt sentence models. Nothing is ever downloaded and nltk
+is not imported to find them; resources are searched in order in
+
+- the directories of $JOURNEY_RESOURCES (os.pathsep separated),
+- resources/ next to this file (the bundle, see below),
+- the NLTK data directories ($NLTK_DATA and nltk's default locations).
+
+Resource names are NLTK-style paths, e.g. 'corpora/stopwords/french1.txt'.
+Copy what a machine with the data has into the bundle once, and later runs
+(or other machines, if the bundle is shipped along) need no network at all:
+```
+Usage:
+    $ python resources.py bundle corpora/stopwords/stop_words_poetry.txt \
+    $     corpora/stopwords/french1.txt tokenizers/punkt_tab/english
+    $ python resources.py which corpora/stopwords/french1.txt
+```
+"""
+
+import argparse
+import functools
+import os
+import shutil
+import sys
+import warnings
+
+BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources')
+
+
+def _nltk_data_dirs():
+    """nltk.data.path, without importing nltk unless it already is."""
+    if 'nltk.data' in sys.modules:
+        return list(sys.modules['nltk.data'].path)
+    dirs = [d for d in os.environ.get('NLTK_DATA', '').split(os.pathsep) if d]
+    home = os.path.expanduser('~/')
+    if home != '~/':
+        dirs.append(os.path.join(home, 'nltk_data'))
+    if sys.platform.startswith('win'):
+        dirs += [os.path.join(sys.prefix, 'nltk_data'),
+                 os.path.join(sys.prefix, 'share', 'nltk_data'),
+                 os.path.join(sys.prefix, 'lib', 'nltk_data'),
+                 os.path.join(os.environ.get('APPDATA', 'C:\\'), 'nltk_data'),
+                 'C:\\nltk_data', 'D:\\nltk_data', 'E:\\nltk_data']
+    else:
+        dirs += [os.path.join(sys.prefix, 'nltk_data'),
+                 os.path.join(sys.prefix, 'share', 'nltk_data'),
+                 os.path.join(sys.prefix, 'lib', 'nltk_data'),
+                 '/usr/share/nltk_data', '/usr/local/share/nltk_data',
+                 '/usr/lib/nltk_data', '/usr/local/lib/nltk_data']
+    return dirs
+
+
+def search_path():
+    """The directories searched for resources, in order."""
+    dirs = [d for d in os.environ.get('JOURNEY_RESOURCES', '').split(os.pathsep) if d]
+    return dirs + [BUNDLE_DIR] + _nltk_data_dirs()
+
+
+def find(resource):
+    """Path of resource (file or directory), LookupError if not found."""
+    for directory in search_path():
+        path = os.path.join(directory, *resource.split('/'))
+        if os.path.exists(path):
+            return path
+    raise LookupError('resource %r not found offline in any of\n  %s\ncopy it into '
+                      '%s (python resources.py bundle %s on a machine that has it)'
+                      % (resource, '\n  '.join(search_path()), BUNDLE_DIR, resource))
+
+
+@functools.lru_cache(maxsize=None)
+def _words(path):
+    with open(path, encoding='utf-8') as f:
+        return tuple(line for line in f.read().splitlines() if line.strip())
+
+
+def stopwords(name):
+    """
+    The words of the stopword list name (e.g. 'english' or 'french1.txt'),
+    as a new list, like nltk.corpus.stopwords.words(name).
+    """
+    return list(_words(find('corpora/stopwords/' + name)))
+
+
+def stopword_file(name):
+    """Path of the stopword list name, for cache fingerprints."""
+    return find('corpora/stopwords/' + name)
+
+
+def _line_sentences(text):
+    return [text] if text.strip() else []
+
+
+@functools.lru_cache(maxsize=None)
+def sentence_tokenizer(language='english'):
+    """
+    sent_tokenize(text) with the Punkt model of language if one is available
+    offline (nltk is imported on first use only). Otherwise the text is kept
+    as a single sentence, which for verse read line by line is what Punkt
+    mostly returns anyway, and a warning is issued once.
+    """
+    for resource in ('tokenizers/punkt_tab/' + language,
+                     'tokenizers/punkt/%s.pickle' % language):
+        try:
+            path = find(resource)
+        except LookupError:
+            continue
+        import nltk
+        data_dir = path[:path.rindex(os.sep + 'tokenizers' + os.sep)]
+        if data_dir not in nltk.data.path:
+            nltk.data.path.append(data_dir)
+        return functools.partial(nltk.sent_tokenize, language=language)
+    warnings.warn('no Punkt model for %s available offline, lines are not split '
+                  'into sentences' % language)
+    return _line_sentences
+
+
+def bundle(resources, dest=BUNDLE_DIR):
+    """Copy resources from the search path into the bundle directory."""
+    copied = []
+    for resource in resources:
+        source = find(resource)
+        target = os.path.join(dest, *resource.split('/'))
+        if os.path.abspath(source) == os.path.abspath(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, dirs_exist_ok=True)
+        else:
+            shutil.copyfile(source, target)
+        copied.append(target)
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline NLP resources of the journey.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    which = commands.add_parser('which', help='print where resources are found')
+    which.add_argument('resources', nargs='+')
+    copy = commands.add_parser('bundle', help='copy resources into the bundle')
+    copy.add_argument('resources', nargs='+')
+    copy.add_argument('--dest', default=BUNDLE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'which':
+        for resource in args.resources:
+            try:
+                print('%s: %s' % (resource, find(resource)))
+            except LookupError:
+                print('%s: not found' % resource)
+    else:
+        for target in bundle(args.resources, args.dest):
+            print('copied %s' % target)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Columnar, schema'd artifacts of journey runs, for analysing many runs
+without re-running them or parsing printed reprs. Every run is a directory
+of tables and every table a directory of column files, appended to as rows
+come in:
+
+    <root>/<run>/run.json                 run metadata (config, time, ...)
+    <root>/<run>/<table>/schema.json      column types and committed row count
+    <root>/<run>/<table>/<column>.bin     little-endian int32/int64/float64
+    <root>/<run>/<table>/<column>.utf8    strings: UTF-8 bytes plus
+    <root>/<run>/<table>/<column>.offsets int64 offsets
+
+Rows only count once schema.json says so, so a run cut short still reads
+back consistently. Numeric columns are read back memory-mapped.
+
+Tables (SCHEMA): nodes (label, language, centralities), edges (the k
+strongest cross-lingual edges of every node), itinerary and lines (the line
+selected from every poem on the route, with its score).
+```
+Usage:
+    $ with RunWriter('runs', metadata={'strategy': 'greedy'}) as run:
+    $     write_nodes(run, filelabels_total, n_en, vect_total,
+    $                 centralities={'closeness': clo_cen, 'betweenness': bet_cen})
+    $     write_edges(run, vect_total, n_en, k=10)
+    $     write_itinerary(run, route.nodes, route.weights, filelabels_total)
+    $     write_lines(run, stream_journey(...))
+    $ nodes = scan('runs', 'nodes')        # every run, with a 'run' column
+```
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+
+SCHEMA = {
+    'nodes': [('node', 'int64'), ('label', 'str'), ('language', 'str'),
+              ('degree', 'float64'), ('eigenvector', 'float64')],
+    'edges': [('source', 'int64'), ('target', 'int64'), ('rank', 'int32'),
+              ('weight', 'float64')],
+    'itinerary': [('step', 'int32'), ('node', 'int64'), ('label', 'str'),
+                  ('weight', 'float64')],
+    'lines': [('step', 'int32'), ('node', 'int64'), ('label', 'str'), ('line', 'str'),
+              ('score', 'float64')],
+}
+
+_DTYPES = {'int32': '<i4', 'int64': '<i8', 'float64': '<f8'}
+
+
+def _write_json(path, value):
+    with open(path + '.tmp', 'w') as fout:
+        json.dump(value, fout, indent=1, default=str)
+    os.replace(path + '.tmp', path)
+
+
+class TableWriter:
+    """Appends batches of rows to the column files of one table."""
+
+    def __init__(self, path, columns):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+        self._files = {}
+        self._sizes = {}
+        for name, kind in self.columns:
+            if kind == 'str':
+                self._files[name] = (open(os.path.join(path, name + '.utf8'), 'wb'),
+                                     open(os.path.join(path, name + '.offsets'), 'wb'))
+                self._files[name][1].write(np.zeros(1, dtype='<i8').tobytes())
+                self._sizes[name] = 0
+            elif kind in _DTYPES:
+                self._files[name] = (open(os.path.join(path, name + '.bin'), 'wb'),)
+            else:
+                raise ValueError('unknown column type %r' % kind)
+        self._commit(complete=False)
+
+    def _commit(self, complete):
+        for files in self._files.values():
+            for f in files:
+                f.flush()
+        _write_json(os.path.join(self.path, 'schema.json'),
+                    {'columns': self.columns, 'rows': self.rows, 'complete': complete})
+
+    def append(self, **values):
+        """Append rows given as one sequence per column, all of one length."""
+        names = [name for name, _ in self.columns]
+        if sorted(values) != sorted(names):
+            raise ValueError('expected the columns %s, got %s' % (names, sorted(values)))
+        lengths = {len(column) for column in values.values()}
+        if len(lengths) != 1:
+            raise ValueError('columns of different lengths: %s' % sorted(lengths))
+        for name, kind in self.columns:
+            if kind == 'str':
+                encoded = [str(value).encode('utf-8') for value in values[name]]
+                data, offsets = self._files[name]
+                data.write(b''.join(encoded))
+                ends = self._sizes[name] + np.cumsum([len(e) for e in encoded], dtype=np.int64)
+                offsets.write(ends.astype('<i8').tobytes())
+                self._sizes[name] = int(ends[-1]) if len(ends) else self._sizes[name]
+            else:
+                self._files[name][0].write(np.asarray(values[name]).astype(_DTYPES[kind]).tobytes())
+        self.rows += lengths.pop()
+        self._commit(complete=False)
+
+    def close(self):
+        self._commit(complete=True)
+        for files in self._files.values():
+            for f in files:
+                f.close()
+
+
+class RunWriter:
+    """
+    The artifact directory of one run under root, named run_id (by default
+    the start time plus a random suffix). metadata is saved as run.json.
+    """
+
+    def __init__(self, root, run_id=None, metadata=None):
+        self.run_id = run_id or '%s-%s' % (time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:6])
+        self.path = os.path.join(root, self.run_id)
+        os.makedirs(self.path, exist_ok=True)
+        self.metadata = {'run': self.run_id, 'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                         'metadata': metadata or {}}
+        _write_json(os.path.join(self.path, 'run.json'), self.metadata)
+        self.tables = {}
+
+    def table(self, name, extra_columns=()):
+        """
+        The writer of table name, created on first use with the columns of
+        SCHEMA[name] followed by extra_columns ((name, type) pairs).
+        """
+        if name not in self.tables:
+            self.tables[name] = TableWriter(os.path.join(self.path, name),
+                                            SCHEMA[name] + list(extra_columns))
+        return self.tables[name]
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.metadata['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.metadata['tables'] = {name: table.rows for name, table in self.tables.items()}
+        _write_json(os.path.join(self.path, 'run.json'), self.metadata)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def vector_centralities(vectors):
+    """
+    Centralities of the complete graph whose weights are the dot products
+    of vectors, self-loops removed (the notebook's G after In[40]), without
+    building it: the weighted degree G.degree(weight=...) and the
+    eigenvector centrality (principal eigenvector of the similarity matrix
+    with a zero diagonal, unit norm, as nx.eigenvector_centrality). The
+    matrix is only applied as V (V^T x) - |v_i|^2 x (scipy.sparse.linalg).
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    squared = np.einsum('ij,ij->i', vectors, vectors)
+    degree = np.matmul(vectors, vectors.sum(axis=0)) - squared
+    n = len(vectors)
+    if n < 3:
+        # eigsh needs more rows than eigenvectors asked for
+        matrix = np.matmul(vectors, vectors.transpose()) - np.diag(squared)
+        principal = np.linalg.eigh(matrix)[1][:, -1] if n else np.zeros(0)
+    else:
+        from scipy.sparse.linalg import LinearOperator, eigsh
+        operator = LinearOperator(
+            (n, n), dtype=np.float64,
+            matvec=lambda x: np.matmul(vectors, np.matmul(vectors.transpose(), x))
+            - squared * np.ravel(x))
+        principal = eigsh(operator, k=1, which='LA')[1][:, 0]
+    return {'degree': degree,
+            'eigenvector': principal if principal.sum() >= 0 else -principal}
+
+
+def write_nodes(run, filelabels_total, n_en, vectors, centralities=None, block=4096):
+    """
+    The nodes table: label, language, degree and eigenvector centrality
+    from the poem vectors, plus one column per entry of centralities
+    ({name: {node: value}}, e.g. nx.closeness_centrality(G)).
+    """
+    centralities = centralities or {}
+    computed = vector_centralities(vectors)
+    table = run.table('nodes', [(name, 'float64') for name in centralities])
+    n = len(computed['degree'])
+    for start in range(0, n, block):
+        nodes = np.arange(start, min(start + block, n))
+        columns = {name: [values.get(int(node), np.nan) for node in nodes]
+                   for name, values in centralities.items()}
+        table.append(node=nodes, label=[filelabels_total[int(node)] for node in nodes],
+                     language=['en' if node < n_en else 'fr' for node in nodes],
+                     degree=computed['degree'][nodes],
+                     eigenvector=computed['eigenvector'][nodes], **columns)
+
+
+def write_edges(run, vectors, n_en, k=10, block=1024):
+    """
+    The edges table: the k strongest cross-lingual edges of every node
+    (EN nodes first), computed block by block so the EN x FR matrix is
+    never held whole.
+    """
+    from itinerary import NeighbourIndex
+    vectors = np.asarray(vectors, dtype=np.float64)
+    table = run.table('edges')
+    for rows, others, shift in ((vectors[:n_en], vectors[n_en:], n_en),
+                                (vectors[n_en:], vectors[:n_en], 0)):
+        first = n_en - shift
+        for start in range(0, len(rows), block):
+            sims = np.matmul(rows[start:start + block], others.transpose())
+            order = NeighbourIndex._sorted_rows(sims, k)
+            width = order.shape[1]
+            table.append(source=np.repeat(np.arange(len(sims)) + first + start, width),
+                         target=(order + shift).ravel(),
+                         rank=np.tile(np.arange(width), len(sims)),
+                         weight=np.take_along_axis(sims, order, axis=1).ravel())
+
+
+def write_itinerary(run, nodes, weights, filelabels_total):
+    """The itinerary table; weights[i] led to nodes[i + 1] (NaN for the first node)."""
+    table = run.table('itinerary')
+    table.append(step=np.arange(len(nodes)), node=nodes,
+                 label=[filelabels_total[int(node)] for node in nodes],
+                 weight=[np.nan] + list(weights)[:max(len(nodes) - 1, 0)])
+
+
+def write_lines(run, journey, batch=256):
+    """
+    The lines table, from the (node, label, line, score) tuples of
+    journey.stream_journey, written batch by batch as the journey goes.
+    """
+    table = run.table('lines')
+    rows = []
+
+    def flush():
+        steps, nodes, labels, lines, scores = zip(*rows)
+        table.append(step=steps, node=nodes, label=labels, line=lines, score=scores)
+        rows.clear()
+
+    for step, (node, label, line, score) in enumerate(journey):
+        rows.append((step, node, label, line, score))
+        if len(rows) == batch:
+            flush()
+    if rows:
+        flush()
+
+
+def read_table(run_path, name):
+    """
+    {column: values} of a table of one run: numeric columns memory-mapped,
+    string columns as object arrays.
+    """
+    path = os.path.join(run_path, name)
+    with open(os.path.join(path, 'schema.json')) as f:
+        schema = json.load(f)
+    rows, table = schema['rows'], {}
+    for column, kind in schema['columns']:
+        if kind == 'str':
+            offsets = np.fromfile(os.path.join(path, column + '.offsets'), dtype='<i8',
+                                  count=rows + 1)
+            with open(os.path.join(path, column + '.utf8'), 'rb') as f:
+                data = f.read(int(offsets[-1]))
+            values = np.empty(rows, dtype=object)
+            values[:] = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(rows)]
+            table[column] = values
+        elif rows == 0:
+            table[column] = np.zeros(0, dtype=_DTYPES[kind])
+        else:
+            table[column] = np.memmap(os.path.join(path, column + '.bin'),
+                                      dtype=_DTYPES[kind], mode='r', shape=(rows,))
+    return table
+
+
+def runs(root):
+    """The run ids under root, oldest first."""
+    return sorted(d for d in os.listdir(root)
+                  if os.path.exists(os.path.join(root, d, 'run.json')))
+
+
+def scan(root, name, columns=None):
+    """
+    {column: values} of table name over every run under root that has it,
+    concatenated, with a 'run' column holding the run id of every row.
+    """
+    parts = []
+    for run_id in runs(root):
+        if os.path.exists(os.path.join(root, run_id, name, 'schema.json')):
+            table = read_table(os.path.join(root, run_id), name)
+            table = {c: v for c, v in table.items() if columns is None or c in columns}
+            length = len(next(iter(table.values()))) if table else 0
+            table['run'] = np.full(length, run_id, dtype=object)
+            parts.append(table)
+    if not parts:
+        return {}
+    shared = [c for c in parts[0] if all(c in part for part in parts)]
+    return {c: np.concatenate([np.asarray(part[c]) for part in parts]) for c in shared}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise the journey runs under a directory.')
+    parser.add_argument('root', nargs='?', default='runs')
+    parser.add_argument('--table', help='print the columns and row count of this table per run')
+    args = parser.parse_args()
+
+    for run_id in runs(args.root):
+        with open(os.path.join(args.root, run_id, 'run.json')) as f:
+            info = json.load(f)
+        print('%s  %s' % (run_id, ', '.join('%s: %d rows' % item
+                                            for item in info.get('tables', {}).items())))
+        if args.table and os.path.isdir(os.path.join(args.root, run_id, args.table)):
+            table = read_table(os.path.join(args.root, run_id), args.table)
+            print('    %s' % ', '.join(table))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Publish NumPy arrays in multiprocessing.shared_memory so that worker
+processes can attach to them zero-copy instead of unpickling their own copy.
+```
+Usage:
+    $ shared = SharedArrays.publish({'weights': weights})
+    $ handle = shared.handle              # small and picklable, send to workers
+    $ arrays, segments = attach_arrays(handle)   # in the worker
+    $ shared.close()                      # in the owner, once workers are done
+```
+"""
+
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Owner side of a set of named arrays living in shared memory. The owner
+    is responsible for unlinking the segments, either with close() or by
+    using the object as a context manager.
+    """
+
+    def __init__(self, segments, handle):
+        self.segments = segments
+        self.handle = handle
+
+    @classmethod
+    def publish(cls, arrays):
+        """Copy each array of the {name: ndarray} dict into its own segment."""
+        segments, handle = [], {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+            view[...] = arr
+            segments.append(shm)
+            handle[name] = (shm.name, arr.shape, arr.dtype.str)
+        return cls(segments, handle)
+
+    def arrays(self):
+        """Views on the owner's own segments."""
+        return _views(self.handle, self.segments)
+
+    def close(self):
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13 attaching registers the segment with the
+        # resource tracker, which would then unlink it behind the owner's back
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _views(handle, segments):
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            for (name, (_, shape, dtype)), shm in zip(handle.items(), segments)}
+
+
+def attach_arrays(handle):
+    """
+    Attach to arrays published by SharedArrays. Returns the {name: ndarray}
+    views and the list of segments, which must be kept alive (and closed,
+    not unlinked) for as long as the views are used.
+    """
+    segments = [_open(shm_name) for shm_name, _, _ in handle.values()]
+    return _views(handle, segments), segments
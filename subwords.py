@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Vectors for out-of-vocabulary tokens, built from their character n-grams the
+way fastText does: the n-grams of '<token>' (minn to maxn characters) are
+hashed with 32-bit FNV-1a into bucket rows, and the token's vector is the
+mean of the rows found. The rows come either from the n-gram part of the
+input matrix of a fastText .bin model (load_bin), or, with only the .vec
+table at hand, are derived from it (Subwords.derive): the row of an n-gram
+is the mean of the normalised vectors of the frequent words containing it.
+
+Rare and inflected forms are common in poetry. The notebook drops them but
+still counts them in the denominator of the poem's mean; here they get a
+vector whenever one of their n-grams is known, and the mean is taken over
+the tokens that have a vector. OOV vectors are kept in an LRU cache, and a
+whole batch of poems or lines is pooled at once (Subwords.vectors).
+```
+Usage:
+    $ subwords = Subwords.derive(en_dictionary, max_words=50000)
+    $ subwords = load_bin('wiki.fr.bin', transform=transform)
+    $ subwords.vector('rêveusement')
+    $ vect_en = subwords.vectors(texts_data, en_dictionary)
+    $ python subwords.py wiki.en.vec cannes_&_stuff --stopwords stop_words_poetry.txt
+```
+"""
+
+import argparse
+import functools
+import struct
+
+import numpy as np
+
+from instrumentation import instrumented
+
+BIN_MAGIC = 793712314
+
+
+def fnv1a(data):
+    """fastText's 32-bit FNV-1a of a byte string (bytes sign-extended, as chars)."""
+    h = 2166136261
+    for byte in data:
+        h = ((h ^ (byte if byte < 128 else byte | 0xFFFFFF00)) * 16777619) & 0xFFFFFFFF
+    return h
+
+
+def ngram_hashes(word, minn=3, maxn=6, bucket=2000000):
+    """
+    Bucket ids of the character n-grams of '<word>' of minn to maxn
+    characters, in fastText's order (Dictionary::computeSubwords).
+    """
+    data = ('<' + word + '>').encode('utf-8')
+    size, hashes = len(data), []
+    for i in range(size):
+        if data[i] & 0xC0 == 0x80:
+            continue
+        j, n = i, 1
+        while j < size and n <= maxn:
+            j += 1
+            while j < size and data[j] & 0xC0 == 0x80:
+                j += 1
+            if n >= minn and not (n == 1 and (i == 0 or j == size)):
+                hashes.append(fnv1a(data[i:j]) % bucket)
+            n += 1
+    return hashes
+
+
+class Subwords:
+    """
+    N-gram rows: rows[i] is the vector of bucket buckets[i] (buckets
+    sorted; None when rows holds every bucket, as in a .bin model).
+    transform, if set, is applied to every OOV vector (e.g. the FR
+    alignment), so that a .bin bucket table is never transformed whole.
+    vector(word) is the vector of a token from its n-grams (None if none
+    is known), LRU-cached per table.
+    """
+
+    def __init__(self, buckets, rows, minn=3, maxn=6, bucket=2000000, transform=None,
+                 cache_size=1 << 16):
+        self.buckets = None if buckets is None else np.asarray(buckets, dtype=np.int64)
+        self.rows = rows
+        self.minn, self.maxn, self.bucket = int(minn), int(maxn), int(bucket)
+        self.transform = transform
+        self.n_dim = rows.shape[1] if transform is None else transform.shape[1]
+        self.vector = functools.lru_cache(maxsize=cache_size)(self._vector)
+
+    @classmethod
+    @instrumented('subwords.derive')
+    def derive(cls, dictionary, max_words=50000, minn=3, maxn=6, bucket=2000000):
+        """
+        Bucket rows derived from the first max_words words of a FastVector
+        (the most frequent ones in a .vec file): the mean of the normalised
+        vectors of the words each n-gram occurs in, as float32.
+        """
+        from scipy import sparse
+        words = dictionary.vocabulary.words()[:max_words]
+        hashes = [ngram_hashes(word, minn, maxn, bucket) for word in words]
+        word_of = np.repeat(np.arange(len(words)), [len(h) for h in hashes])
+        hashes = np.fromiter((h for word in hashes for h in word), dtype=np.int64,
+                             count=len(word_of))
+        buckets, rows = np.unique(hashes, return_inverse=True)
+        incidence = sparse.csr_matrix((np.ones(len(rows)), (rows, word_of)),
+                                      shape=(len(buckets), len(words)))
+        incidence.data[:] = 1  # an n-gram twice in a word counts once
+        unit = np.asarray(dictionary.embed[:len(words)], dtype=np.float64)
+        norms = np.linalg.norm(unit, axis=1)
+        norms[norms == 0] = 1
+        vectors = np.asarray(incidence @ (unit / norms[:, None]))
+        vectors /= np.asarray(incidence.sum(axis=1))
+        return cls(buckets, vectors.astype(np.float32), minn, maxn, bucket)
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='', transform=None):
+        """The Subwords saved by arrays() (e.g. a pipeline stage result)."""
+        minn, maxn, bucket = (int(x) for x in arrays[prefix + 'ngrams'])
+        return cls(arrays[prefix + 'buckets'], arrays[prefix + 'rows'], minn, maxn,
+                   bucket, transform)
+
+    def arrays(self, prefix=''):
+        """The bucket ids, rows and n-gram settings as {name: array}."""
+        buckets = np.arange(self.bucket) if self.buckets is None else self.buckets
+        return {prefix + 'buckets': buckets, prefix + 'rows': np.asarray(self.rows),
+                prefix + 'ngrams': np.array([self.minn, self.maxn, self.bucket])}
+
+    def _vector(self, word):
+        found = np.array(ngram_hashes(word, self.minn, self.maxn, self.bucket), dtype=np.int64)
+        if self.buckets is not None:
+            if not len(self.buckets):
+                return None
+            positions = np.minimum(np.searchsorted(self.buckets, found), len(self.buckets) - 1)
+            found = positions[self.buckets[positions] == found]
+        if not len(found):
+            return None
+        vector = np.asarray(self.rows[np.sort(found)], dtype=np.float64).mean(axis=0)
+        return vector if self.transform is None else np.matmul(vector, self.transform)
+
+    @instrumented('subwords.vectors', items=len)
+    def vectors(self, texts, dictionary):
+        """
+        (len(texts), n_dim) vectors of the token lists, as text_vector
+        computes them but with the OOV tokens of dictionary (a FastVector,
+        the one the rows belong to) given their n-gram vector, and the sum
+        of normalised vectors divided by the number of tokens that have one.
+        """
+        lengths = np.fromiter((len(tokens) for tokens in texts), dtype=np.int64,
+                              count=len(texts))
+        tokens = [token for text in texts for token in text]
+        ids = dictionary.vocabulary.ids(tokens)
+        rows = np.zeros((len(tokens), dictionary.n_dim))
+        known = ids >= 0
+        rows[known] = dictionary.embed[ids[known]]
+        for position in np.flatnonzero(~known):
+            vector = self.vector(tokens[position])
+            if vector is not None:
+                rows[position] = vector
+        norms = np.linalg.norm(rows, axis=1)
+        found = norms > 0
+        rows[found] /= norms[found, None]
+        poem_of_token = np.repeat(np.arange(len(texts)), lengths)
+        counts = np.bincount(poem_of_token[found], minlength=len(texts))
+        sums = np.zeros((len(texts), dictionary.n_dim))
+        present = lengths > 0
+        if present.any():
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            sums[present] = np.add.reduceat(rows, starts[present], axis=0)
+        return sums / np.maximum(counts, 1)[:, None]
+
+
+def _read_cstring(f, chunk=256):
+    """Bytes up to the next NUL of a binary file; the file is left after it."""
+    parts = []
+    while True:
+        start = f.tell()
+        data = f.read(chunk)
+        if not data:
+            raise ValueError('truncated fastText model')
+        end = data.find(b'\0')
+        if end >= 0:
+            parts.append(data[:end])
+            f.seek(start + end + 1)
+            return b''.join(parts)
+        parts.append(data)
+
+
+@instrumented('subwords.load_bin')
+def load_bin(path, transform=None):
+    """
+    Subwords on the n-gram rows of a fastText .bin model (format version
+    11 or 12, not quantized), memory-mapped; transform as in Subwords.
+    """
+    with open(path, 'rb') as f:
+        magic, version = struct.unpack('<ii', f.read(8))
+        if magic != BIN_MAGIC or version > 12:
+            raise ValueError('%s is not a fastText model' % path)
+        args = struct.unpack('<12i', f.read(48))
+        f.read(8)  # sampling threshold t
+        bucket, minn, maxn = args[8], args[9], args[10]
+        size, nwords, _ = struct.unpack('<3i', f.read(12))
+        _, pruneidx_size = struct.unpack('<2q', f.read(16))
+        for _ in range(size):
+            _read_cstring(f)
+            f.seek(9, 1)  # count (int64) and entry type (int8)
+        if pruneidx_size > 0:
+            raise ValueError('pruned (quantized) fastText models are not supported')
+        if struct.unpack('<?', f.read(1))[0]:
+            raise ValueError('quantized fastText models are not supported')
+        rows, dim = struct.unpack('<2q', f.read(16))
+        offset = f.tell()
+    matrix = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(rows, dim))
+    return Subwords(None, matrix[nwords:nwords + bucket], minn, maxn, bucket, transform)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report the OOV tokens of a directory that n-grams give a vector.')
+    parser.add_argument('vectors', help='.vec table (or store prefix) of the language')
+    parser.add_argument('directory')
+    parser.add_argument('--bin', help='fastText .bin model holding the n-gram rows')
+    parser.add_argument('--stopwords', nargs='*', default=[], help='stopword lists')
+    parser.add_argument('--max-words', type=int, default=50000,
+                        help='words the n-gram rows are derived from, without --bin')
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    from preprocessing import iter_poems, load_stopwords
+    from table_loader import load_tables
+    table = load_tables({'table': args.vectors})['table']
+    subwords = load_bin(args.bin) if args.bin else Subwords.derive(table, args.max_words)
+    tokens = oov = covered = 0
+    for _, poem in iter_poems(args.directory, load_stopwords(args.stopwords), args.limit):
+        for token in poem:
+            tokens += 1
+            if token not in table:
+                oov += 1
+                covered += subwords.vector(token) is not None
+    print('%d tokens, %d out of vocabulary, %d of them given an n-gram vector'
+          % (tokens, oov, covered))
+
+
+if __name__ == '__main__':
+    main()
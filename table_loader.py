@@ -0,0 +1,205 @@
+"""
+Concurrent loading of several embedding tables (one per language), so that
+startup is bounded by the slowest table rather than by the sum of them.
+
+A table is either a fastText .vec file, parsed in a process pool, or a store
+written by FastVector.save, memory-mapped in a thread pool. With store_dir,
+every parsed .vec file is also saved there as a store, named after a hash of
+its absolute path, with the file's size and mtime recorded next to it; later
+loads of the same unmodified file map the store instead of parsing again.
+```
+Usage:
+    $ tables = load_tables({'en': 'wiki.en.vec', 'fr': 'wiki.fr.vec'},
+    $                      store_dir='tables', memory_budget_mb=8000)
+    $ en_dictionary, fr_dictionary = tables['en'], tables['fr']
+```
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, \
+    ThreadPoolExecutor, wait
+
+from fastvector import FastVector
+from vocabulary import Vocabulary
+
+_progress_queue = None
+
+
+def _print_progress(name, message):
+    print('%-6s %s' % (name, message))
+
+
+def store_prefix(path, store_dir):
+    """
+    Prefix of the store of the .vec file path in store_dir: its base name
+    and a hash of its absolute path, so that files of the same name in
+    different directories get their own store.
+    """
+    path = os.path.abspath(path)
+    base = os.path.basename(path)
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(store_dir, '%s-%s' % (base[:-4] if base.endswith('.vec') else base,
+                                              digest))
+
+
+def _is_store(prefix):
+    return os.path.exists(prefix + '.embed.npy')
+
+
+def _source_state(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _write_source(path, prefix):
+    """Record the size and mtime of the .vec file path next to its store."""
+    with open(prefix + '.source.json.tmp', 'w') as fout:
+        json.dump(_source_state(path), fout)
+    os.replace(prefix + '.source.json.tmp', prefix + '.source.json')
+
+
+def _store_is_fresh(path, prefix):
+    """Whether the store at prefix holds the .vec file path as it is now."""
+    if not _is_store(prefix):
+        return False
+    try:
+        with open(prefix + '.source.json') as f:
+            return json.load(f) == _source_state(path)
+    except (OSError, ValueError):
+        return False
+
+
+def estimate_mb(path):
+    """
+    Peak memory of parsing a .vec file, from its header: the float64 matrix
+    plus the words (about 40 bytes each while parsing). Stores are
+    memory-mapped and count as 0.
+    """
+    if _is_store(path):
+        return 0.
+    with open(path) as f:
+        n_words, n_dim = (int(x) for x in f.readline().split())
+    return (n_words * n_dim * 8 + n_words * 40) / 2.**20
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _parse(name, path, prefix):
+    """Process pool task: parse path, and either save it or return it."""
+    def progress(done, total):
+        _progress_queue.put((name, 'parsed %d/%d words' % (done, total)))
+    table = FastVector(vector_file=path, progress=progress)
+    if prefix is None:
+        return table.embed, table.vocabulary.arrays()
+    _progress_queue.put((name, 'saving %s' % prefix))
+    table.save(prefix)
+    _write_source(path, prefix)
+    return None
+
+
+def _drain(progress_queue, progress, stop):
+    while not stop.is_set() or not progress_queue.empty():
+        try:
+            progress(*progress_queue.get(timeout=.1))
+        except queue.Empty:
+            pass
+
+
+def load_tables(sources, store_dir=None, workers=None, memory_budget_mb=None,
+                progress=_print_progress):
+    """
+    {name: FastVector} for sources, a {name: path} dict of .vec files or
+    store prefixes. Parsing runs in up to workers processes (default: one
+    per .vec table), but never with more than memory_budget_mb of estimated
+    parsing memory in flight; a table over the budget on its own still runs,
+    alone. progress(name, message) is called as every table advances.
+    """
+    if store_dir is not None:
+        os.makedirs(store_dir, exist_ok=True)
+    mapped, parsed, same = {}, {}, {}
+    first_name = {}
+    for name, path in sources.items():
+        # a file named twice is loaded once (and never saved twice at once)
+        first = first_name.setdefault(os.path.abspath(path), name)
+        if first != name:
+            same[name] = first
+        elif _is_store(path):
+            mapped[name] = path
+        elif store_dir is not None and _store_is_fresh(path, store_prefix(path, store_dir)):
+            mapped[name] = store_prefix(path, store_dir)
+        else:
+            parsed[name] = path
+
+    tables, started = {}, {}
+    lock = threading.Lock()
+
+    def report(name, message):
+        with lock:
+            progress(name, message)
+
+    def map_store(name, prefix):
+        started[name] = time.perf_counter()
+        table = FastVector.load(prefix)
+        report(name, 'mapped %s: %d words in %.2fs'
+                 % (prefix, table.n_words, time.perf_counter() - started[name]))
+        return table
+
+    def parsed_table(name, result):
+        if result is None:
+            table = FastVector.load(store_prefix(parsed[name], store_dir))
+        else:
+            embed, arrays = result
+            table = FastVector.from_arrays(embed, Vocabulary.from_arrays(arrays))
+        report(name, 'loaded %d words in %.2fs'
+                 % (table.n_words, time.perf_counter() - started[name]))
+        return table
+
+    with ThreadPoolExecutor(max_workers=max(1, len(mapped))) as threads:
+        mapping = {name: threads.submit(map_store, name, prefix)
+                   for name, prefix in mapped.items()}
+        if parsed:
+            estimates = {name: estimate_mb(path) for name, path in parsed.items()}
+            context = multiprocessing.get_context()
+            progress_queue = context.Queue()
+            stop = threading.Event()
+            drainer = threading.Thread(target=_drain, args=(progress_queue, report, stop))
+            drainer.start()
+            try:
+                with ProcessPoolExecutor(max_workers=workers or len(parsed),
+                                         mp_context=context, initializer=_init_worker,
+                                         initargs=(progress_queue,)) as pool:
+                    waiting, running, in_flight = list(parsed), {}, 0.
+                    while waiting or running:
+                        while waiting and (not running or memory_budget_mb is None
+                                           or in_flight + estimates[waiting[0]]
+                                           <= memory_budget_mb):
+                            name = waiting.pop(0)
+                            prefix = (None if store_dir is None
+                                      else store_prefix(parsed[name], store_dir))
+                            started[name] = time.perf_counter()
+                            report(name, 'parsing %s (~%.0f MB)'
+                                     % (parsed[name], estimates[name]))
+                            running[pool.submit(_parse, name, parsed[name], prefix)] = name
+                            in_flight += estimates[name]
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            name = running.pop(future)
+                            in_flight -= estimates[name]
+                            tables[name] = parsed_table(name, future.result())
+            finally:
+                stop.set()
+                drainer.join()
+        for name, future in mapping.items():
+            tables[name] = future.result()
+    for name, first in same.items():
+        tables[name] = tables[first]
+    return {name: tables[name] for name in sources}
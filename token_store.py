@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Out-of-core ingestion for very large corpora. Poems are read and tokenized
+one at a time and their tokens appended, as ids into the language's
+Vocabulary (-1 for out-of-vocabulary tokens), to flat files:
+
+    <prefix>.ids       int32 token ids of all poems, concatenated
+    <prefix>.offsets   int64 start of every poem in .ids, plus the end
+    <prefix>.labels    poem file names, one per line
+    <prefix>.json      progress checkpoint
+
+Nothing but the current poem is held in memory, and an interrupted ingestion
+resumes from its last checkpoint. Poem vectors are then computed chunk by
+chunk from the memory-mapped ids.
+```
+Usage:
+    $ store = TokenStore.ingest('tokens/en', HOME + '/cannes_&_stuff/',
+    $                           en_dictionary.vocabulary, stopwords_0)
+    $ vect_en = store.poem_vectors(en_dictionary, out='vect_en.npy')
+```
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from preprocessing import iter_poems
+
+
+def _read_state(prefix):
+    try:
+        with open(prefix + '.json') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_state(prefix, state):
+    with open(prefix + '.json.tmp', 'w') as fout:
+        json.dump(state, fout)
+    os.replace(prefix + '.json.tmp', prefix + '.json')
+
+
+def _options_fingerprint(stopwords, tokenizer, limit):
+    """Hash of the options that decide which tokens a store holds."""
+    if tokenizer is None:
+        tokenizer_name = 'nltk'
+    elif hasattr(tokenizer, '__qualname__'):
+        tokenizer_name = '%s.%s' % (tokenizer.__module__, tokenizer.__qualname__)
+    else:
+        tokenizer_name = repr(tokenizer)
+    encoded = json.dumps({'stopwords': sorted(stopwords), 'tokenizer': tokenizer_name,
+                          'limit': limit})
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def _truncate(path, size):
+    with open(path, 'ab') as f:
+        f.truncate(size)
+
+
+def _map(path, dtype, length):
+    if length == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+
+class TokenStore:
+    """Memory-mapped token ids of a corpus ingested by TokenStore.ingest."""
+
+    def __init__(self, prefix):
+        state = _read_state(prefix)
+        if state is None or not state['complete']:
+            raise ValueError('%s is not a complete token store, run TokenStore.ingest '
+                             '(again) to finish it' % prefix)
+        self.prefix = prefix
+        self.vocabulary_size = state['vocabulary_size']
+        self.ids = _map(prefix + '.ids', np.int32, state['tokens'])
+        self.offsets = _map(prefix + '.offsets', np.int64, state['poems'] + 1)
+        with open(prefix + '.labels', encoding='utf-8') as f:
+            self.labels = f.read().splitlines()
+
+    @classmethod
+    def ingest(cls, prefix, directory, vocabulary, stopwords=(), limit=None,
+               tokenizer=None, checkpoint_every=1000):
+        """
+        Tokenize the poems of directory (see preprocessing.iter_poems) into
+        the store at prefix, checkpointing every checkpoint_every poems. If
+        the store exists but is incomplete, ingestion resumes after its last
+        checkpoint; anything written after it is discarded. Returns the
+        opened store. A store ingested from another directory or vocabulary,
+        or with other stopwords, tokenizer or limit, is an error.
+        """
+        directory_path = os.path.abspath(directory)
+        options = _options_fingerprint(stopwords, tokenizer, limit)
+        state = _read_state(prefix)
+        if state is None:
+            os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+            state = {'directory': directory_path, 'vocabulary_size': len(vocabulary),
+                     'options': options,
+                     'poems': 0, 'tokens': 0, 'labels_bytes': 0, 'complete': False}
+        elif (state['directory'], state['vocabulary_size']) != (directory_path,
+                                                                  len(vocabulary)):
+            raise ValueError('%s was ingested from another directory or vocabulary'
+                             % prefix)
+        elif state.get('options') != options:
+            raise ValueError('%s was ingested with other stopwords, tokenizer or limit'
+                             % prefix)
+        if state['complete']:
+            return cls(prefix)
+
+        _truncate(prefix + '.ids', state['tokens'] * 4)
+        _truncate(prefix + '.offsets', (state['poems'] + 1) * 8 if state['poems'] else 0)
+        _truncate(prefix + '.labels', state['labels_bytes'])
+        files = [open(prefix + suffix, 'ab') for suffix in ('.ids', '.offsets', '.labels')]
+        ids_file, offsets_file, labels_file = files
+
+        def checkpoint(complete=False):
+            for f in files:
+                f.flush()
+                os.fsync(f.fileno())
+            state['complete'] = complete
+            _write_state(prefix, state)
+
+        try:
+            if state['poems'] == 0:
+                offsets_file.write(np.int64(0).tobytes())
+            poems = iter_poems(directory, stopwords, limit, tokenizer, skip=state['poems'])
+            for label, tokens in poems:
+                ids = vocabulary.ids(tokens).astype(np.int32)
+                ids_file.write(ids.tobytes())
+                state['tokens'] += len(ids)
+                offsets_file.write(np.int64(state['tokens']).tobytes())
+                encoded = (label + '\n').encode('utf-8')
+                labels_file.write(encoded)
+                state['labels_bytes'] += len(encoded)
+                state['poems'] += 1
+                if state['poems'] % checkpoint_every == 0:
+                    checkpoint()
+            checkpoint(complete=True)
+        finally:
+            for f in files:
+                f.close()
+        return cls(prefix)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def n_tokens(self):
+        return len(self.ids)
+
+    def poem_ids(self, i):
+        """Token ids of poem i (-1 for out-of-vocabulary tokens)."""
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def label(self, i):
+        return self.labels[i]
+
+    def poem_vectors(self, dictionary, out=None, chunk_tokens=1 << 16):
+        """
+        The vector of every poem, as poem_vectors.text_vector computes it
+        (sum of the normalised vectors of the tokens in dictionary, divided
+        by the number of tokens, out-of-vocabulary ones included), reading
+        about chunk_tokens tokens at a time. With out, the vectors are
+        written to that .npy file through a memory map, so memory stays
+        bounded by the chunk size whatever the corpus size.
+        """
+        n = len(self)
+        shape = (n, dictionary.n_dim)
+        vectors = (np.lib.format.open_memmap(out, mode='w+', dtype=np.float64, shape=shape)
+                   if out is not None else np.zeros(shape))
+        offsets = np.asarray(self.offsets)
+        start = 0
+        while start < n:
+            end = int(np.searchsorted(offsets, offsets[start] + chunk_tokens, side='right')) - 1
+            end = min(max(end, start + 1), n)
+            ids = np.asarray(self.ids[offsets[start]:offsets[end]])
+            lengths = np.diff(offsets[start:end + 1])
+            known = ids >= 0
+            rows = np.asarray(dictionary.embed[ids[known]], dtype=np.float64)
+            norms = np.linalg.norm(rows, axis=1)
+            norms[norms == 0] = 1
+            rows /= norms[:, None]
+            poem_of_token = np.repeat(np.arange(end - start), lengths)[known]
+            counts = np.bincount(poem_of_token, minlength=end - start)
+            sums = np.zeros((end - start, dictionary.n_dim))
+            present = counts > 0
+            if present.any():
+                starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+                sums[present] = np.add.reduceat(rows, starts[present], axis=0)
+            vectors[start:end] = sums / np.maximum(lengths, 1)[:, None]
+            start = end
+        if out is not None:
+            vectors.flush()
+        return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Stream a poem directory into a token store and compute poem vectors.')
+    parser.add_argument('prefix', help='token store prefix, e.g. tokens/en')
+    parser.add_argument('directory', help='poem directory')
+    parser.add_argument('vectors', help='embedding table: .vec file or FastVector.save store')
+    parser.add_argument('--stopwords', nargs='*', default=[], help='stopword lists')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--tokenizer', choices=['nltk', 'lines', 'lines_en', 'lines_fr'],
+                        default='nltk', help="lines_<lang> adds that language's elision rules")
+    parser.add_argument('--transform', help='.npy alignment matrix applied to the table')
+    parser.add_argument('--out', help='write the poem vectors to this .npy file')
+    args = parser.parse_args()
+
+    from preprocessing import load_stopwords
+    from table_loader import load_tables
+    table = load_tables({'table': args.vectors})['table']
+    tokenizer = None
+    if args.tokenizer != 'nltk':
+        from line_tokenizer import LineTokenizer
+        tokenizer = LineTokenizer(args.tokenizer[6:] or None)
+    store = TokenStore.ingest(args.prefix, args.directory, table.vocabulary,
+                              load_stopwords(args.stopwords), args.limit, tokenizer)
+    print('%d poems, %d tokens (%.1f%% in vocabulary)'
+          % (len(store), store.n_tokens,
+             100. * np.count_nonzero(np.asarray(store.ids) >= 0) / max(store.n_tokens, 1)))
+    if args.out:
+        if args.transform:
+            table.apply_transform(np.load(args.transform))
+        store.poem_vectors(table, out=args.out)
+        print('poem vectors written to %s' % args.out)
+
+
+if __name__ == '__main__':
+    main()
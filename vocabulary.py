@@ -0,0 +1,188 @@
+"""
+Compact vocabulary: the words of an embedding table as one concatenated
+UTF-8 byte buffer with an offsets array, in id order, plus an open-addressing
+hash table of ids (CRC-32, linear probing) for word -> id lookup. Three flat
+NumPy arrays instead of millions of str objects and dict entries, so that the
+vocabulary can be saved as .npy files and memory-mapped, or published in
+shared memory, like the embedding matrix itself.
+```
+Usage:
+    $ vocab = Vocabulary.from_words(['the', 'sea', 'mer'])
+    $ 'sea' in vocab, vocab['sea'], vocab.word(1)
+    > (True, 1, 'sea')
+    $ vocab.ids(['mer', 'nuit'])
+    > array([ 2, -1])
+```
+"""
+
+import zlib
+from collections.abc import Sequence
+
+import numpy as np
+
+
+def pack_words(words):
+    """
+    The words as one concatenated UTF-8 byte array and the (n_words + 1)
+    offsets delimiting them.
+    """
+    encoded = [word.encode('utf-8') for word in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _hash_table(buffer, offsets):
+    """
+    Open-addressing table (load factor <= .5) of the ids of the packed
+    words, filled one probe step at a time for all pending ids together.
+    Later ids win their home slot, so that a duplicated word resolves to
+    its last id, as word2id did.
+    """
+    data = buffer.tobytes()
+    bounds = offsets.tolist()
+    n = len(bounds) - 1
+    hashes = np.array([zlib.crc32(data[bounds[i]:bounds[i + 1]]) for i in range(n)],
+                      dtype=np.int64)
+    size = 1 << max(3, (2 * n - 1).bit_length())
+    table = np.full(size, -1, dtype=np.int64 if n >= 2**31 else np.int32)
+    pending = np.arange(n - 1, -1, -1)
+    slots = hashes[pending] & (size - 1)
+    while pending.size:
+        free = np.flatnonzero(table[slots] == -1)
+        _, first = np.unique(slots[free], return_index=True)
+        winners = free[first]
+        table[slots[winners]] = pending[winners]
+        waiting = np.ones(pending.size, dtype=bool)
+        waiting[winners] = False
+        pending = pending[waiting]
+        slots = (slots[waiting] + 1) & (size - 1)
+    return table
+
+
+class Vocabulary:
+    """
+    Word <-> id mapping over packed arrays. Behaves like the word2id dict
+    (in, [], get, keys, len, iteration in id order); word(i), words() and
+    the WordList view replace id2word.
+    """
+
+    def __init__(self, buffer, offsets, table):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.table = table
+        # memoryviews index to plain ints and bytes, much faster than arrays
+        self._data = memoryview(np.ascontiguousarray(buffer)).cast('B')
+        self._offsets = memoryview(np.ascontiguousarray(offsets, dtype=np.int64))
+        self._table = memoryview(np.ascontiguousarray(table))
+        self._mask = len(table) - 1
+
+    @classmethod
+    def from_words(cls, words):
+        buffer, offsets = pack_words(words)
+        return cls(buffer, offsets, _hash_table(buffer, offsets))
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=''):
+        """Vocabulary on the arrays returned by arrays(prefix)."""
+        return cls(arrays[prefix + 'words'], arrays[prefix + 'offsets'],
+                   arrays[prefix + 'table'])
+
+    def arrays(self, prefix=''):
+        """The backing arrays, by name, e.g. for SharedArrays.publish."""
+        return {prefix + 'words': self.buffer, prefix + 'offsets': self.offsets,
+                prefix + 'table': self.table}
+
+    def save(self, prefix):
+        """Write <prefix>.words.npy, <prefix>.offsets.npy and <prefix>.table.npy."""
+        for name, arr in self.arrays().items():
+            np.save('%s.%s.npy' % (prefix, name), arr)
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        """Vocabulary saved by save(), memory-mapped by default."""
+        return cls(*(np.load('%s.%s.npy' % (prefix, name), mmap_mode=mmap_mode)
+                     for name in ('words', 'offsets', 'table')))
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes + self.table.nbytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def word(self, i):
+        """The word of id i."""
+        return bytes(self._data[self._offsets[i]:self._offsets[i + 1]]).decode('utf-8')
+
+    def words(self):
+        """All words, in id order, as a list."""
+        data = self._data.tobytes()
+        bounds = self.offsets.tolist()
+        return [data[bounds[i]:bounds[i + 1]].decode('utf-8')
+                for i in range(len(bounds) - 1)]
+
+    def _lookup(self, key):
+        encoded = key.encode('utf-8')
+        data, offsets, table, mask = self._data, self._offsets, self._table, self._mask
+        slot = zlib.crc32(encoded) & mask
+        while True:
+            i = table[slot]
+            if i < 0:
+                return -1
+            if data[offsets[i]:offsets[i + 1]] == encoded:
+                return i
+            slot = (slot + 1) & mask
+
+    def get(self, key, default=None):
+        i = self._lookup(key) if isinstance(key, str) else -1
+        return default if i < 0 else i
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        i = self.get(key)
+        if i is None:
+            raise KeyError(key)
+        return i
+
+    def ids(self, tokens, missing=-1):
+        """Ids of tokens as an int64 array, missing for unknown tokens."""
+        lookup = self._lookup
+        ids = np.fromiter((lookup(token) for token in tokens), dtype=np.int64)
+        if missing != -1:
+            ids[ids < 0] = missing
+        return ids
+
+    def __iter__(self):
+        return iter(self.words())
+
+    def keys(self):
+        return self.words()
+
+
+class WordList(Sequence):
+    """
+    Read-only id -> word sequence over a Vocabulary, the id2word list
+    without decoding every word: [i] decodes one word, slices a list.
+    """
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.vocabulary.word(j) for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('word id out of range')
+        return self.vocabulary.word(i)
+
+    def __iter__(self):
+        return iter(self.vocabulary.words())
@@ -0,0 +1,158 @@
+"""
+Weighted poem and line vectors. The notebook pools the normalised word
+vectors of a text with a plain mean, so the most frequent words weigh the
+most and have to be kept out with long stopword lists. Here the words are
+weighted instead:
+
+- 'sif': smooth inverse frequency (Arora et al. 2017), a / (a + p(w)) with
+  p(w) the relative frequency of the word in the corpus,
+- 'tfidf': smoothed inverse document frequency, log((1 + n) / (1 + df(w)))
+  + 1, the term frequency coming from the counts themselves.
+
+Words the fitted texts never contain weigh 0. The poem texts are fitted
+after their stopwords are dropped, while lines keep more words (the
+line_stopwords lists are shorter); without this, those stopwords would get
+the largest weight of all in the lines.
+
+The weights are computed once per corpus as arrays aligned to the ids of the
+FastVector vocabulary. Pooling a batch of texts is then one sparse doc-term
+count matrix (scipy.sparse) scaled by the diagonal of the weights and
+multiplied by the normalised rows of the words it uses, divided by the
+number of tokens as text_vector does (out-of-vocabulary ones included). The
+first principal component of the poem vectors can be removed as well, as
+one projection of the whole batch.
+```
+Usage:
+    $ pooling = Pooling.fit(texts_data, en_dictionary, scheme='sif', remove_pc=True)
+    $ vect_en = pooling.vectors(texts_data, en_dictionary)
+    $ pooling.save('weights/en'); Pooling.load('weights/en')
+```
+"""
+
+import os
+
+import numpy as np
+
+from instrumentation import instrumented
+
+SCHEMES = ('sif', 'tfidf')
+
+
+def token_ids(texts, vocabulary):
+    """
+    (ids, lengths) of the token lists: the vocabulary ids of all their
+    tokens concatenated (-1 when unknown) and the number of tokens of each.
+    """
+    lengths = np.fromiter((len(tokens) for tokens in texts), dtype=np.int64, count=len(texts))
+    ids = vocabulary.ids(token for tokens in texts for token in tokens)
+    return ids, lengths
+
+
+def doc_term_matrix(ids, lengths, n_words):
+    """Sparse (len(lengths), n_words) count matrix, unknown tokens left out."""
+    from scipy import sparse
+    docs = np.repeat(np.arange(len(lengths)), lengths)
+    known = ids >= 0
+    return sparse.csr_matrix((np.ones(np.count_nonzero(known)), (docs[known], ids[known])),
+                             shape=(len(lengths), n_words))
+
+
+def sif_weights(counts, a=1e-3):
+    """a / (a + p(w)) from the corpus counts of every word id, 0 if unseen."""
+    total = counts.sum()
+    frequencies = counts / total if total else counts
+    return np.where(counts > 0, a / (a + frequencies), 0.)
+
+
+def idf_weights(matrix):
+    """Smoothed idf of every word id from the doc-term matrix, 0 if unseen."""
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1. + matrix.shape[0]) / (1. + document_frequency)) + 1.
+    return np.where(document_frequency > 0, idf, 0.)
+
+
+def first_component(vectors):
+    """Unit first right singular vector of vectors (zero vector if none)."""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if not np.any(vectors):
+        return np.zeros(vectors.shape[1])
+    return np.linalg.svd(vectors, full_matrices=False)[2][0]
+
+
+class Pooling:
+    """
+    Weighted mean pooling: weights is an array aligned to the vocabulary
+    ids of the table texts are pooled with (None for the plain mean) and
+    component, if set, the unit direction removed from every vector.
+    """
+
+    def __init__(self, weights=None, component=None):
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        self.component = None if component is None else np.asarray(component, dtype=np.float64)
+
+    @classmethod
+    @instrumented('weighting.fit')
+    def fit(cls, texts, dictionary, scheme='sif', a=1e-3, remove_pc=False):
+        """
+        The weights of scheme over the corpus texts (token lists) and,
+        with remove_pc, the first principal component of their weighted
+        vectors.
+        """
+        if scheme not in SCHEMES:
+            raise ValueError('scheme must be one of %s' % ', '.join(SCHEMES))
+        ids, lengths = token_ids(texts, dictionary.vocabulary)
+        matrix = doc_term_matrix(ids, lengths, dictionary.n_words)
+        if scheme == 'sif':
+            weights = sif_weights(np.bincount(ids[ids >= 0], minlength=dictionary.n_words), a)
+        else:
+            weights = idf_weights(matrix)
+        pooling = cls(weights)
+        if remove_pc:
+            pooling.component = first_component(pooling._pool(matrix, lengths, dictionary))
+        return pooling
+
+    def _pool(self, matrix, lengths, dictionary):
+        from scipy import sparse
+        used = np.unique(matrix.indices)
+        matrix = matrix[:, used]
+        if self.weights is not None:
+            matrix = matrix @ sparse.diags(self.weights[used])
+        rows = np.asarray(dictionary.embed[used], dtype=np.float64)
+        norms = np.linalg.norm(rows, axis=1)
+        norms[norms == 0] = 1
+        vectors = np.asarray(matrix @ (rows / norms[:, None]))
+        return vectors / np.maximum(lengths, 1)[:, None]
+
+    @instrumented('weighting.vectors', items=len)
+    def vectors(self, texts, dictionary):
+        """(len(texts), n_dim) pooled vectors of the token lists."""
+        ids, lengths = token_ids(texts, dictionary.vocabulary)
+        vectors = self._pool(doc_term_matrix(ids, lengths, dictionary.n_words),
+                             lengths, dictionary)
+        if self.component is not None:
+            vectors -= np.outer(vectors @ self.component, self.component)
+        return vectors
+
+    def arrays(self, prefix=''):
+        """The weights and component as {name: array}, e.g. for np.save."""
+        arrays = {}
+        if self.weights is not None:
+            arrays[prefix + 'weights'] = self.weights
+        if self.component is not None:
+            arrays[prefix + 'component'] = self.component
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=''):
+        return cls(arrays.get(prefix + 'weights'), arrays.get(prefix + 'component'))
+
+    def save(self, prefix):
+        for name, array in self.arrays().items():
+            np.save('%s.%s.npy' % (prefix, name), array)
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        arrays = {name: np.load('%s.%s.npy' % (prefix, name), mmap_mode=mmap_mode)
+                  for name in ('weights', 'component')
+                  if os.path.exists('%s.%s.npy' % (prefix, name))}
+        return cls.from_arrays(arrays)